@@ -0,0 +1,318 @@
+"""Offline throughput/latency benchmarks for FIT parsing and building.
+
+Run with `uv run python -m benchmarks.bench --records 1000 100000 --output results.json`.
+Each (target, size) case runs in a fresh process so its peak RSS is measured in isolation.
+Pass `--baseline` with the JSON of an earlier run to print the relative change per case, and
+`--fit sample_data/sample.FIT` to measure a real file instead of synthetic ones. `render` times
+the `/fit/parse` body built from plain dicts; `render_models` builds the same JSON through the
+Pydantic response models, for comparison.
+
+Synthetic inputs are generated with `FitFileBuilder`: a chunk of `record` messages is built
+once and its data messages are repeated (with shifted timestamps) up to the requested size,
+since building a million records through fit_tool alone takes many minutes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import struct
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+import httpx
+from fit_tool.fit_file import FitFile
+
+from fitfile_customgpt_action import services
+from fitfile_customgpt_action.app import create_app
+from fitfile_customgpt_action.config import Settings
+from fitfile_customgpt_action.decoder import (
+    TIMESTAMP_FIELD_ID,
+    RawData,
+    RecordDecoder,
+    crc16,
+)
+from fitfile_customgpt_action.encoder import iter_fit_bytes
+from fitfile_customgpt_action.models import BuildFitColumnarRequest, BuildFitRequest
+
+TARGETS = ("parse", "render", "render_models", "build", "build_columnar", "serialize", "asgi")
+DEFAULT_RECORDS = (1_000, 10_000)
+CHUNK_RECORDS = 1_000
+# 2023-11-14T22:13:20Z in Unix milliseconds, the unit fit_tool uses for timestamps.
+START_MS = 1_700_000_000_000
+
+
+@dataclass(frozen=True, slots=True)
+class CaseResult:
+    target: str
+    records: int
+    payload_bytes: int
+    repeat: int
+    records_per_second: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+
+
+def synthetic_request(records: int) -> BuildFitRequest:
+    """A `/fit/produce` payload with a file_id message followed by `records` record messages."""
+    messages: list[dict[str, Any]] = [
+        {
+            "name": "file_id",
+            "fields": [
+                {"name": "type", "value": 4},
+                {"name": "manufacturer", "value": 255},
+                {"name": "time_created", "value": START_MS},
+            ],
+        }
+    ]
+    for index in range(records):
+        messages.append(
+            {
+                "name": "record",
+                "fields": [
+                    {"name": "timestamp", "value": START_MS + index * 1000},
+                    {"name": "position_lat", "value": 45.0 + index * 1e-5},
+                    {"name": "position_long", "value": 9.0 + index * 1e-5},
+                    {"name": "altitude", "value": 120.0 + index % 50},
+                    {"name": "heart_rate", "value": 120 + index % 40},
+                    {"name": "cadence", "value": 80 + index % 10},
+                    {"name": "distance", "value": index * 3.1},
+                    {"name": "speed", "value": 3.1 + (index % 7) / 10},
+                    {"name": "power", "value": 200 + index % 60},
+                ],
+            }
+        )
+    return BuildFitRequest.model_validate({"messages": messages})
+
+
+def synthetic_columns(records: int) -> BuildFitColumnarRequest:
+    """The `synthetic_request` messages in the `/fit/produce/columnar` shape."""
+    columns: dict[str, dict[str, list[Any]]] = {}
+    for message in synthetic_request(records).messages:
+        group = columns.setdefault(message.name, {})
+        for field in message.fields:
+            group.setdefault(field.name, []).append(field.value)
+    return BuildFitColumnarRequest.model_validate(columns)
+
+
+def synthetic_fit(records: int) -> bytes:
+    """Encode a FIT file holding `records` record messages, one second apart."""
+    chunk = services.build_fit_bytes(synthetic_request(min(records, CHUNK_RECORDS)))
+    if records <= CHUNK_RECORDS:
+        return chunk
+
+    decoder = RecordDecoder(chunk)
+    view = decoder.view
+    rows = [item for item in decoder if isinstance(item, RawData)]
+    data_rows = [row for row in rows if row.definition.global_id == 20]
+    first = data_rows[0].offset - 1
+    prefix = bytes(view[decoder.header.header_size : first])
+    template = bytes(view[first : data_rows[-1].offset + data_rows[-1].definition.layout.size])
+
+    definition = data_rows[0].definition
+    slot = next(i for i, field in enumerate(definition.fields) if field[0] == TIMESTAMP_FIELD_ID)
+    layout = struct.Struct(">I" if definition.big_endian else "<I")
+    row_size = definition.layout.size + 1
+    if len(template) != row_size * len(data_rows):
+        raise RuntimeError("Expected the builder to emit one contiguous run of record messages.")
+    stamp_offsets = [row.offset - first + definition.byte_offsets[slot] for row in data_rows]
+
+    body = bytearray(prefix)
+    copies = -(-records // len(data_rows))
+    for copy in range(copies):
+        block = bytearray(template)
+        for stamp in stamp_offsets:
+            (value,) = layout.unpack_from(block, stamp)
+            layout.pack_into(block, stamp, value + copy * len(data_rows))
+        remaining = records - copy * len(data_rows)
+        body += block[: min(remaining, len(data_rows)) * row_size]
+
+    header = bytearray(view[: decoder.header.header_size])
+    struct.pack_into("<I", header, 4, len(body))
+    if len(header) >= 14:
+        struct.pack_into("<H", header, 12, crc16(bytes(header[:12])))
+    payload = bytes(header) + bytes(body)
+    return payload + struct.pack("<H", crc16(payload))
+
+
+def _timed(func: Callable[[], object], repeat: int) -> list[float]:
+    func()  # warm-up: imports, caches and lazily built plans
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _asgi_round_trip(payload: bytes) -> Callable[[], object]:
+    app = create_app(Settings(cache_max_bytes=0))
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    def call() -> object:
+        response = loop.run_until_complete(
+            client.post(
+                "/fit/parse", files={"file": ("bench.fit", payload, "application/octet-stream")}
+            )
+        )
+        response.raise_for_status()
+        return response.content
+
+    return call
+
+
+def count_records(payload: bytes) -> int:
+    """Number of data messages in a FIT file."""
+    return sum(isinstance(item, RawData) for item in RecordDecoder(payload))
+
+
+def run_case(target: str, records: int, repeat: int, fit_path: Path | None = None) -> CaseResult:
+    """Measure one target on a synthetic file of `records` records, or on `fit_path`."""
+    if fit_path is not None and target in ("build", "build_columnar"):
+        raise ValueError(f"'{target}' builds synthetic files and cannot use --fit.")
+    if target == "build":
+        request = synthetic_request(records)
+        payload_bytes = len(services.build_fit_bytes(request))
+        call: Callable[[], object] = lambda: services.build_fit_file(request)  # noqa: E731
+    elif target == "build_columnar":
+        columnar = synthetic_columns(records)
+        payload_bytes = len(b"".join(iter_fit_bytes(services.encode_fit_columns(columnar))))
+        call = lambda: b"".join(iter_fit_bytes(services.encode_fit_columns(columnar)))  # noqa: E731
+    else:
+        payload = synthetic_fit(records) if fit_path is None else fit_path.read_bytes()
+        payload_bytes = len(payload)
+        if target == "parse":
+            call = lambda: services.parse_fit_bytes(payload)  # noqa: E731
+        elif target == "render":
+            call = lambda: services.render_parse_json(payload)  # noqa: E731
+        elif target == "render_models":
+            call = lambda: services.parse_fit_bytes(payload).model_dump_json().encode()  # noqa: E731
+        elif target == "serialize":
+            fit_records = FitFile.from_bytes(payload).records
+            call = lambda: [services._serialize_record(record) for record in fit_records]  # noqa: E731
+        elif target == "asgi":
+            call = _asgi_round_trip(payload)
+        else:
+            raise ValueError(f"Unknown benchmark target '{target}'.")
+
+    samples = sorted(_timed(call, repeat))
+    p99_index = min(len(samples) - 1, round(0.99 * (len(samples) - 1)))
+    return CaseResult(
+        target=target,
+        records=records,
+        payload_bytes=payload_bytes,
+        repeat=repeat,
+        records_per_second=records / statistics.median(samples),
+        p50_ms=statistics.median(samples) * 1000,
+        p99_ms=samples[p99_index] * 1000,
+        # ru_maxrss is reported in KiB on Linux and bytes on macOS.
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    )
+
+
+def _isolated(target: str, records: int, repeat: int, fit_path: Path | None) -> CaseResult:
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, target, records, repeat, fit_path).result()
+
+
+def _environment() -> dict[str, Any]:
+    try:
+        git = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        git = None
+    commit = git.stdout.strip() if git is not None and git.returncode == 0 else None
+    versions: dict[str, str | None] = {}
+    for package in ("fit-tool", "numpy", "orjson", "fastapi", "pydantic"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "commit": commit,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": versions,
+    }
+
+
+def _compare(results: Sequence[CaseResult], baseline_path: Path) -> None:
+    baseline = {
+        (case["target"], case["records"]): case
+        for case in json.loads(baseline_path.read_text())["results"]
+    }
+    for result in results:
+        previous = baseline.get((result.target, result.records))
+        if previous is None:
+            continue
+        change = result.records_per_second / previous["records_per_second"] - 1
+        print(f"{result.target:>14} {result.records:>9,} records: {change:+.1%} throughput")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark FIT parse/build throughput.")
+    parser.add_argument(
+        "--records",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_RECORDS),
+        help="Synthetic file sizes, in record messages (default: 1000 10000).",
+    )
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=TARGETS,
+        default=list(TARGETS),
+        help="What to measure (default: all).",
+    )
+    parser.add_argument(
+        "--fit", type=Path, help="Measure this FIT file instead of synthetic ones (parse targets)."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case.")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", type=Path, help="Earlier results JSON to compare against.")
+    args = parser.parse_args(argv)
+
+    sizes: list[int] = args.records
+    targets: list[str] = args.targets
+    if args.fit is not None:
+        sizes = [count_records(args.fit.read_bytes())]
+        targets = [target for target in targets if target not in ("build", "build_columnar")]
+
+    results = []
+    for records in sizes:
+        for target in targets:
+            result = _isolated(target, records, args.repeat, args.fit)
+            results.append(result)
+            print(
+                f"{target:>14} {records:>9,} records: {result.records_per_second:>12,.0f} rec/s"
+                f"  p50 {result.p50_ms:9.1f} ms  p99 {result.p99_ms:9.1f} ms"
+                f"  rss {result.peak_rss_mb:7.1f} MiB"
+            )
+
+    if args.output is not None:
+        document = {"environment": _environment(), "results": [asdict(r) for r in results]}
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    if args.baseline is not None:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,75 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from . import message_registry, metrics
+from .cache import ParseCache
+from .config import Settings
+from .executor import WorkExecutor
+from .index import INDEX_CACHE_MAX_BYTES
 from .routes import router
+from .uploads import BodySizeLimitMiddleware
 
 
-def create_app() -> FastAPI:
+def create_app(settings: Settings | None = None) -> FastAPI:
     """Build and configure the FastAPI application."""
+    settings = settings or Settings.from_env()
+    executor = WorkExecutor(settings.executor, settings.executor_workers, settings.executor_queue)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+        if settings.warm_registry:
+            message_registry.warm_up()
+        flusher = None
+        if settings.metrics and settings.metrics_dir is not None:
+            flusher = asyncio.create_task(metrics.flush_periodically())
+        yield
+        if flusher is not None:
+            flusher.cancel()
+            metrics.REGISTRY.flush()
+        executor.shutdown()
+
     app = FastAPI(
         title="FIT File CustomGPT Action",
         version="0.1.0",
         summary="Expose FIT parsing and generation via a lightweight FastAPI service.",
+        lifespan=lifespan,
     )
+    app.state.settings = settings
+    app.state.parse_cache = parse_cache = ParseCache(
+        settings.cache_max_bytes, settings.cache_dir, settings.cache_dir_max_bytes
+    )
+    app.state.index_cache = ParseCache(INDEX_CACHE_MAX_BYTES)
+    app.state.executor = executor
+    # Decoding a raw body while it arrives holds a worker for as long as the client takes to
+    # send it, so such uploads may only occupy half of the workers (but always get one, as
+    # `--production` workers usually have a single executor worker each).
+    app.state.stream_slots = asyncio.Semaphore(max(1, settings.executor_workers // 2))
     app.include_router(router, prefix="/fit")
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=settings.max_upload_bytes)
+    # Metrics are process-wide, so the most recently created app decides whether they are kept.
+    metrics.REGISTRY.enabled = settings.metrics
+    metrics.REGISTRY.directory = settings.metrics_dir
+    metrics.REGISTRY.collector = lambda: _count_totals(parse_cache, executor)
+    if settings.metrics_dir is not None:
+        settings.metrics_dir.mkdir(parents=True, exist_ok=True)
+    if settings.metrics:
+        app.add_middleware(metrics.RequestMetricsMiddleware)
     return app
 
 
+def _count_totals(cache: ParseCache, executor: WorkExecutor) -> None:
+    """Copy the cache and executor totals into counters, so that workers' snapshots add up."""
+    stats = cache.stats()
+    metrics.CACHE_HITS.set(stats.hits)
+    metrics.CACHE_DISK_HITS.set(stats.disk_hits)
+    metrics.CACHE_MISSES.set(stats.misses)
+    metrics.CACHE_EVICTIONS.set(stats.evictions)
+    metrics.EXECUTOR_REJECTED.set(executor.rejected)
+
+
 app = create_app()
@@ -0,0 +1,218 @@
+"""Content-addressed cache for serialized `/fit/parse` responses.
+
+Entries are keyed by a hash of the uploaded bytes plus the output options that shaped the
+response, and hold the response body exactly as it is sent to the client. The in-memory
+tier is an LRU bounded by total body size; an optional directory adds a persistent tier
+that survives restarts and is consulted on memory misses. The disk tier is bounded too: files
+are touched when read, and once the directory outgrows its budget the least recently used ones
+are deleted. Server workers sharing the directory each prune it by what is on disk, so entries
+written by one worker count against the budget of all of them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the serialized response shape changes so stale disk entries are ignored.
+CACHE_FORMAT_VERSION = 2
+# Default budget for the disk tier.
+DISK_MAX_BYTES = 1024 * 1024 * 1024
+# Pruning deletes entries until the disk tier is down to this share of its budget, so the
+# directory is rescanned once per tenth of the budget written rather than on every write.
+_PRUNE_TO = 0.9
+
+
+@dataclass(frozen=True, slots=True)
+class CacheStats:
+    """Point-in-time counters for a `ParseCache`."""
+
+    hits: int
+    misses: int
+    disk_hits: int
+    evictions: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+
+class ParseCache:
+    """Byte-bounded LRU of serialized parse responses with an optional on-disk tier.
+
+    `disk_max_bytes` bounds the files kept in `directory`; 0 disables the disk tier.
+    """
+
+    def __init__(
+        self, max_bytes: int, directory: Path | None = None, disk_max_bytes: int = DISK_MAX_BYTES
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory if disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._disk_hits = 0
+        self._evictions = 0
+        # Bytes in the disk tier as of the last scan plus this process's writes since; None
+        # until the first write scans the directory.
+        self._disk_size: int | None = None
+        self._disk_lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.directory is not None
+
+    @staticmethod
+    def key(payload: bytes | memoryview, *options: str) -> str:
+        """Hash `payload` together with the output options that shape the response."""
+        return ParseCache.finish_key(hashlib.blake2b(payload, digest_size=32), *options)
+
+    @staticmethod
+    def hasher() -> hashlib.blake2b:
+        """A hash to feed a payload into piece by piece as it arrives, for `finish_key`."""
+        return hashlib.blake2b(digest_size=32)
+
+    @staticmethod
+    def finish_key(digest: hashlib.blake2b, *options: str) -> str:
+        """`key` of the payload fed into `digest` (a `hasher()`), which is left as it is."""
+        digest = digest.copy()
+        digest.update(f"\0v{CACHE_FORMAT_VERSION}".encode())
+        for option in options:
+            digest.update(b"\0" + option.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached body for `key`, promoting disk entries into memory."""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return body
+
+        body = self._read_disk(key)
+        with self._lock:
+            if body is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._disk_hits += 1
+            self._remember(key, body)
+        return body
+
+    def put(self, key: str, body: bytes) -> None:
+        """Store `body` in memory (evicting least-recently used entries) and on disk."""
+        with self._lock:
+            self._remember(key, body)
+        self._write_disk(key, body)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                disk_hits=self._disk_hits,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                size_bytes=self._size,
+                max_bytes=self.max_bytes,
+            )
+
+    def clear(self) -> None:
+        """Drop every in-memory entry; the disk tier is left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remember(self, key: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = body
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self._evictions += 1
+
+    def _path(self, key: str) -> Path | None:
+        if self.directory is None:
+            return None
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> bytes | None:
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            body = path.read_bytes()
+            # The modification time doubles as the last use, which pruning goes by.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            logger.warning("Could not read cached parse result %s: %s", path, exc)
+            return None
+        return body
+
+    def _write_disk(self, key: str, body: bytes) -> None:
+        path = self._path(key)
+        if path is None or len(body) > self.disk_max_bytes or path.exists():
+            return
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Write to a sibling temp file first so readers never see a partial entry.
+            fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as handle:
+                    handle.write(body)
+                os.replace(temp_name, path)
+            except OSError:
+                Path(temp_name).unlink(missing_ok=True)
+                raise
+        except OSError as exc:
+            logger.warning("Could not persist parse result %s: %s", path, exc)
+            return
+        with self._disk_lock:
+            if self._disk_size is None or self._disk_size + len(body) > self.disk_max_bytes:
+                self._prune_disk()
+            else:
+                self._disk_size += len(body)
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used disk entries down to `_PRUNE_TO` of the budget."""
+        assert self.directory is not None
+        entries: list[tuple[float, int, Path]] = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total > self.disk_max_bytes:
+            target = self.disk_max_bytes * _PRUNE_TO
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError as exc:
+                    logger.warning("Could not prune cached parse result %s: %s", path, exc)
+                    continue
+                total -= size
+        self._disk_size = total
@@ -1,12 +1,39 @@
 from __future__ import annotations
 
 import argparse
-from collections.abc import Sequence
+import inspect
+import os
+import tempfile
+from collections.abc import MutableMapping, Sequence
+from pathlib import Path
+from typing import Any
 
 import uvicorn
 
+from . import metrics
+from .config import ENV_PREFIX
+
+APP_FACTORY = "fitfile_customgpt_action.app:create_app"
+# `--production` defaults, per worker process.
+PRODUCTION_LIMIT_CONCURRENCY = 256
+PRODUCTION_MAX_REQUESTS = 10_000
+PRODUCTION_KEEP_ALIVE = 30
+PRODUCTION_GRACEFUL_SHUTDOWN = 30
+
 
 def main(argv: Sequence[str] | None = None) -> None:
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.reload and (args.production or (args.workers or 1) > 1):
+        parser.error("--reload cannot be combined with --production or several --workers.")
+
+    options = server_options(args)
+    if options["workers"] > 1:
+        _prepare_worker_env(os.environ, options["workers"])
+    uvicorn.run(APP_FACTORY, factory=True, **options)
+
+
+def _parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Run the FIT CustomGPT Action server.")
     parser.add_argument("--host", default="0.0.0.0", help="Interface to bind the ASGI server to.")
     parser.add_argument("--port", default=8000, type=int, help="Port to bind the ASGI server to.")
@@ -15,15 +42,99 @@ def main(argv: Sequence[str] | None = None) -> None:
         action="store_true",
         help="Enable auto-reload (development only).",
     )
-    args = parser.parse_args(argv)
-
-    uvicorn.run(
-        "fitfile_customgpt_action.app:create_app",
-        host=args.host,
-        port=args.port,
-        reload=args.reload,
-        factory=True,
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help=(
+            "Serve with one worker per CPU, request/concurrency limits and worker recycling; "
+            "the options below override these defaults. Workers share /fit/metrics through "
+            "FITFILE_METRICS_DIR (a new temporary directory unless it is set)."
+        ),
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Worker processes (default: 1, or the CPU count)."
+    )
+    parser.add_argument(
+        "--loop",
+        choices=("auto", "asyncio", "uvloop"),
+        default="auto",
+        help="Event loop; `auto` uses uvloop when it is installed.",
+    )
+    parser.add_argument(
+        "--http",
+        choices=("auto", "h11", "httptools"),
+        default="auto",
+        help="HTTP parser; `auto` uses httptools when it is installed.",
     )
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        help="Connections and tasks per worker before new requests get 503.",
+    )
+    parser.add_argument(
+        "--limit-max-requests",
+        type=int,
+        help="Requests after which a worker is restarted, capping memory growth.",
+    )
+    parser.add_argument(
+        "--backlog", type=int, default=2048, help="Pending connections the socket queues."
+    )
+    parser.add_argument(
+        "--timeout-keep-alive",
+        type=int,
+        help="Seconds an idle keep-alive connection stays open (default: 5).",
+    )
+    return parser
+
+
+def server_options(args: argparse.Namespace) -> dict[str, Any]:
+    """Keyword arguments for `uvicorn.run` from the parsed command line."""
+    production = args.production
+    workers = args.workers or (_cpu_count() if production else 1)
+    max_requests = args.limit_max_requests or (PRODUCTION_MAX_REQUESTS if production else None)
+    options: dict[str, Any] = {
+        "host": args.host,
+        "port": args.port,
+        "reload": args.reload,
+        "workers": max(1, workers),
+        "loop": args.loop,
+        "http": args.http,
+        "backlog": args.backlog,
+        "limit_concurrency": args.limit_concurrency
+        or (PRODUCTION_LIMIT_CONCURRENCY if production else None),
+        "limit_max_requests": max_requests,
+        "timeout_keep_alive": args.timeout_keep_alive
+        or (PRODUCTION_KEEP_ALIVE if production else 5),
+        "timeout_graceful_shutdown": PRODUCTION_GRACEFUL_SHUTDOWN if production else None,
+    }
+    # Spread restarts so workers started together are not all recycled at once. Older uvicorn
+    # releases (the supported floor among them) have no jitter option.
+    if "limit_max_requests_jitter" in inspect.signature(uvicorn.run).parameters:
+        options["limit_max_requests_jitter"] = max_requests // 10 if max_requests else 0
+    return options
+
+
+def _prepare_worker_env(environ: MutableMapping[str, str], workers: int) -> None:
+    """Default the settings of spawned workers for a multi-process server.
+
+    uvicorn starts workers with `spawn`, so nothing imported here is shared with them: each
+    worker warms the message registry during startup, before it accepts connections. The
+    parse pool is split across workers so the processes do not oversubscribe the CPUs, and
+    their metrics are shared through a directory that starts out empty, so that whichever
+    worker answers a scrape reports all of them. Variables already set are left alone.
+    """
+    environ.setdefault(f"{ENV_PREFIX}WARM_REGISTRY", "true")
+    environ.setdefault(f"{ENV_PREFIX}EXECUTOR_WORKERS", str(max(1, _cpu_count() // workers)))
+    metrics_dir = environ.get(f"{ENV_PREFIX}METRICS_DIR")
+    if metrics_dir:
+        metrics.clear_snapshots(Path(metrics_dir))
+    else:
+        environ[f"{ENV_PREFIX}METRICS_DIR"] = tempfile.mkdtemp(prefix="fitfile-metrics-")
+
+
+def _cpu_count() -> int:
+    # CPUs this process may run on, which respects a container's CPU set.
+    return os.process_cpu_count() or 1
 
 
 if __name__ == "__main__":
@@ -1,40 +1,244 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import importlib.util
 import json
 import re
+import sys
+from collections.abc import AsyncIterator, Mapping, Sequence
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Any, Sequence, cast
+from typing import IO, Any, cast
 
 import httpx
 
 DEFAULT_BASE_URL = "http://127.0.0.1:8000"
 DEFAULT_OUTPUT = Path("generated.fit")
+BATCH_TIMEOUT = 300.0
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+# Responses worth retrying: rate limiting, a saturated server (503) and proxy hiccups.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
 
 
 def parse_fit(base_url: str, fit_path: Path) -> dict[str, Any]:
-    """Upload a FIT file to the parse endpoint and return the parsed JSON."""
+    """Upload a FIT file to the parse endpoint and return the parsed JSON.
+
+    The file is sent as a raw `application/octet-stream` body, which the server decodes as it
+    arrives without multipart parsing.
+    """
     url = _normalize(f"{base_url}/fit/parse")
+    headers = {
+        "Content-Type": "application/octet-stream",
+        "Content-Length": str(fit_path.stat().st_size),
+    }
     with fit_path.open("rb") as handle:
-        response = httpx.post(
-            url,
-            files={"file": (fit_path.name, handle, "application/octet-stream")},
-            timeout=30.0,
-        )
+        response = httpx.post(url, content=handle, headers=headers, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
     return cast(dict[str, Any], response.json())
 
 
+def parse_fit_batch(base_url: str, fit_paths: Sequence[Path]) -> list[dict[str, Any]]:
+    """Upload several FIT files (or zip archives) in one request and return per-file results.
+
+    The server streams one NDJSON line per file as it finishes; lines are returned sorted
+    back into upload order. Failed files appear as `{"kind": "error", ...}` entries.
+    """
+    url = _normalize(f"{base_url}/fit/parse/batch")
+    with ExitStack() as stack:
+        files = [
+            (
+                "files",
+                (
+                    path.name,
+                    stack.enter_context(path.open("rb")),
+                    "application/zip"
+                    if path.suffix.lower() == ".zip"
+                    else "application/octet-stream",
+                ),
+            )
+            for path in fit_paths
+        ]
+        response = httpx.post(url, files=files, timeout=BATCH_TIMEOUT)
+    response.raise_for_status()
+    lines = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    return sorted(lines, key=lambda line: int(line["index"]))
+
+
 def produce_fit(base_url: str, payload_path: Path, output_path: Path) -> Path:
     """Post a JSON payload to the produce endpoint and write the returned FIT bytes."""
     url = _normalize(f"{base_url}/fit/produce")
     payload = json.loads(payload_path.read_text())
-    response = httpx.post(url, json=payload, timeout=30.0)
+    response = httpx.post(url, json=payload, timeout=DEFAULT_TIMEOUT)
     response.raise_for_status()
     output_path.write_bytes(response.content)
     return output_path
 
 
+class AsyncFitClient:
+    """Connection-pooled async client for uploading many FIT files concurrently.
+
+    All requests share one keep-alive connection pool (HTTP/2 when the `h2` package is
+    installed) and at most `concurrency` uploads are in flight at a time. Connection errors
+    and `RETRY_STATUSES` responses are retried up to `retries` times with exponential backoff,
+    honouring `Retry-After`. Use it as an async context manager.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        *,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retries: int = DEFAULT_RETRIES,
+        timeout: float = DEFAULT_TIMEOUT,
+        backoff: float = BACKOFF_SECONDS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1.")
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self._slots = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=limits,
+            http2=transport is None and importlib.util.find_spec("h2") is not None,
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> AsyncFitClient:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def parse(
+        self, fit_path: Path, params: Mapping[str, str] | None = None
+    ) -> dict[str, Any]:
+        """Upload one FIT file as a raw body to `/fit/parse` and return the parsed JSON."""
+        async with self._slots:
+            # Read inside the slot so at most `concurrency` files are held in memory.
+            content = await asyncio.to_thread(fit_path.read_bytes)
+            response = await self._post(
+                _normalize(f"{self.base_url}/fit/parse"),
+                content,
+                {"Content-Type": "application/octet-stream"},
+                params,
+            )
+        response.raise_for_status()
+        return cast(dict[str, Any], response.json())
+
+    async def parse_many(
+        self, fit_paths: Sequence[Path], params: Mapping[str, str] | None = None
+    ) -> AsyncIterator[tuple[Path, dict[str, Any] | Exception]]:
+        """Parse `fit_paths` concurrently, yielding `(path, result or error)` as each finishes."""
+
+        async def parse_one(path: Path) -> tuple[Path, dict[str, Any] | Exception]:
+            try:
+                return path, await self.parse(path, params)
+            except (httpx.HTTPError, OSError, ValueError) as exc:
+                return path, exc
+
+        tasks = [asyncio.ensure_future(parse_one(path)) for path in fit_paths]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _post(
+        self,
+        url: str,
+        content: bytes,
+        headers: Mapping[str, str],
+        params: Mapping[str, str] | None,
+    ) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self._client.post(
+                    url, content=content, headers=headers, params=params
+                )
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+                delay = self._delay(attempt, None)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                delay = self._delay(attempt, response.headers.get("Retry-After"))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _delay(self, attempt: int, retry_after: str | None) -> float:
+        """Seconds to wait before the next attempt: `Retry-After` or exponential backoff."""
+        if retry_after is not None and retry_after.strip().isdigit():
+            return min(float(retry_after), MAX_BACKOFF_SECONDS)
+        return min(self.backoff * 2.0**attempt, MAX_BACKOFF_SECONDS)
+
+
+async def parse_dir(
+    base_url: str,
+    directory: Path,
+    output: IO[str],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    retries: int = DEFAULT_RETRIES,
+    timeout: float = DEFAULT_TIMEOUT,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> tuple[int, int]:
+    """Parse every `.fit` file below `directory`, writing one NDJSON line per file to `output`.
+
+    Lines are written (and flushed) as files finish, in completion order, shaped like the
+    `/fit/parse/batch` lines with `filename` relative to `directory`. Returns the number of
+    parsed and failed files.
+    """
+    fit_paths = sorted(
+        path for path in directory.rglob("*") if path.is_file() and path.suffix.lower() == ".fit"
+    )
+    parsed = failed = 0
+    async with AsyncFitClient(
+        base_url, concurrency=concurrency, retries=retries, timeout=timeout, transport=transport
+    ) as fit_client:
+        async for path, outcome in fit_client.parse_many(fit_paths):
+            filename = path.relative_to(directory).as_posix()
+            if isinstance(outcome, Exception):
+                failed += 1
+                line = _error_line(filename, outcome)
+            else:
+                parsed += 1
+                line = {"kind": "result", "filename": filename, "result": outcome}
+            output.write(json.dumps(line, separators=(",", ":")) + "\n")
+            output.flush()
+    return parsed, failed
+
+
+def _error_line(filename: str, error: Exception) -> dict[str, Any]:
+    status_code: int | None = None
+    detail = str(error)
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        try:
+            body = error.response.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and "detail" in body:
+            detail = str(body["detail"])
+        else:
+            detail = error.response.text or detail
+    return {"kind": "error", "filename": filename, "status_code": status_code, "detail": detail}
+
+
 _DUPLICATE_FIT_SEGMENT = re.compile(r"(?<!:)//fit")
 
 
@@ -50,7 +254,38 @@ def main(argv: Sequence[str] | None = None) -> None:
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     parse_cmd = subparsers.add_parser("parse", help="Parse a FIT file via the API.")
-    parse_cmd.add_argument("fit_path", type=Path, help="Path to the FIT file to upload.")
+    parse_cmd.add_argument(
+        "fit_paths",
+        type=Path,
+        nargs="+",
+        help="FIT file(s) to upload; several files or a .zip archive use the batch endpoint.",
+    )
+
+    parse_dir_cmd = subparsers.add_parser(
+        "parse-dir", help="Parse every .fit file in a directory concurrently, writing NDJSON."
+    )
+    parse_dir_cmd.add_argument("directory", type=Path, help="Directory searched recursively.")
+    parse_dir_cmd.add_argument(
+        "--output", default="-", help="NDJSON file to write results to (default: stdout)."
+    )
+    parse_dir_cmd.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Uploads in flight at once (default: {DEFAULT_CONCURRENCY}).",
+    )
+    parse_dir_cmd.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"Retries per file for connection errors and 429/5xx (default: {DEFAULT_RETRIES}).",
+    )
+    parse_dir_cmd.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"Per-request timeout in seconds (default: {DEFAULT_TIMEOUT:g}).",
+    )
 
     produce_cmd = subparsers.add_parser("produce", help="Generate a FIT file from a JSON payload.")
     produce_cmd.add_argument("payload", type=Path, help="JSON payload describing FIT messages.")
@@ -65,8 +300,31 @@ def main(argv: Sequence[str] | None = None) -> None:
     base_url = args.base_url.rstrip("/")
 
     if args.command == "parse":
-        result = parse_fit(base_url, args.fit_path)
-        print(json.dumps(result, indent=2))
+        fit_paths: list[Path] = args.fit_paths
+        if len(fit_paths) == 1 and fit_paths[0].suffix.lower() != ".zip":
+            print(json.dumps(parse_fit(base_url, fit_paths[0]), indent=2))
+        else:
+            print(json.dumps(parse_fit_batch(base_url, fit_paths), indent=2))
+    elif args.command == "parse-dir":
+        with ExitStack() as stack:
+            output = (
+                sys.stdout
+                if args.output == "-"
+                else stack.enter_context(Path(args.output).open("w", encoding="utf-8"))
+            )
+            parsed, failed = asyncio.run(
+                parse_dir(
+                    base_url,
+                    args.directory,
+                    output,
+                    concurrency=args.concurrency,
+                    retries=args.retries,
+                    timeout=args.timeout,
+                )
+            )
+        print(f"Parsed {parsed} files, {failed} failed.", file=sys.stderr)
+        if failed:
+            raise SystemExit(1)
     elif args.command == "produce":
         output_file = produce_fit(base_url, args.payload, args.output)
         print(f"Wrote FIT file to {output_file}")
@@ -0,0 +1,97 @@
+"""Runtime settings for the FastAPI service, read from environment variables."""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import cast
+
+from .cache import DISK_MAX_BYTES
+from .executor import ExecutorKind
+
+ENV_PREFIX = "FITFILE_"
+_EXECUTORS = ("thread", "process")
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Service tunables; `from_env` reads each one from `FITFILE_<NAME>`."""
+
+    # Upper bound for serialized parse responses kept in memory; 0 disables the cache.
+    cache_max_bytes: int = 64 * 1024 * 1024
+    # Optional directory for a persistent second cache tier.
+    cache_dir: Path | None = None
+    # Upper bound for the files kept in `cache_dir`, pruned least recently used first.
+    cache_dir_max_bytes: int = DISK_MAX_BYTES
+    # Pool used for CPU-bound parse/build work: "thread" or "process".
+    executor: ExecutorKind = "thread"
+    executor_workers: int = min(4, os.cpu_count() or 1)
+    # Jobs allowed to wait for a worker before requests are refused with 503.
+    executor_queue: int = 16
+    # Seconds advertised in Retry-After when the executor is saturated.
+    retry_after: int = 1
+    # Import every FIT message class at startup instead of on the first /fit/produce request.
+    warm_registry: bool = False
+    # Largest request body accepted, enforced while it is received; 0 disables the limit.
+    max_upload_bytes: int = 256 * 1024 * 1024
+    # Record request/stage metrics and serve them at /fit/metrics.
+    metrics: bool = True
+    # Directory where server workers share their metrics, so any of them reports all of them.
+    metrics_dir: Path | None = None
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] | None = None) -> Settings:
+        env = os.environ if environ is None else environ
+        defaults = cls()
+        cache_dir = env.get(f"{ENV_PREFIX}CACHE_DIR")
+        metrics_dir = env.get(f"{ENV_PREFIX}METRICS_DIR")
+        return cls(
+            cache_max_bytes=_int(env, "CACHE_MAX_BYTES", defaults.cache_max_bytes),
+            cache_dir=Path(cache_dir) if cache_dir else None,
+            cache_dir_max_bytes=_int(env, "CACHE_DIR_MAX_BYTES", defaults.cache_dir_max_bytes),
+            executor=cast(ExecutorKind, _choice(env, "EXECUTOR", defaults.executor, _EXECUTORS)),
+            executor_workers=max(1, _int(env, "EXECUTOR_WORKERS", defaults.executor_workers)),
+            executor_queue=_int(env, "EXECUTOR_QUEUE", defaults.executor_queue),
+            retry_after=_int(env, "RETRY_AFTER", defaults.retry_after),
+            warm_registry=_bool(env, "WARM_REGISTRY", defaults.warm_registry),
+            max_upload_bytes=_int(env, "MAX_UPLOAD_BYTES", defaults.max_upload_bytes),
+            metrics=_bool(env, "METRICS", defaults.metrics),
+            metrics_dir=Path(metrics_dir) if metrics_dir else None,
+        )
+
+
+def _int(env: Mapping[str, str], name: str, default: int) -> int:
+    raw = env.get(f"{ENV_PREFIX}{name}")
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise ValueError(f"{ENV_PREFIX}{name} must be an integer, got {raw!r}.") from exc
+    if value < 0:
+        raise ValueError(f"{ENV_PREFIX}{name} must not be negative, got {value}.")
+    return value
+
+
+def _bool(env: Mapping[str, str], name: str, default: bool) -> bool:
+    raw = env.get(f"{ENV_PREFIX}{name}")
+    if raw is None or not raw.strip():
+        return default
+    value = raw.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{ENV_PREFIX}{name} must be a boolean, got {raw!r}.")
+
+
+def _choice(env: Mapping[str, str], name: str, default: str, choices: tuple[str, ...]) -> str:
+    raw = env.get(f"{ENV_PREFIX}{name}")
+    if raw is None or not raw.strip():
+        return default
+    value = raw.strip().lower()
+    if value not in choices:
+        raise ValueError(f"{ENV_PREFIX}{name} must be one of {', '.join(choices)}, got {raw!r}.")
+    return value
@@ -0,0 +1,643 @@
+"""Incremental FIT wire decoder that reads records straight from a memoryview.
+
+The decoder only understands the FIT *wire* format: file headers, definition messages,
+data messages, compressed timestamps and CRCs. Every definition message is compiled once
+into a `struct.Struct` covering the whole data payload, so decoding a data message is a
+single `unpack_from` call. Mapping the raw values onto FIT profile names, units and
+scaling happens in `projection`.
+
+A tolerant decoder stops at the first record it cannot decode instead of raising, keeping
+everything before it, and reports where and why in `diagnostics`. When the data simply ends
+early, the diagnostics carry a `DecoderState` that a later decoder resumes from once the rest
+of the file is available.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import struct
+import zlib
+from collections.abc import Callable, Collection, Iterator
+from dataclasses import dataclass
+from typing import Any, Literal, NamedTuple
+
+FIT_TAG = b".FIT"
+MIN_HEADER_SIZE = 12
+FILE_CRC_SIZE = 2
+TIMESTAMP_FIELD_ID = 253
+INVALID_TIMESTAMP = 0xFFFFFFFF
+
+_COMPRESSED_HEADER = 0x80
+_DEFINITION_HEADER = 0x40
+_DEVELOPER_DATA_FLAG = 0x20
+_LOCAL_ID_MASK = 0x0F
+_COMPRESSED_LOCAL_ID_MASK = 0x60
+_TIME_OFFSET_MASK = 0x1F
+_TIME_OFFSET_ROLLOVER = 0x20
+
+# FIT base type number -> (struct format character, element size). Strings and raw
+# developer payloads are unpacked as `<size>s` byte strings instead.
+BASE_TYPE_FORMATS: dict[int, tuple[str, int]] = {
+    0x00: ("B", 1),  # enum
+    0x01: ("b", 1),  # sint8
+    0x02: ("B", 1),  # uint8
+    0x83: ("h", 2),  # sint16
+    0x84: ("H", 2),  # uint16
+    0x85: ("i", 4),  # sint32
+    0x86: ("I", 4),  # uint32
+    0x07: ("s", 1),  # string
+    0x88: ("f", 4),  # float32
+    0x89: ("d", 8),  # float64
+    0x0A: ("B", 1),  # uint8z
+    0x8B: ("H", 2),  # uint16z
+    0x8C: ("I", 4),  # uint32z
+    0x0D: ("B", 1),  # byte
+    0x8E: ("q", 8),  # sint64
+    0x8F: ("Q", 8),  # uint64
+    0x90: ("Q", 8),  # uint64z
+}
+
+_HEADER_LAYOUT = struct.Struct("<BBHI4s")
+_CRC_LAYOUT = struct.Struct("<H")
+_DEFINITION_PREFIX = struct.Struct("<BBHB")
+_FIELD_DEFINITION = struct.Struct("BBB")
+_UINT32 = {False: struct.Struct("<I"), True: struct.Struct(">I")}
+# Bytes requested from `RecordDecoder.wait` at a time; larger than any single FIT record.
+_READ_AHEAD = 128 * 1024
+_STATE_VERSION = 1
+
+CrcStatus = Literal["valid", "invalid", "missing"]
+
+
+class FitDecodeError(ValueError):
+    """Raised when FIT bytes cannot be decoded."""
+
+
+def _build_crc_table() -> tuple[int, ...]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def crc16(data: bytes | memoryview, crc: int = 0) -> int:
+    """Compute the FIT CRC-16 of `data`, continuing from `crc`."""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+class FitHeader(NamedTuple):
+    """FIT file header fields, as stored on the wire."""
+
+    header_size: int
+    protocol_version: int
+    profile_version: int
+    records_size: int
+    crc: int | None
+
+    @property
+    def protocol_version_str(self) -> str:
+        return f"{self.protocol_version >> 4}.{self.protocol_version & 0x0F}"
+
+    @property
+    def profile_version_str(self) -> str:
+        scale = 1000 if self.profile_version > 2199 else 100
+        return f"{self.profile_version // scale}.{self.profile_version % scale}"
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class LocalDefinition:
+    """Compiled definition message for one local message type.
+
+    `fields` holds `(field_id, size, base_type)` triples and `developer_fields` holds
+    `(field_id, size, developer_data_index)` triples, both in wire order. `slices[i]` is
+    the `(start, stop)` range of field `i` inside the tuple returned by `layout`, followed
+    by the developer fields. `byte_offsets[i]` is the byte offset of field `i` inside the
+    data payload.
+    """
+
+    local_id: int
+    global_id: int
+    big_endian: bool
+    fields: tuple[tuple[int, int, int], ...]
+    developer_fields: tuple[tuple[int, int, int], ...]
+    layout: struct.Struct
+    slices: tuple[tuple[int, int], ...]
+    byte_offsets: tuple[int, ...]
+    timestamp_offset: int | None
+
+
+class RawData(NamedTuple):
+    """Decoded data message: unpacked payload values plus decoder context.
+
+    `offset` is the payload position inside the decoded buffer and `timestamp` is the
+    reconstructed FIT `date_time` for compressed-timestamp headers (otherwise None).
+    """
+
+    definition: LocalDefinition
+    values: tuple[Any, ...]
+    offset: int
+    timestamp: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class DecoderState:
+    """Where a tolerant decode of a truncated segment stopped, enough to continue it later.
+
+    `offset` is the file offset of the first record that was not decoded, `segment_start` the
+    file offset of its segment's header and `crc` the CRC-16 of the segment bytes before
+    `offset`. `definitions` holds the local message definitions in effect, by local id.
+    """
+
+    header: FitHeader
+    segment_start: int
+    offset: int
+    crc: int
+    last_timestamp: int | None
+    record_index: int
+    definitions: tuple[LocalDefinition | None, ...]
+
+    def token(self) -> str:
+        """Encode the state as a compact URL-safe string."""
+        definitions = [
+            [item.local_id, item.global_id, item.big_endian, item.fields, item.developer_fields]
+            for item in self.definitions
+            if item is not None
+        ]
+        state = [
+            _STATE_VERSION,
+            list(self.header),
+            self.segment_start,
+            self.offset,
+            self.crc,
+            self.last_timestamp,
+            self.record_index,
+            definitions,
+        ]
+        packed = zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+        return base64.urlsafe_b64encode(packed).rstrip(b"=").decode()
+
+    @classmethod
+    def from_token(cls, token: str) -> DecoderState:
+        """Decode a `token()` string, raising `FitDecodeError` when it is not valid."""
+        try:
+            padded = token.encode() + b"=" * (-len(token) % 4)
+            state = json.loads(zlib.decompress(base64.urlsafe_b64decode(padded)))
+            version, header, segment_start, offset, crc, timestamp, index, definitions = state
+            if version != _STATE_VERSION:
+                raise ValueError(f"unsupported version {version!r}")
+            header_size, protocol_version, profile_version, records_size, header_crc = header
+            fit_header = FitHeader(
+                int(header_size),
+                int(protocol_version),
+                int(profile_version),
+                int(records_size),
+                None if header_crc is None else int(header_crc),
+            )
+            table: list[LocalDefinition | None] = [None] * 16
+            for local_id, global_id, big_endian, fields, developer_fields in definitions:
+                if not 0 <= local_id < len(table):
+                    raise ValueError(f"invalid local message {local_id!r}")
+                table[local_id] = _compile_definition(
+                    int(local_id),
+                    int(global_id),
+                    bool(big_endian),
+                    tuple((int(a), int(b), int(c)) for a, b, c in fields),
+                    tuple((int(a), int(b), int(c)) for a, b, c in developer_fields),
+                )
+            records_end = segment_start + fit_header.header_size + fit_header.records_size
+            if not 0 <= segment_start < offset <= records_end:
+                raise ValueError("offset outside of its segment")
+            return cls(
+                header=fit_header,
+                segment_start=int(segment_start),
+                offset=int(offset),
+                crc=int(crc) & 0xFFFF,
+                last_timestamp=None if timestamp is None else int(timestamp),
+                record_index=int(index),
+                definitions=tuple(table),
+            )
+        except (ValueError, TypeError, struct.error, zlib.error, binascii.Error) as exc:
+            raise FitDecodeError(f"Invalid resume token: {exc}") from exc
+
+
+@dataclass(frozen=True, slots=True)
+class Recovery:
+    """Tolerant decoding requested for a parse, optionally continuing a saved decode."""
+
+    resume: DecoderState | None = None
+
+    def cache_token(self) -> str:
+        """Stable text form of the options, for response cache keys."""
+        return f"tolerant={self.resume.token() if self.resume is not None else ''}"
+
+
+@dataclass(frozen=True, slots=True)
+class DecodeDiagnostics:
+    """Outcome of a tolerant decode.
+
+    `offset` is the file offset decoding stopped at (the end of the data when it ran to the
+    end) and `error` says why it stopped early. `crc` is "invalid" when any file CRC did not
+    match and "missing" when the last one was never reached. `resume` is set when the data
+    ended before its segment did, so decoding can continue from `offset`.
+    """
+
+    offset: int
+    crc: CrcStatus
+    error: str | None = None
+    resume: DecoderState | None = None
+
+    @property
+    def complete(self) -> bool:
+        return self.error is None
+
+
+def read_header(view: memoryview, offset: int = 0) -> FitHeader:
+    """Decode and validate the FIT file header at `offset`."""
+    if len(view) - offset < 1:
+        raise FitDecodeError("FIT data is empty; expected at least a header-size byte.")
+
+    header_size = view[offset]
+    if header_size < MIN_HEADER_SIZE:
+        raise FitDecodeError(
+            f"FIT header size must be at least {MIN_HEADER_SIZE} bytes, got {header_size}."
+        )
+    if len(view) - offset < header_size:
+        raise FitDecodeError("Truncated FIT input while reading the file header.")
+
+    _, protocol_version, profile_version, records_size, tag = _HEADER_LAYOUT.unpack_from(
+        view, offset
+    )
+    if tag != FIT_TAG:
+        raise FitDecodeError('Invalid FIT header: ".FIT" not in header.')
+
+    crc: int | None = None
+    if header_size > MIN_HEADER_SIZE:
+        (crc,) = _CRC_LAYOUT.unpack_from(view, offset + header_size - 2)
+        calculated = crc16(view[offset : offset + header_size - 2])
+        if calculated != crc:
+            raise FitDecodeError(
+                f"Calculated header crc ({hex(calculated)}) does not match "
+                f"crc in header ({hex(crc)})."
+            )
+
+    return FitHeader(header_size, protocol_version, profile_version, records_size, crc)
+
+
+def looks_like_header(view: memoryview, offset: int) -> bool:
+    """Return True when the bytes at `offset` start another (chained) FIT header."""
+    if offset + MIN_HEADER_SIZE > len(view):
+        return False
+    header_size = view[offset]
+    if header_size < MIN_HEADER_SIZE or offset + header_size > len(view):
+        return False
+    return bytes(view[offset + 8 : offset + 12]) == FIT_TAG
+
+
+def split_segments(data: bytes | bytearray | memoryview) -> list[tuple[int, memoryview]]:
+    """Slice a FIT stream into its chained segments by walking their headers.
+
+    Returns `(file offset, bytes)` per segment; each slice is a FIT file of its own that can be
+    decoded independently. Bytes after the last segment that do not start another header stay
+    in the last slice, so decoding it reports them, and a truncated last segment is returned
+    as far as it goes.
+    """
+    view = memoryview(data).cast("B")
+    segments: list[tuple[int, memoryview]] = []
+    offset = 0
+    while True:
+        header = read_header(view, offset)
+        end = offset + header.header_size + header.records_size + FILE_CRC_SIZE
+        if end >= len(view) or not looks_like_header(view, end):
+            segments.append((offset, view[offset:]))
+            return segments
+        segments.append((offset, view[offset:end]))
+        offset = end
+
+
+class RecordDecoder:
+    """Iterate over the definition and data messages of a FIT buffer.
+
+    Iterating yields a `LocalDefinition` for each definition message and a `RawData`
+    tuple for each data message, across every chained segment of the buffer. The file
+    CRC of each segment is verified once its records have been consumed, and the
+    per-segment CRCs are available from `crcs` afterwards.
+
+    When `global_ids` is given, definitions and data messages of other global message types
+    are skipped without unpacking their payloads (their timestamps still feed compressed
+    timestamp headers).
+
+    `data` may still be filling in: `wait(end)` is then called before bytes below `end` are
+    read and must block until they are available (the header must be there already).
+
+    A `tolerant` decoder ends the iteration at the first record it cannot decode, or at a file
+    CRC mismatch, and sets `diagnostics` once iteration is over. With `resume`, `data` holds
+    the file's bytes from `resume.offset` on: the saved definitions are yielded again first,
+    then decoding continues where the earlier decoder stopped.
+
+    With `stop`, iteration ends at the record that starts at that file offset, without
+    checking the CRC of the segment it is in.
+    """
+
+    def __init__(
+        self,
+        data: bytes | bytearray | memoryview,
+        global_ids: Collection[int] | None = None,
+        wait: Callable[[int], None] | None = None,
+        *,
+        tolerant: bool = False,
+        resume: DecoderState | None = None,
+        stop: int | None = None,
+    ) -> None:
+        self.view = memoryview(data).cast("B")
+        self.resume = resume
+        # File offset of `view[0]`; only non-zero when continuing a saved decode.
+        self.base = resume.offset if resume is not None else 0
+        self.header = resume.header if resume is not None else read_header(self.view)
+        self.global_ids = frozenset(global_ids) if global_ids is not None else None
+        self.wait = wait
+        self.tolerant = tolerant
+        self.stop = stop
+        self.crcs: list[int] = []
+        self.diagnostics: DecodeDiagnostics | None = None
+        self._crc_status: CrcStatus = "valid"
+        self._halted = False
+
+    def __iter__(self) -> Iterator[LocalDefinition | RawData]:
+        view = self.view
+        header = self.header
+        resume = self.resume
+        offset = resume.segment_start - self.base if resume is not None else 0
+        while True:
+            yield from self._iter_segment(header, offset, resume)
+            if self.diagnostics is not None or self._halted:
+                return
+            resume = None
+            offset += header.header_size + header.records_size + FILE_CRC_SIZE
+            if offset >= len(view):
+                break
+            if self.wait is not None:
+                self.wait(min(len(view), offset + 255))
+            try:
+                if not looks_like_header(view, offset):
+                    raise FitDecodeError(
+                        f"Trailing {len(view) - offset} byte(s) after FIT segment at offset "
+                        f"{self.base + offset} are not a chained FIT header."
+                    )
+                header = read_header(view, offset)
+            except FitDecodeError as exc:
+                if not self.tolerant:
+                    raise
+                self.diagnostics = DecodeDiagnostics(self.base + offset, self._crc_status, str(exc))
+                return
+        if self.tolerant:
+            self.diagnostics = DecodeDiagnostics(self.base + len(view), self._crc_status)
+
+    def _iter_segment(
+        self, header: FitHeader, start: int, resume: DecoderState | None
+    ) -> Iterator[LocalDefinition | RawData]:
+        view = self.view
+        base = self.base
+        end = start + header.header_size + header.records_size
+        truncated = len(view) < end + FILE_CRC_SIZE
+        if truncated and not self.tolerant:
+            raise FitDecodeError("FIT data is truncated before the declared records and file CRC.")
+        # Records must end before `end`, and before the end of the data when it is truncated.
+        limit = min(end, len(view))
+        halt = end if self.stop is None else min(end, self.stop - base)
+
+        wanted = self.global_ids
+        wait = self.wait
+        # Bytes known to be received; only tracked when `data` is still filling in.
+        available = 0
+        definitions: list[LocalDefinition | None]
+        if resume is None:
+            position = start + header.header_size
+            definitions = [None] * 16
+            last_timestamp: int | None = None
+            record_index = 0
+            crc_start, crc = start, 0
+        else:
+            position = 0
+            definitions = list(resume.definitions)
+            last_timestamp = resume.last_timestamp
+            record_index = resume.record_index
+            crc_start, crc = 0, resume.crc
+            for definition in definitions:
+                if definition is not None and (wanted is None or definition.global_id in wanted):
+                    yield definition
+        record_start = position
+        previous_timestamp = last_timestamp
+
+        try:
+            while position < halt:
+                record_start, previous_timestamp = position, last_timestamp
+                if position >= len(view):
+                    raise FitDecodeError(
+                        f"FIT data ends at byte offset {base + position}, before record "
+                        f"{record_index}."
+                    )
+                if wait is not None and position + _READ_AHEAD > available:
+                    if available < end + FILE_CRC_SIZE:
+                        available = min(end + FILE_CRC_SIZE, position + 2 * _READ_AHEAD)
+                        wait(min(available, len(view)))
+                record_header = view[position]
+                timestamp: int | None = None
+
+                if record_header & _COMPRESSED_HEADER:
+                    local_id = (record_header & _COMPRESSED_LOCAL_ID_MASK) >> 5
+                    if last_timestamp is None:
+                        raise FitDecodeError(
+                            f"Compressed timestamp at record {record_index} requires a prior "
+                            f"full timestamp field ({TIMESTAMP_FIELD_ID})."
+                        )
+                    time_offset = record_header & _TIME_OFFSET_MASK
+                    timestamp = (last_timestamp & ~_TIME_OFFSET_MASK) + time_offset
+                    if time_offset < (last_timestamp & _TIME_OFFSET_MASK):
+                        timestamp += _TIME_OFFSET_ROLLOVER
+                    last_timestamp = timestamp
+                elif record_header & _DEFINITION_HEADER:
+                    definition, position = _read_definition(
+                        view, position, limit, record_header, base
+                    )
+                    definitions[definition.local_id] = definition
+                    record_index += 1
+                    if wanted is None or definition.global_id in wanted:
+                        yield definition
+                    continue
+                else:
+                    local_id = record_header & _LOCAL_ID_MASK
+
+                current = definitions[local_id]
+                if current is None:
+                    raise FitDecodeError(
+                        f"Data record {record_index} at byte offset {base + position} references "
+                        f"undefined local message {local_id}."
+                    )
+                payload_offset = position + 1
+                position = payload_offset + current.layout.size
+                if position > limit:
+                    problem = (
+                        "exceeds the declared records section" if position > end else "is truncated"
+                    )
+                    raise FitDecodeError(
+                        f"Record {record_index} at byte offset {base + payload_offset - 1} "
+                        f"{problem}."
+                    )
+
+                if timestamp is None and current.timestamp_offset is not None:
+                    (native,) = _UINT32[current.big_endian].unpack_from(
+                        view, payload_offset + current.timestamp_offset
+                    )
+                    if native != INVALID_TIMESTAMP:
+                        last_timestamp = native
+
+                record_index += 1
+                if wanted is not None and current.global_id not in wanted:
+                    continue
+                values = current.layout.unpack_from(view, payload_offset)
+                yield RawData(current, values, payload_offset, timestamp)
+
+            if position < end:
+                self._halted = True
+                return
+            record_start, previous_timestamp = position, last_timestamp
+            if truncated:
+                raise FitDecodeError(
+                    f"FIT data ends before the file CRC at byte offset {base + end}."
+                )
+        except FitDecodeError as exc:
+            if not self.tolerant:
+                raise
+            state = None
+            if truncated:
+                state = DecoderState(
+                    header=header,
+                    segment_start=base + start,
+                    offset=base + record_start,
+                    crc=crc16(view[crc_start:record_start], crc),
+                    last_timestamp=previous_timestamp,
+                    record_index=record_index,
+                    definitions=tuple(definitions),
+                )
+            status: CrcStatus = "invalid" if self._crc_status == "invalid" else "missing"
+            self.diagnostics = DecodeDiagnostics(base + record_start, status, str(exc), state)
+            return
+
+        if wait is not None:
+            wait(end + FILE_CRC_SIZE)
+        calculated = crc16(view[crc_start:end], crc)
+        (stored,) = _CRC_LAYOUT.unpack_from(view, end)
+        if calculated != stored:
+            if not self.tolerant:
+                raise FitDecodeError(
+                    f"Calculated crc ({hex(calculated)}) does not match crc in file "
+                    f"({hex(stored)})."
+                )
+            self._crc_status = "invalid"
+        self.crcs.append(calculated)
+
+
+def _read_definition(
+    view: memoryview, position: int, end: int, record_header: int, base: int = 0
+) -> tuple[LocalDefinition, int]:
+    """Parse the definition message at `position` and compile its payload layout.
+
+    `base` is the file offset of `view[0]`, used in error messages.
+    """
+    start = position
+    position += 1
+    if position + _DEFINITION_PREFIX.size > end:
+        raise FitDecodeError(f"Definition record at byte offset {base + start} is truncated.")
+
+    _, architecture, global_id, field_count = _DEFINITION_PREFIX.unpack_from(view, position)
+    big_endian = architecture == 1
+    if big_endian:
+        (global_id,) = struct.unpack_from(">H", view, position + 2)
+    position += _DEFINITION_PREFIX.size
+
+    fields, position = _read_field_definitions(view, position, end, field_count, base + start)
+    developer_fields: tuple[tuple[int, int, int], ...] = ()
+    if record_header & _DEVELOPER_DATA_FLAG:
+        if position + 1 > end:
+            raise FitDecodeError(f"Definition record at byte offset {base + start} is truncated.")
+        developer_count = view[position]
+        developer_fields, position = _read_field_definitions(
+            view, position + 1, end, developer_count, base + start
+        )
+
+    definition = _compile_definition(
+        record_header & _LOCAL_ID_MASK, global_id, big_endian, fields, developer_fields
+    )
+    return definition, position
+
+
+def _compile_definition(
+    local_id: int,
+    global_id: int,
+    big_endian: bool,
+    fields: tuple[tuple[int, int, int], ...],
+    developer_fields: tuple[tuple[int, int, int], ...],
+) -> LocalDefinition:
+    """Compile the payload layout of a definition message."""
+    formats = [">" if big_endian else "<"]
+    slices: list[tuple[int, int]] = []
+    byte_offsets: list[int] = []
+    timestamp_offset: int | None = None
+    index = 0
+    byte_offset = 0
+    for field_id, size, base_type in fields:
+        if base_type not in BASE_TYPE_FORMATS:
+            raise FitDecodeError(f"{base_type} is not a valid FIT base type.")
+        code, element_size = BASE_TYPE_FORMATS[base_type]
+        if code == "s" or size % element_size:
+            formats.append(f"{size}s")
+            count = 1
+        else:
+            count = size // element_size
+            formats.append(f"{count}{code}")
+        if field_id == TIMESTAMP_FIELD_ID and size >= 4 and timestamp_offset is None:
+            timestamp_offset = byte_offset
+        slices.append((index, index + count))
+        byte_offsets.append(byte_offset)
+        index += count
+        byte_offset += size
+
+    for _, size, _ in developer_fields:
+        formats.append(f"{size}s")
+        slices.append((index, index + 1))
+        byte_offsets.append(byte_offset)
+        index += 1
+        byte_offset += size
+
+    return LocalDefinition(
+        local_id=local_id,
+        global_id=global_id,
+        big_endian=big_endian,
+        fields=fields,
+        developer_fields=developer_fields,
+        layout=struct.Struct("".join(formats)),
+        slices=tuple(slices),
+        byte_offsets=tuple(byte_offsets),
+        timestamp_offset=timestamp_offset,
+    )
+
+
+def _read_field_definitions(
+    view: memoryview, position: int, end: int, count: int, record_start: int
+) -> tuple[tuple[tuple[int, int, int], ...], int]:
+    stop = position + count * _FIELD_DEFINITION.size
+    if stop > end:
+        raise FitDecodeError(f"Definition record at byte offset {record_start} is truncated.")
+    fields = tuple(_FIELD_DEFINITION.iter_unpack(view[position:stop]))
+    return fields, stop
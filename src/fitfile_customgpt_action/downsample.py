@@ -0,0 +1,183 @@
+"""Downsampling of the `record` stream for `/fit/parse` responses.
+
+A 1 Hz ride yields thousands of `record` messages, far more than an LLM needs to see.
+`downsample_records` reduces them to about `points` rows before the response is built, so the
+smaller response is also cheaper to serialize. Other messages keep their place in the output.
+
+* `decimate` keeps every n-th record.
+* `bucket` splits the records into `points` equal time buckets and emits one record per
+  bucket, averaging numeric fields and taking other values from the bucket's first record.
+* `lttb` keeps the records chosen by Largest-Triangle-Three-Buckets on one numeric field
+  (x = timestamp), which preserves peaks and the overall shape of that series.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Literal
+
+from .models import DataFieldDict, DataRecordDict, JSONValue, RecordDict
+
+DownsampleMethod = Literal["decimate", "bucket", "lttb"]
+
+RECORD_GLOBAL_ID = 20
+TIMESTAMP_NAME = "timestamp"
+# Fields LTTB follows when none is requested, in order of preference.
+LTTB_FIELDS = ("power", "heart_rate", "enhanced_speed", "speed", "enhanced_altitude", "altitude")
+
+
+@dataclass(frozen=True, slots=True)
+class Downsampling:
+    """How to reduce the `record` stream: method, target row count and LTTB field."""
+
+    method: DownsampleMethod
+    points: int
+    field: str | None = None
+
+    def cache_token(self) -> str:
+        """Stable text form of the options, for response cache keys."""
+        return f"downsample={self.method}:{self.points}:{self.field or ''}"
+
+
+def downsample_records(
+    records: Sequence[RecordDict], downsampling: Downsampling
+) -> list[RecordDict]:
+    """Return `records` with the `record` data messages reduced to about `points` rows."""
+    positions: list[int] = []
+    rows: list[DataRecordDict] = []
+    for index, record in enumerate(records):
+        if record["kind"] == "data" and record["global_id"] == RECORD_GLOBAL_ID:
+            positions.append(index)
+            rows.append(record)
+    if len(rows) <= downsampling.points:
+        return list(records)
+
+    replacements: dict[int, DataRecordDict]
+    if downsampling.method == "decimate":
+        stride = math.ceil(len(rows) / downsampling.points)
+        replacements = {positions[index]: rows[index] for index in range(0, len(rows), stride)}
+    elif downsampling.method == "bucket":
+        replacements = {
+            positions[start]: _average(rows[start:stop])
+            for start, stop in _time_buckets(rows, downsampling.points)
+        }
+    else:
+        kept = _lttb(rows, downsampling.points, downsampling.field)
+        replacements = {positions[index]: rows[index] for index in kept}
+
+    dropped = set(positions)
+    output: list[RecordDict] = []
+    for index, record in enumerate(records):
+        if index not in dropped:
+            output.append(record)
+        elif index in replacements:
+            output.append(replacements[index])
+    return output
+
+
+def _number(value: JSONValue | None) -> float | None:
+    if isinstance(value, int | float) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    return None
+
+
+def _field_value(row: DataRecordDict, name: str) -> JSONValue | None:
+    return next((field["value"] for field in row["fields"] if field["name"] == name), None)
+
+
+def _timestamps(rows: Sequence[DataRecordDict]) -> list[float]:
+    """Row timestamps, carrying the last known one forward (row index when there is none)."""
+    stamps: list[float] = []
+    last: float | None = None
+    for index, row in enumerate(rows):
+        stamp = _number(_field_value(row, TIMESTAMP_NAME))
+        last = stamp if stamp is not None else last
+        stamps.append(last if last is not None else float(index))
+    return stamps
+
+
+def _time_buckets(rows: Sequence[DataRecordDict], points: int) -> list[tuple[int, int]]:
+    """Split time-ordered rows into at most `points` equal time ranges; returns row slices."""
+    stamps = _timestamps(rows)
+    first, last = stamps[0], stamps[-1]
+    width = (last - first) / points
+    if width <= 0:
+        size = math.ceil(len(rows) / points)
+        return [(start, min(start + size, len(rows))) for start in range(0, len(rows), size)]
+    buckets: list[tuple[int, int]] = []
+    start = 0
+    current = 0
+    for index, stamp in enumerate(stamps):
+        bucket = min(max(int((stamp - first) / width), 0), points - 1)
+        if bucket != current and index > start:
+            buckets.append((start, index))
+            start = index
+        current = bucket
+    buckets.append((start, len(rows)))
+    return buckets
+
+
+def _average(rows: Sequence[DataRecordDict]) -> DataRecordDict:
+    """One record for a bucket: numeric fields averaged, the rest from the first row."""
+    if len(rows) == 1:
+        return rows[0]
+    fields: dict[tuple[int, str], tuple[DataFieldDict, list[float]]] = {}
+    for row in rows:
+        for field in row["fields"]:
+            key = (field["field_id"], field["name"])
+            entry = fields.setdefault(key, (field, []))
+            number = _number(field["value"])
+            if number is not None:
+                entry[1].append(number)
+
+    averaged: list[DataFieldDict] = []
+    for field, numbers in fields.values():
+        value = field["value"]
+        if field["name"] != TIMESTAMP_NAME and numbers and _number(value) is not None:
+            value = round(math.fsum(numbers) / len(numbers), 3)
+        averaged.append({**field, "value": value})
+    return {**rows[0], "fields": averaged}
+
+
+def _lttb(rows: Sequence[DataRecordDict], points: int, field: str | None) -> list[int]:
+    """Indices of the rows Largest-Triangle-Three-Buckets keeps for `field`."""
+    name = field or next(
+        (name for name in LTTB_FIELDS if any(_field_value(row, name) is not None for row in rows)),
+        None,
+    )
+    values = [_number(_field_value(row, name)) if name else None for row in rows]
+    stamps = _timestamps(rows)
+    candidates = [index for index, value in enumerate(values) if value is not None]
+    if len(candidates) <= points or points < 3:
+        # Nothing to shape: fall back to an even spread over the rows.
+        stride = math.ceil(len(rows) / points)
+        return list(range(0, len(rows), stride))
+
+    ys = [values[index] or 0.0 for index in candidates]
+    xs = [stamps[index] for index in candidates]
+    kept = [0]
+    size = (len(candidates) - 2) / (points - 2)
+    for bucket in range(points - 2):
+        start = int(bucket * size) + 1
+        stop = int((bucket + 1) * size) + 1
+        # Average of the next bucket (or the last point) is the triangle's third corner.
+        next_start, next_stop = stop, min(int((bucket + 2) * size) + 1, len(candidates))
+        if next_start >= next_stop:
+            next_start, next_stop = len(candidates) - 1, len(candidates)
+        average_x = math.fsum(xs[next_start:next_stop]) / (next_stop - next_start)
+        average_y = math.fsum(ys[next_start:next_stop]) / (next_stop - next_start)
+
+        anchor_x, anchor_y = xs[kept[-1]], ys[kept[-1]]
+        best, best_area = start, -1.0
+        for index in range(start, stop):
+            area = abs(
+                (anchor_x - average_x) * (ys[index] - anchor_y)
+                - (anchor_x - xs[index]) * (average_y - anchor_y)
+            )
+            if area > best_area:
+                best, best_area = index, area
+        kept.append(best)
+    kept.append(len(candidates) - 1)
+    return [candidates[index] for index in kept]
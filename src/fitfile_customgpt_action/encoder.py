@@ -0,0 +1,302 @@
+"""Incremental FIT encoder behind `/fit/produce`.
+
+`RecordWriter` encodes data messages one at a time and emits a definition message only when no
+active definition can encode the next message: definitions are pooled over the 16 local
+message types and evicted least recently used first, so interleaved message types do not
+redefine each other. `add_columns` encodes runs of column-oriented rows, packing a row directly
+from the active definition when it sets the same scalar fields as the previous one. Encoded
+bytes go to a small in-memory buffer that spills to a temporary file, so building a large file
+never holds it in memory. `iter_fit_bytes` then streams the header, the records section and the
+file CRC in fixed-size chunks, updating the CRC as it goes; the header's data size is known up
+front because the records are encoded first.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import IO
+
+from fit_tool.base_type import BaseType
+from fit_tool.data_message import DataMessage
+from fit_tool.definition_message import DefinitionMessage
+from fit_tool.endian import Endian
+from fit_tool.exceptions import FitEncodingError
+from fit_tool.field import Field
+from fit_tool.fit_file_header import FitFileHeader
+from fit_tool.record import Record
+from fit_tool.validation import validate_definition, validate_message_header
+
+from .decoder import crc16
+from .models import JSONValue
+
+LOCAL_MESSAGE_TYPES = 16
+_Layout = tuple[object, ...]
+# (field position in the message class, one value per row) pairs accepted by `add_columns`.
+Columns = Sequence[tuple[int, Sequence[JSONValue | None]]]
+
+# Encoded records beyond this size are written to a temporary file instead of memory.
+SPILL_THRESHOLD = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+_FILE_CRC = struct.Struct("<H")
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedRecords:
+    """Records section of a FIT file, held in memory or in a temporary file at `path`.
+
+    Instances are picklable so they can be returned from a process-pool worker.
+    """
+
+    size: int
+    data: bytes = b""
+    path: str | None = None
+
+    @property
+    def file_size(self) -> int:
+        """Size of the complete FIT file: header, records and the trailing CRC."""
+        return len(_header(self.size)) + self.size + _FILE_CRC.size
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        if self.path is None:
+            view = memoryview(self.data)
+            for start in range(0, len(view), chunk_size):
+                yield bytes(view[start : start + chunk_size])
+            return
+        with open(self.path, "rb") as handle:
+            while chunk := handle.read(chunk_size):
+                yield chunk
+
+    def discard(self) -> None:
+        """Delete the backing temporary file, if any; safe to call more than once."""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class RecordWriter:
+    """Encode data messages (and the definitions they need) into a records section.
+
+    Definitions are pooled over the 16 local message types: every distinct layout (global
+    message, endianness and field definitions) keeps its local type until it is the least
+    recently used one and a new layout needs the slot, so interleaved message types are
+    defined once instead of on every switch. A message whose layout fits an active definition
+    (same fields, no larger sizes) reuses it.
+    """
+
+    def __init__(self, spill_threshold: int = SPILL_THRESHOLD) -> None:
+        self.spill_threshold = spill_threshold
+        self.size = 0
+        self._buffer = bytearray()
+        self._file: IO[bytes] | None = None
+        # Local message type -> active definition, least recently used first.
+        self._definitions: OrderedDict[int, DefinitionMessage] = OrderedDict()
+        self._layouts: dict[_Layout, int] = {}
+
+    def add(self, message: DataMessage, local_id: int | None = None) -> None:
+        """Encode `message`, pinning it to `local_id` when given instead of pooling."""
+        if local_id is not None:
+            message.local_id = local_id
+        validate_message_header(message)
+        candidate = DefinitionMessage.from_data_message(message)
+        validate_definition(candidate)
+        slot = self._active_slot(candidate, local_id)
+        if slot is None:
+            slot = self._claim_slot(candidate, local_id)
+            self._write(Record.from_message(candidate).to_bytes())
+        self._definitions.move_to_end(slot)
+        message.local_id = slot
+        message.set_definition_message(self._definitions[slot])
+        self._write(Record.from_message(message).to_bytes())
+
+    def add_columns(self, message_cls: type[DataMessage], columns: Columns, rows: int) -> None:
+        """Encode `rows` messages of `message_cls`, taking row `i` from each column's item `i`.
+
+        `None` items leave the field unset and list items fill array fields. A row that sets
+        the same fields as the previous one, with one number each, is packed straight from
+        the active definition; any other row goes through `add`, so the output is identical.
+        """
+        layout: _RowLayout | None = None
+        for row in range(rows):
+            values = [(position, column[row]) for position, column in columns]
+            values = [(position, value) for position, value in values if value is not None]
+            if layout is not None and self._definitions.get(layout.local_id) is layout.definition:
+                packed = layout.pack(values)
+                if packed is not None:
+                    self._definitions.move_to_end(layout.local_id)
+                    self._write(packed)
+                    continue
+
+            message = message_cls()
+            for position, value in values:
+                field = message.fields[position]
+                if isinstance(value, list):
+                    for index, item in enumerate(value):
+                        field.set_value(index, item)
+                else:
+                    field.set_value(0, value)
+            self.add(message)
+            layout = _RowLayout.compile(message, [position for position, _ in values])
+
+    def finish(self) -> EncodedRecords:
+        """Return the encoded records; the writer must not be used afterwards."""
+        if self._file is None:
+            return EncodedRecords(self.size, bytes(self._buffer))
+        self._flush()
+        self._file.close()
+        return EncodedRecords(self.size, path=self._file.name)
+
+    def abort(self) -> None:
+        """Drop everything written so far, removing the spill file if one was created."""
+        self._buffer.clear()
+        if self._file is not None:
+            self._file.close()
+            EncodedRecords(self.size, path=self._file.name).discard()
+            self._file = None
+
+    def _active_slot(self, candidate: DefinitionMessage, pinned: int | None) -> int | None:
+        """Return the local type whose active definition can encode `candidate`, if any."""
+        if pinned is not None:
+            slots: Iterable[int] = [pinned] if pinned in self._definitions else []
+        else:
+            slot = self._layouts.get(_layout(candidate))
+            slots = [slot] if slot is not None else self._definitions
+        for slot in slots:
+            # `supports` also compares local ids, so try the candidate on each slot.
+            candidate.local_id = slot
+            if self._definitions[slot].supports(candidate):
+                return slot
+        return None
+
+    def _claim_slot(self, candidate: DefinitionMessage, pinned: int | None) -> int:
+        """Make `candidate` the active definition of a free, pinned or least recent slot."""
+        if pinned is not None:
+            slot = pinned
+        elif len(self._definitions) < LOCAL_MESSAGE_TYPES:
+            slot = min(set(range(LOCAL_MESSAGE_TYPES)).difference(self._definitions))
+        else:
+            slot = next(iter(self._definitions))
+        previous = self._definitions.pop(slot, None)
+        if previous is not None:
+            self._layouts.pop(_layout(previous), None)
+        candidate.local_id = slot
+        self._definitions[slot] = candidate
+        self._layouts[_layout(candidate)] = slot
+        return slot
+
+    def _write(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        self.size += len(chunk)
+        if len(self._buffer) >= self.spill_threshold:
+            if self._file is None:
+                self._file = tempfile.NamedTemporaryFile(
+                    prefix="fit-", suffix=".records", delete=False
+                )
+            self._flush()
+
+    def _flush(self) -> None:
+        assert self._file is not None
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+
+def _layout(definition: DefinitionMessage) -> _Layout:
+    return (
+        definition.global_id,
+        definition.endian,
+        tuple(
+            (field.field_id, field.size, field.base_type) for field in definition.field_definitions
+        ),
+        tuple(
+            (field.developer_data_index, field.field_id, field.size)
+            for field in definition.developer_field_definitions
+        ),
+    )
+
+
+class _RowLayout:
+    """Byte layout of a data message whose fields each hold a single number."""
+
+    def __init__(
+        self,
+        message: DataMessage,
+        positions: list[int],
+        fields: list[tuple[Field, struct.Struct]],
+    ) -> None:
+        assert message.definition_message is not None
+        self.local_id = message.local_id
+        self.definition = message.definition_message
+        self.positions = positions
+        self.fields = fields
+        self.header = bytes(Record.from_message(message).header.to_bytes())
+
+    @classmethod
+    def compile(cls, message: DataMessage, positions: list[int]) -> _RowLayout | None:
+        """Describe how `message` (just written by `add`) was encoded, if it can be reused."""
+        definition = message.definition_message
+        if definition is None or message.developer_fields or definition.developer_field_definitions:
+            return None
+        byte_order = "<" if message.endian == Endian.LITTLE else ">"
+        by_id = {message.fields[position].field_id: position for position in positions}
+        ordered: list[int] = []
+        fields: list[tuple[Field, struct.Struct]] = []
+        for field_definition in definition.field_definitions:
+            position = by_id.pop(field_definition.field_id, None)
+            if position is None:
+                return None
+            field = message.fields[position]
+            base_type = field.base_type
+            if (
+                base_type == BaseType.STRING
+                or field.length != 1
+                or field_definition.size != base_type.size
+            ):
+                return None
+            ordered.append(position)
+            fields.append((field, struct.Struct(byte_order + base_type.struct_format)))
+        if by_id:
+            return None
+        return cls(message, ordered, fields)
+
+    def pack(self, values: list[tuple[int, JSONValue | None]]) -> bytes | None:
+        """Encode a row like fit_tool would, or return None if it needs a new layout."""
+        by_position = dict(values)
+        if len(by_position) != len(self.positions):
+            return None
+        chunks = [self.header]
+        for position, (field, layout) in zip(self.positions, self.fields, strict=True):
+            value = by_position.get(position)
+            if value is None or isinstance(value, (list, str)):
+                return None
+            encoded = field.encode_value(value)
+            if not field.base_type.is_valid(encoded):
+                raise FitEncodingError(
+                    f"{field.name} encoded value {encoded} is not in valid range "
+                    f"[{field.base_type.min}, {field.base_type.max}]"
+                )
+            chunks.append(layout.pack(encoded))
+        return b"".join(chunks)
+
+
+def iter_fit_bytes(records: EncodedRecords, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Stream a complete FIT file for `records`, discarding its spill file at the end."""
+    try:
+        header = _header(records.size)
+        crc = crc16(header)
+        yield header
+        for chunk in records.chunks(chunk_size):
+            crc = crc16(chunk, crc)
+            yield chunk
+        yield _FILE_CRC.pack(crc)
+    finally:
+        records.discard()
+
+
+def _header(records_size: int) -> bytes:
+    return bytes(FitFileHeader(records_size=records_size).to_bytes())
@@ -0,0 +1,128 @@
+"""Bounded worker pool that keeps CPU-bound FIT work off the event loop.
+
+`WorkExecutor.run` hands a function to a thread or process pool and awaits the result, and
+`WorkExecutor.stream` pulls a blocking iterator (such as an NDJSON response body) through the
+pool as one long-running job. Submissions beyond `workers + max_queue` in-flight jobs are
+refused with `ExecutorSaturatedError` instead of piling up, so routes can answer with 503 and
+keep the event loop (and `/fit/healthz`) responsive.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import dataclass
+from typing import Any, Literal, cast
+
+from fastapi import HTTPException
+
+ExecutorKind = Literal["thread", "process"]
+
+
+_EXHAUSTED = object()
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a job is submitted while the executor queue is full."""
+
+
+@dataclass(frozen=True, slots=True)
+class _Failure:
+    """Picklable stand-in for an HTTPException raised inside a worker process."""
+
+    status_code: int
+    detail: Any
+    headers: dict[str, str] | None = None
+
+
+class WorkExecutor:
+    """Run blocking callables on a thread or process pool with a bounded backlog."""
+
+    def __init__(self, kind: ExecutorKind, workers: int, max_queue: int) -> None:
+        if workers < 1:
+            raise ValueError("The executor needs at least one worker.")
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pending = 0
+        self.rejected = 0
+        self._pool: concurrent.futures.Executor | None = None
+
+    @property
+    def pending(self) -> int:
+        """Jobs currently running or waiting for a worker."""
+        return self._pending
+
+    async def run[T](self, func: Callable[..., T], *args: Any) -> T:
+        """Run `func(*args)` in the pool; HTTPExceptions raised by `func` propagate as-is."""
+        self._admit()
+        if self.kind == "process":
+            # Memory-mapped uploads cannot be pickled; worker processes get a copy instead.
+            args = tuple(bytes(arg) if isinstance(arg, memoryview) else arg for arg in args)
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            outcome = await loop.run_in_executor(self._executor(), _invoke, func, *args)
+        finally:
+            self._pending -= 1
+        if isinstance(outcome, _Failure):
+            raise HTTPException(
+                status_code=outcome.status_code, detail=outcome.detail, headers=outcome.headers
+            )
+        return outcome
+
+    def stream[T](self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        """Pull `iterator`'s items on the pool, counting it as one job until it is exhausted.
+
+        Saturation is checked here, before a streaming response has started, so it can still
+        be answered with 503. Generators cannot cross into worker processes, so with the
+        `process` executor the items are pulled on the event loop's default thread pool but
+        still count against this executor's limit.
+        """
+        self._admit()
+        return self._pull(iterator)
+
+    async def _pull[T](self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._executor() if self.kind == "thread" else None
+            while True:
+                item = await loop.run_in_executor(pool, next, iterator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    return
+                yield cast(T, item)
+        finally:
+            self._pending -= 1
+
+    def _admit(self) -> None:
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturatedError(
+                f"{self._pending} FIT jobs are already running or queued; try again shortly."
+            )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _executor(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="fit-worker"
+                )
+        return self._pool
+
+
+def _invoke[T](func: Callable[..., T], *args: Any) -> T | _Failure:
+    # HTTPException cannot be pickled across process boundaries, so ship its fields instead.
+    try:
+        return func(*args)
+    except HTTPException as exc:
+        headers = dict(exc.headers) if exc.headers is not None else None
+        return _Failure(exc.status_code, exc.detail, headers)
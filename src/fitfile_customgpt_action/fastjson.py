@@ -0,0 +1,31 @@
+"""Encode plain response structures to JSON bytes, with orjson when it is installed.
+
+`/fit/parse` bodies are built from plain dicts and lists (see `models.RecordDict`) instead of
+Pydantic models, so they can go straight to an encoder. orjson is an optional dependency;
+without it the standard library encoder produces the same compact UTF-8 JSON. Values are
+already JSON-safe: decoding drops non-finite floats.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the installed extras
+    orjson = None  # type: ignore[assignment]
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def available() -> bool:
+    """Return True when orjson is installed and used by `dumps`."""
+    return orjson is not None
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize `value` to compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _ENCODER.encode(value).encode()
@@ -0,0 +1,286 @@
+"""Record offset index for time-window `/fit/parse` requests.
+
+`build_index` walks a FIT file once and notes the file offset and timestamp of every data
+message, plus a `DecoderState` and `ProjectionState` checkpoint every `CHECKPOINT_EVERY` data
+messages.
+`RecordIndex.select` turns a time window into runs of data messages, and `RecordIndex.open`
+resumes decoders at the checkpoints before those runs and stops them at their ends, so decoding
+a window costs time in proportion to the window rather than to the file. The index is
+serialized with `to_bytes` and kept in the parse cache next to the responses (or in a small
+cache of their own when the parse cache is disabled), so only the first windowed request for a
+file pays for the full pass.
+"""
+
+from __future__ import annotations
+
+import struct
+from array import array
+from collections.abc import Collection, Iterator
+from dataclasses import dataclass, field
+
+from .decoder import (
+    INVALID_TIMESTAMP,
+    DecoderState,
+    LocalDefinition,
+    RawData,
+    RecordDecoder,
+    crc16,
+    split_segments,
+)
+from .projection import ProjectionState, affects_state, track_state
+
+# Data messages between checkpoints: the most a window decodes and then drops.
+CHECKPOINT_EVERY = 256
+# Bump whenever the serialized layout changes so stale cached indexes are rebuilt.
+INDEX_VERSION = 3
+# Memory for indexes kept when the parse cache is disabled (the `FITFILE_CACHE_*` settings).
+INDEX_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+_MAGIC = b"FITX"
+# Magic, version, data message count, earliest timestamp (0 when none), checkpoint text size.
+# The checkpoint text holds the decoder tokens, then the projection state tokens, one per line.
+_PREFIX = struct.Struct("<4sHIII")
+_UINT32 = {False: struct.Struct("<I"), True: struct.Struct(">I")}
+# Past the end of any file, for the open end of the last run.
+_END = 1 << 63
+
+# A decoder resumed for a window, the messages to project from it and its projection state.
+WindowPass = tuple[RecordDecoder, Iterator[LocalDefinition | RawData], ProjectionState]
+
+
+@dataclass(frozen=True, slots=True)
+class RecordIndex:
+    """Offsets and timestamps of a FIT file's data messages, with decoder checkpoints.
+
+    `offsets[i]` is the file offset of data message `i`'s record header and `timestamps[i]`
+    its FIT timestamp, or the last one before it for messages without one (0 before the
+    first). Timestamps are not sorted: devices write summary messages stamped with the end of
+    the activity near the start of the file, so windows count from `earliest_timestamp`, the
+    smallest of them, rather than from the first one written. `checkpoints[k]` is a
+    `DecoderState.token()` for resuming at data message `k * CHECKPOINT_EVERY`, and `states[k]`
+    the `ProjectionState.token()` of a full pass at that point.
+    """
+
+    offsets: array[int]
+    timestamps: array[int]
+    checkpoints: tuple[str, ...]
+    states: tuple[str, ...]
+    earliest_timestamp: int | None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def select(self, start: float | None, end: float | None) -> list[range]:
+        """Runs of consecutive data messages timestamped `start` to `end` seconds in.
+
+        Seconds count from the file's earliest timestamp, and messages before the first
+        timestamp are never inside a window. Checkpoint blocks entirely outside the
+        window are skipped and blocks entirely inside it taken whole, so only the blocks at
+        its edges (and those holding out-of-order summary messages) are scanned one by one.
+        """
+        count = len(self.offsets)
+        base = self.earliest_timestamp
+        if base is None:
+            return [range(count)] if start is None and end is None and count else []
+        low = base + (start or 0.0)
+        high = float(INVALID_TIMESTAMP) if end is None else base + end
+        runs: list[range] = []
+        for block in range(0, count, CHECKPOINT_EVERY):
+            values = self.timestamps[block : block + CHECKPOINT_EVERY]
+            earliest, latest = min(values), max(values)
+            if latest < low or earliest > high:
+                continue
+            if low <= earliest and latest <= high:
+                _extend(runs, block, block + len(values))
+                continue
+            for position, value in enumerate(values, block):
+                if low <= value <= high:
+                    _extend(runs, position, position + 1)
+        return runs
+
+    def open(
+        self,
+        data: bytes | memoryview,
+        runs: list[range],
+        global_ids: Collection[int] | None = None,
+    ) -> list[WindowPass]:
+        """Decoders over `data` for the data messages in `runs`, with the messages to project.
+
+        Runs less than a checkpoint interval apart share a decoder, which resumes at the
+        checkpoint before its first run and stops at the end of its last one. Each decoder's
+        messages are its definitions plus the data messages inside its runs, so they can be
+        passed to `projection.iter_records` as its `items` together with its projection
+        state; the data messages left out still update that state. Without runs, a single
+        decoder that reads nothing but the header is returned.
+        """
+        if not runs:
+            decoder = RecordDecoder(data, global_ids, stop=0)
+            return [(decoder, iter(decoder), ProjectionState())]
+        groups: list[list[range]] = []
+        for run in runs:
+            if groups and run.start - groups[-1][-1].stop < CHECKPOINT_EVERY:
+                groups[-1].append(run)
+            else:
+                groups.append([run])
+
+        passes: list[WindowPass] = []
+        for group in groups:
+            checkpoint = group[0].start // CHECKPOINT_EVERY
+            state = DecoderState.from_token(self.checkpoints[checkpoint])
+            projection = ProjectionState.from_token(self.states[checkpoint])
+            bounds = [(self.offsets[run.start], self._offset(run.stop)) for run in group]
+            stop = bounds[-1][1] if group[-1].stop < len(self.offsets) else None
+            decoder = RecordDecoder(
+                memoryview(data)[state.offset :], global_ids, resume=state, stop=stop
+            )
+            passes.append((decoder, _within(decoder, bounds, projection), projection))
+        return passes
+
+    def _offset(self, position: int) -> int:
+        """File offset of data message `position`, or past every message at the end."""
+        return self.offsets[position] if position < len(self.offsets) else _END
+
+    def to_bytes(self) -> bytes:
+        """Serialize the index for the parse cache."""
+        tokens = "\n".join(self.checkpoints + self.states).encode()
+        prefix = _PREFIX.pack(
+            _MAGIC, INDEX_VERSION, len(self.offsets), self.earliest_timestamp or 0, len(tokens)
+        )
+        return prefix + self.offsets.tobytes() + self.timestamps.tobytes() + tokens
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> RecordIndex:
+        """Load a `to_bytes()` index, raising `ValueError` when `blob` is not one."""
+        try:
+            magic, version, count, earliest_timestamp, size = _PREFIX.unpack_from(blob)
+        except struct.error as exc:
+            raise ValueError(f"Invalid record index: {exc}") from exc
+        if magic != _MAGIC or version != INDEX_VERSION:
+            raise ValueError("Invalid record index: unknown format.")
+        start = _PREFIX.size
+        offsets, timestamps = array("I"), array("I")
+        offsets.frombytes(blob[start : start + count * offsets.itemsize])
+        start += count * offsets.itemsize
+        timestamps.frombytes(blob[start : start + count * timestamps.itemsize])
+        start += count * timestamps.itemsize
+        lines = blob[start : start + size].decode().split("\n") if size else []
+        if (
+            len(offsets) != count
+            or len(timestamps) != count
+            or len(blob) != start + size
+            or len(lines) != 2 * -(-count // CHECKPOINT_EVERY)
+        ):
+            raise ValueError("Invalid record index: truncated.")
+        half = len(lines) // 2
+        return cls(
+            offsets=offsets,
+            timestamps=timestamps,
+            checkpoints=tuple(lines[:half]),
+            states=tuple(lines[half:]),
+            earliest_timestamp=earliest_timestamp or None,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class TimeWindow:
+    """The `/fit/parse` records to return: `start` to `end` seconds into the file.
+
+    `index` is the file's `RecordIndex`; windows without one build it while decoding.
+    """
+
+    start: float | None = None
+    end: float | None = None
+    index: RecordIndex | None = field(default=None, compare=False)
+
+    def cache_token(self) -> str:
+        """Stable text form of the options, for response cache keys."""
+        start = "" if self.start is None else repr(float(self.start))
+        end = "" if self.end is None else repr(float(self.end))
+        return f"window={start}:{end}"
+
+
+def build_index(data: bytes | memoryview) -> RecordIndex:
+    """Index every data message of a complete FIT file, raising `FitDecodeError` on bad data."""
+    offsets, timestamps = array("I"), array("I")
+    checkpoints: list[str] = []
+    states: list[str] = []
+    projection = ProjectionState()
+    earliest_timestamp: int | None = None
+    for segment_start, segment in split_segments(data):
+        decoder = RecordDecoder(segment)
+        definitions: list[LocalDefinition | None] = [None] * 16
+        # Per local id: whether its data messages change the projection state.
+        tracked = [False] * 16
+        last_timestamp: int | None = None
+        record_index = 0
+        crc_position, crc = 0, 0
+        for item in decoder:
+            if isinstance(item, LocalDefinition):
+                definitions[item.local_id] = item
+                tracked[item.local_id] = affects_state(item)
+                record_index += 1
+                continue
+            position = item.offset - 1
+            if len(offsets) % CHECKPOINT_EVERY == 0:
+                crc = crc16(segment[crc_position:position], crc)
+                crc_position = position
+                state = DecoderState(
+                    header=decoder.header,
+                    segment_start=segment_start,
+                    offset=segment_start + position,
+                    crc=crc,
+                    last_timestamp=last_timestamp,
+                    record_index=record_index,
+                    definitions=tuple(definitions),
+                )
+                checkpoints.append(state.token())
+                states.append(projection.token())
+            definition = item.definition
+            if tracked[definition.local_id]:
+                track_state(projection, item, decoder.view)
+            if item.timestamp is not None:
+                last_timestamp = item.timestamp
+            elif definition.timestamp_offset is not None:
+                (native,) = _UINT32[definition.big_endian].unpack_from(
+                    segment, item.offset + definition.timestamp_offset
+                )
+                if native != INVALID_TIMESTAMP:
+                    last_timestamp = native
+            if last_timestamp and (
+                earliest_timestamp is None or last_timestamp < earliest_timestamp
+            ):
+                earliest_timestamp = last_timestamp
+            record_index += 1
+            offsets.append(segment_start + position)
+            timestamps.append(last_timestamp or 0)
+    return RecordIndex(offsets, timestamps, tuple(checkpoints), tuple(states), earliest_timestamp)
+
+
+def _extend(runs: list[range], start: int, stop: int) -> None:
+    if runs and runs[-1].stop == start:
+        runs[-1] = range(runs[-1].start, stop)
+    else:
+        runs.append(range(start, stop))
+
+
+def _within(
+    decoder: RecordDecoder, bounds: list[tuple[int, int]], projection: ProjectionState
+) -> Iterator[LocalDefinition | RawData]:
+    """`decoder`'s definitions and the data messages starting inside one of `bounds`.
+
+    `bounds` are ascending `(first, stop)` file offset ranges of record headers. The data
+    messages outside them are passed to `track_state` instead, to keep `projection` current.
+    """
+    remaining = iter(bounds)
+    first, stop = next(remaining)
+    # Payloads start one byte after their record header.
+    shift = decoder.base - 1
+    for item in decoder:
+        if isinstance(item, RawData):
+            position = item.offset + shift
+            while position >= stop:
+                first, stop = next(remaining, (_END, _END))
+            if position < first:
+                track_state(projection, item, decoder.view)
+                continue
+        yield item
@@ -1,15 +1,54 @@
-"""Discover and cache FIT `DataMessage` subclasses exposed by `fit_tool`."""
+"""Resolve FIT `DataMessage` subclasses exposed by `fit_tool` by message name.
+
+Names map to `(module, class)` pairs through a precomputed index shipped next to this module
+(`message_index.json`), so looking up a message imports only the module that defines it. The
+index is tied to the installed fit_tool version; when it does not match (or the file is
+missing) the profile package is scanned once instead. Regenerate the file after upgrading
+fit_tool by calling `write_index()`.
+
+`field_index` maps the field names of a message class to their position and encoding metadata,
+built once per class, so payload fields can be validated and applied without scanning fields.
+"""
 
 from __future__ import annotations
 
 import importlib
 import inspect
+import json
+import logging
 import pkgutil
-from functools import lru_cache
-
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import cache, lru_cache
+from importlib import metadata
+from pathlib import Path
+from types import MappingProxyType
+
+from fit_tool.base_type import BaseType
 from fit_tool.data_message import DataMessage
 
 PACKAGE_NAME = "fit_tool.profile.messages"
+INDEX_PATH = Path(__file__).with_name("message_index.json")
+
+# Message name -> (module name, class name).
+MessageIndex = dict[str, tuple[str, str]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class FieldInfo:
+    """Where a field sits in its message class and how its values are encoded."""
+
+    position: int
+    field_id: int
+    base_type: BaseType
+    units: str | None
+    scale: float | None
+    offset: float | None
+
+
+_FIELD_INDEXES: dict[type[DataMessage], Mapping[str, FieldInfo]] = {}
 
 
 def _is_message_class(candidate: type, module_name: str) -> bool:
@@ -32,19 +71,19 @@ def _is_message_class(candidate: type, module_name: str) -> bool:
     return bool(candidate.NAME)
 
 
-def _build_registry() -> dict[str, type[DataMessage]]:
-    """Scan the fit_tool profile package and collect every named DataMessage subclass."""
+def _build_registry() -> MessageIndex:
+    """Scan the fit_tool profile package and index every named DataMessage subclass."""
     package = importlib.import_module(PACKAGE_NAME)
-    registry: dict[str, type[DataMessage]] = {}
+    registry: MessageIndex = {}
 
     for module_info in pkgutil.iter_modules(package.__path__):
         module = importlib.import_module(f"{PACKAGE_NAME}.{module_info.name}")
-        for _, candidate in inspect.getmembers(module, inspect.isclass):
+        for class_name, candidate in inspect.getmembers(module, inspect.isclass):
             if not _is_message_class(candidate, module.__name__):
                 continue
 
             name = candidate.NAME.lower()
-            registry[name] = candidate
+            registry[name] = (module.__name__, class_name)
 
     if not registry:
         raise RuntimeError("No FIT message definitions were discovered.")
@@ -52,10 +91,55 @@ def _build_registry() -> dict[str, type[DataMessage]]:
     return registry
 
 
+def _fit_tool_version() -> str:
+    try:
+        return metadata.version("fit-tool")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _load_index(path: Path) -> MessageIndex | None:
+    """Read a precomputed index, or None when it is missing, malformed or for another fit_tool."""
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+    try:
+        document = json.loads(text)
+        if document.get("fit_tool") != _fit_tool_version():
+            return None
+        return {name: (module, cls) for name, (module, cls) in document["messages"].items()}
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def write_index(path: Path = INDEX_PATH) -> MessageIndex:
+    """Scan fit_tool and store the resulting index at `path`."""
+    registry = _build_registry()
+    document = {
+        "fit_tool": _fit_tool_version(),
+        "messages": {name: list(entry) for name, entry in sorted(registry.items())},
+    }
+    path.write_text(json.dumps(document, indent=1) + "\n", encoding="utf-8")
+    return registry
+
+
 @lru_cache(maxsize=1)
-def _registry() -> dict[str, type[DataMessage]]:
-    """Memoized accessor for the discovered message registry."""
-    return _build_registry()
+def _registry() -> MessageIndex:
+    """Memoized name index, read from `INDEX_PATH` when it matches the installed fit_tool."""
+    index = _load_index(INDEX_PATH)
+    if index is None:
+        logger.info("Message index at %s is missing or stale; scanning fit_tool.", INDEX_PATH)
+        index = _build_registry()
+    return index
+
+
+@cache
+def _load_class(module_name: str, class_name: str) -> type[DataMessage]:
+    message_cls = getattr(importlib.import_module(module_name), class_name)
+    if not isinstance(message_cls, type) or not issubclass(message_cls, DataMessage):
+        raise TypeError(f"{module_name}.{class_name} is not a FIT DataMessage.")
+    return message_cls
 
 
 def resolve(message_name: str) -> type[DataMessage]:
@@ -64,4 +148,38 @@ def resolve(message_name: str) -> type[DataMessage]:
     mapping = _registry()
     if normalized not in mapping:
         raise KeyError(f"Unknown FIT message '{message_name}'.")
-    return mapping[normalized]
+    return _load_class(*mapping[normalized])
+
+
+def warm_up() -> int:
+    """Import every indexed message class now instead of on first use; returns the count."""
+    mapping = _registry()
+    for entry in mapping.values():
+        _load_class(*entry)
+    return len(mapping)
+
+
+def field_index(message_cls: type[DataMessage]) -> Mapping[str, FieldInfo]:
+    """Map the field names of `message_cls` to their `FieldInfo`; built once per class.
+
+    `position` indexes `message.fields` of any instance, which every instance lists in the
+    same order.
+    """
+    cached = _FIELD_INDEXES.get(message_cls)
+    if cached is not None:
+        return cached
+    index: dict[str, FieldInfo] = {}
+    for position, field in enumerate(message_cls().fields):
+        index.setdefault(
+            field.name,
+            FieldInfo(
+                position=position,
+                field_id=field.field_id,
+                base_type=field.base_type,
+                units=field.units or None,
+                scale=field.scale,
+                offset=field.offset,
+            ),
+        )
+    cached = _FIELD_INDEXES[message_cls] = MappingProxyType(index)
+    return cached
@@ -0,0 +1,445 @@
+"""Process-wide counters and histograms, exposed by `/fit/metrics` in Prometheus text format.
+
+`stage` times one step of a parse, summary or produce job (decoding, JSON encoding, FIT
+encoding, ...) and `count_records` tallies records per message type; both run inside the
+executor's workers. `RequestMetricsMiddleware` measures what happens around the route: upload
+time, bytes received and sent, and the total request latency. Cache and executor totals are
+counted by those objects and copied into counters by `REGISTRY.collector` whenever the metrics
+are read; their current state is read as gauges when the endpoint is scraped.
+
+Metrics live in this module's `REGISTRY`, one per process; a process executor's workers keep
+their own copy, so their stage timings and record counts are not reported. Server workers share
+theirs through `REGISTRY.directory`: each one writes a snapshot there every `FLUSH_INTERVAL`
+seconds, and a scrape of any worker sums all of them, first folding the snapshots of workers
+that have exited into a single `RETIRED_SNAPSHOT`. Recording costs a clock read and a locked
+update per stage, and nothing at all with `REGISTRY.enabled` off.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from collections import Counter as _Tally
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are summed but never folded.
+    fcntl = None  # type: ignore[assignment]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; parse jobs range from a few milliseconds to tens of seconds for multi-hour files.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Routes reported under their own label; everything else is grouped as "other".
+ROUTES = (
+    "/fit/parse",
+    "/fit/parse/batch",
+    "/fit/summary",
+    "/fit/produce",
+    "/fit/produce/columnar",
+)
+
+# Seconds between the snapshots a server worker writes to `Registry.directory`.
+FLUSH_INTERVAL = 1.0
+SNAPSHOT_PREFIX = "fit-metrics-"
+# The sum of the snapshots of every worker that has exited.
+RETIRED_SNAPSHOT = f"{SNAPSHOT_PREFIX}retired.json"
+
+LabelValues = tuple[str, ...]
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, value: float, *labels: str) -> None:
+        """Take over a count that another object keeps, which must only ever grow."""
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def state(self) -> list[Any]:
+        """JSON-ready values, for `merge` into the same counter of another process."""
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, state: list[Any]) -> None:
+        for labels, value in state:
+            self.inc(float(value), *labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Observations counted into cumulative `le` buckets, plus their count and sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Per label combination: a count per bucket (the last one is +Inf) and the sum.
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(labels)
+            return sum(entry[0]) if entry is not None else 0
+
+    def state(self) -> list[Any]:
+        """JSON-ready values, for `merge` into the same histogram of another process."""
+        with self._lock:
+            return [
+                [list(labels), list(counts), total[0]]
+                for labels, (counts, total) in self._values.items()
+            ]
+
+    def merge(self, state: list[Any]) -> None:
+        with self._lock:
+            for labels, counts, total in state:
+                if len(counts) != len(self.buckets) + 1:
+                    continue  # written with other buckets
+                entry = self._values.get(tuple(labels))
+                if entry is None:
+                    entry = self._values[tuple(labels)] = ([0] * len(counts), [0.0])
+                for index, count in enumerate(counts):
+                    entry[0][index] += int(count)
+                entry[1][0] += float(total)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((labels, (list(c), s[0])) for labels, (c, s) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            bounds = [*(_number(bound) for bound in self.buckets), "+Inf"]
+            for bound, count in zip(bounds, counts, strict=True):
+                cumulative += count
+                bucket_labels = _labels((*self.labels, "le"), (*labels, bound))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}"
+
+
+class Registry:
+    """The metrics of this process, rendered together in the text exposition format.
+
+    With a `directory`, `flush` writes the metrics there and `render` reports the sum of every
+    process's snapshot in it instead. `collector`, when set, is called before either reads the
+    metrics, to bring counters kept outside this module up to date.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.directory: Path | None = None
+        self.collector: Callable[[], None] | None = None
+        self._metrics: list[Counter | Histogram] = []
+        self._flushed: str | None = None
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def flush(self) -> None:
+        """Write this process's metrics to `directory`, when they changed since the last time."""
+        if self.directory is None:
+            return
+        if self.collector is not None:
+            self.collector()
+        text = json.dumps({metric.name: metric.state() for metric in self._metrics})
+        if text == self._flushed:
+            return
+        path = self.directory / f"{SNAPSHOT_PREFIX}{os.getpid()}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(text, encoding="utf-8")
+        # Readers only ever see a complete snapshot.
+        os.replace(temporary, path)
+        self._flushed = text
+
+    def render(self, gauges: Iterable[tuple[str, str, float]] = ()) -> str:
+        """Exposition text for every metric, followed by `(name, help, value)` gauges."""
+        metrics = self._metrics
+        if self.directory is not None:
+            self.flush()
+            metrics = self._collect(self.directory)
+        elif self.collector is not None:
+            self.collector()
+        lines: list[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for name, documentation, value in gauges:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _collect(self, directory: Path) -> list[Counter | Histogram]:
+        """Fresh copies of the metrics holding the sum of every snapshot in `directory`.
+
+        Snapshots of workers that have exited are folded into `RETIRED_SNAPSHOT` first, so
+        totals survive worker restarts without the directory growing with every restart.
+        """
+        with _locked(directory):
+            if fcntl is not None:
+                self._retire(directory)
+            merged = self._fresh()
+            for path in sorted(directory.glob(f"{SNAPSHOT_PREFIX}*.json")):
+                _merge(merged, path)
+        return merged
+
+    def _retire(self, directory: Path) -> None:
+        """Add the snapshots of exited workers to `RETIRED_SNAPSHOT` and remove them."""
+        exited = [
+            path
+            for path in directory.glob(f"{SNAPSHOT_PREFIX}*.json")
+            if (pid := _snapshot_pid(path)) is not None and pid != os.getpid() and not _alive(pid)
+        ]
+        if not exited:
+            return
+        retired = directory / RETIRED_SNAPSHOT
+        merged = self._fresh()
+        for path in (retired, *exited):
+            _merge(merged, path)
+        temporary = retired.with_suffix(".tmp")
+        text = json.dumps({metric.name: metric.state() for metric in merged})
+        temporary.write_text(text, encoding="utf-8")
+        os.replace(temporary, retired)
+        for path in exited:
+            path.unlink(missing_ok=True)
+
+    def _fresh(self) -> list[Counter | Histogram]:
+        return [
+            Counter(metric.name, metric.documentation, metric.labels)
+            if isinstance(metric, Counter)
+            else Histogram(metric.name, metric.documentation, metric.labels, metric.buckets)
+            for metric in self._metrics
+        ]
+
+
+def _merge(metrics: list[Counter | Histogram], path: Path) -> None:
+    """Add the snapshot at `path` to `metrics`, if it can still be read."""
+    try:
+        snapshot = json.loads(path.read_text(encoding="utf-8"))
+    except OSError:
+        return  # removed since it was listed
+    except ValueError:
+        return
+    by_name = {metric.name: metric for metric in metrics}
+    for name, state in snapshot.items():
+        metric = by_name.get(name)
+        if metric is not None:
+            metric.merge(state)
+
+
+def _snapshot_pid(path: Path) -> int | None:
+    """The pid of the worker that writes `path`, or None for `RETIRED_SNAPSHOT`."""
+    pid = path.stem.removeprefix(SNAPSHOT_PREFIX)
+    return int(pid) if pid.isdigit() else None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+@contextmanager
+def _locked(directory: Path) -> Iterator[None]:
+    """Hold the directory's lock, so two scrapes never fold the same snapshot twice."""
+    if fcntl is None:
+        yield
+        return
+    with (directory / f"{SNAPSHOT_PREFIX}lock").open("a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "fit_stage_seconds", "Time spent in each step of a FIT job.", ("stage",)
+)
+RECORDS = REGISTRY.counter(
+    "fit_records_total",
+    "FIT data records decoded or encoded, by message.",
+    ("operation", "message"),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "fit_request_seconds", "Request latency until the response is sent.", ("route", "status")
+)
+RECEIVED_BYTES = REGISTRY.counter(
+    "fit_request_bytes_total", "Request body bytes received.", ("route",)
+)
+SENT_BYTES = REGISTRY.counter("fit_response_bytes_total", "Response body bytes sent.", ("route",))
+# Kept by the parse cache and the executor, and copied in by `REGISTRY.collector`.
+CACHE_HITS = REGISTRY.counter("fit_cache_hits_total", "Parse cache hits, from memory or disk.")
+CACHE_DISK_HITS = REGISTRY.counter(
+    "fit_cache_disk_hits_total", "Parse cache hits served by the disk tier."
+)
+CACHE_MISSES = REGISTRY.counter("fit_cache_misses_total", "Parse cache misses.")
+CACHE_EVICTIONS = REGISTRY.counter(
+    "fit_cache_evictions_total", "Entries evicted from the memory tier."
+)
+EXECUTOR_REJECTED = REGISTRY.counter("fit_executor_rejected_total", "Jobs refused with 503.")
+
+
+async def flush_periodically() -> None:
+    """Flush `REGISTRY` every `FLUSH_INTERVAL` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        REGISTRY.flush()
+
+
+def clear_snapshots(directory: Path) -> None:
+    """Remove the snapshots an earlier server left in `directory`."""
+    for path in directory.glob(f"{SNAPSHOT_PREFIX}*.json"):
+        path.unlink(missing_ok=True)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record how long the block takes under `fit_stage_seconds{stage=name}`."""
+    if not REGISTRY.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+def count_records(operation: str, messages: Iterable[str]) -> None:
+    """Add one to `fit_records_total{operation, message}` per message name."""
+    if not REGISTRY.enabled:
+        return
+    for message, count in _Tally(messages).items():
+        RECORDS.inc(count, operation, message)
+
+
+class RequestMetricsMiddleware:
+    """Time uploads and requests and count the bytes they move, per `/fit` route."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not REGISTRY.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"].rstrip("/")
+        route = path if path in ROUTES else "other"
+        start = time.perf_counter()
+        upload_start: float | None = None
+        received = sent = 0
+        status = "500"
+
+        async def counting_receive() -> Message:
+            nonlocal upload_start, received
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                if upload_start is None:
+                    upload_start = time.perf_counter()
+                received += len(body)
+                if not message.get("more_body", False) and received:
+                    STAGE_SECONDS.observe(time.perf_counter() - upload_start, "upload")
+            return message
+
+        async def counting_send(message: Message) -> None:
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route, status)
+            RECEIVED_BYTES.inc(received, route)
+            SENT_BYTES.inc(sent, route)
+
+
+def _labels(names: tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
@@ -2,9 +2,9 @@
 
 from __future__ import annotations
 
-from typing import Annotated, Literal
+from typing import Annotated, Literal, TypedDict
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, RootModel, field_validator
 
 # Scalars that safely round-trip through JSON; used by fields and payloads.
 JSONScalar = str | int | float | bool | None
@@ -12,6 +12,22 @@ JSONScalar = str | int | float | bool | None
 JSONValue = JSONScalar | list[JSONScalar]
 
 
+class FitDiagnostics(BaseModel):
+    """How far a tolerant parse got through a truncated or corrupted FIT file.
+
+    `offset` is the file offset decoding stopped at and `error` why it stopped early; `crc`
+    is `invalid` when a file CRC did not match and `missing` when the last one was not
+    reached. `resume_token` continues the parse from `offset` once the rest of a truncated
+    file is available.
+    """
+
+    complete: bool
+    offset: int
+    crc: Literal["valid", "invalid", "missing"]
+    error: str | None = None
+    resume_token: str | None = None
+
+
 class FitMetadata(BaseModel):
     """Parsed FIT file header metadata."""
 
@@ -19,6 +35,8 @@ class FitMetadata(BaseModel):
     profile_version: str
     records_size: int
     crc: int | None = None
+    # Only reported by tolerant parses.
+    diagnostics: FitDiagnostics | None = None
 
 
 class DefinitionField(BaseModel):
@@ -61,6 +79,40 @@ class DataRecord(BaseModel):
 FitRecord = Annotated[DefinitionRecord | DataRecord, Field(discriminator="kind")]
 
 
+# Plain-dict mirrors of the record models above. Decoding produces these and responses are
+# encoded from them directly; the models describe the same JSON for validation and OpenAPI.
+class DefinitionFieldDict(TypedDict):
+    field_id: int
+    size: int
+    base_type: str
+
+
+class DefinitionRecordDict(TypedDict):
+    kind: Literal["definition"]
+    local_id: int
+    global_id: int
+    message: str
+    fields: list[DefinitionFieldDict]
+
+
+class DataFieldDict(TypedDict):
+    field_id: int
+    name: str
+    units: str | None
+    value: JSONValue | None
+
+
+class DataRecordDict(TypedDict):
+    kind: Literal["data"]
+    local_id: int
+    global_id: int
+    message: str
+    fields: list[DataFieldDict]
+
+
+RecordDict = DefinitionRecordDict | DataRecordDict
+
+
 class ParseFitResponse(BaseModel):
     """Full response model for the `/fit/parse` endpoint."""
 
@@ -68,6 +120,127 @@ class ParseFitResponse(BaseModel):
     records: list[FitRecord]
 
 
+class ColumnarField(BaseModel):
+    """One field of a columnar message group; `values` holds one entry per row."""
+
+    field_id: int
+    name: str
+    units: str | None = None
+    values: list[JSONValue | None]
+
+
+class ColumnarMessage(BaseModel):
+    """Every data record of a single global message type, stored column by column."""
+
+    global_id: int
+    message: str
+    count: int
+    columns: list[ColumnarField]
+
+
+class ParseFitColumnarResponse(BaseModel):
+    """Response model for `/fit/parse?format=columnar`."""
+
+    metadata: FitMetadata
+    messages: list[ColumnarMessage]
+
+
+class ParseFitSegmentsResponse(BaseModel):
+    """Response model for `/fit/parse?segments=true`: one result per chained FIT file."""
+
+    segments: list[ParseFitResponse] | list[ParseFitColumnarResponse]
+
+
+class MetricSummary(BaseModel):
+    """Statistics of one `record` field over a summarized span.
+
+    `percentiles` maps keys such as `p50` to values and `max_time` is the timestamp of the
+    maximum.
+    """
+
+    units: str | None = None
+    min: float
+    max: float
+    mean: float
+    percentiles: dict[str, float]
+    max_time: int | None = None
+
+
+class ZoneTime(BaseModel):
+    """Seconds spent with a metric in `[low, high)`; open-ended zones leave a bound null."""
+
+    low: float | None = None
+    high: float | None = None
+    seconds: float
+
+
+class SpanSummary(BaseModel):
+    """Aggregates of the `record` messages of an activity, session or lap.
+
+    Times are FIT timestamps in milliseconds, like the `timestamp` values of `/fit/parse`.
+    """
+
+    index: int
+    start_time: int | None = None
+    end_time: int | None = None
+    records: int
+    duration_s: float | None = None
+    distance_m: float | None = None
+    elevation_gain_m: float | None = None
+    elevation_loss_m: float | None = None
+    metrics: dict[str, MetricSummary]
+    time_in_zone: dict[str, list[ZoneTime]]
+
+
+class FitSummaryResponse(BaseModel):
+    """Response model for `/fit/summary`."""
+
+    metadata: FitMetadata
+    activity: SpanSummary
+    sessions: list[SpanSummary]
+    laps: list[SpanSummary]
+
+
+class StreamMetadataLine(BaseModel):
+    """First line of an NDJSON `/fit/parse` stream, sent before any record."""
+
+    kind: Literal["metadata"] = "metadata"
+    metadata: FitMetadata
+
+
+class StreamDiagnosticsLine(BaseModel):
+    """Last line of a tolerant NDJSON `/fit/parse` stream, sent after every record."""
+
+    kind: Literal["diagnostics"] = "diagnostics"
+    diagnostics: FitDiagnostics
+
+
+class StreamErrorLine(BaseModel):
+    """Terminal NDJSON line emitted when decoding fails after the stream has started."""
+
+    kind: Literal["error"] = "error"
+    detail: str
+
+
+class BatchResultLine(BaseModel):
+    """NDJSON line carrying one successfully parsed file of a `/fit/parse/batch` request."""
+
+    kind: Literal["result"] = "result"
+    index: int
+    filename: str
+    result: ParseFitResponse | ParseFitColumnarResponse
+
+
+class BatchErrorLine(BaseModel):
+    """NDJSON line reporting why one file of a `/fit/parse/batch` request failed."""
+
+    kind: Literal["error"] = "error"
+    index: int
+    filename: str
+    status_code: int
+    detail: str
+
+
 class MessageFieldPayload(BaseModel):
     """Flexible representation for supplying single or repeated field values."""
 
@@ -108,3 +281,11 @@ class BuildFitRequest(BaseModel):
     """Request body accepted by the `/fit/produce` endpoint."""
 
     messages: list[MessagePayload] = Field(default_factory=list)
+
+
+class BuildFitColumnarRequest(RootModel[dict[str, dict[str, list[JSONValue | None]]]]):
+    """Request body accepted by `/fit/produce/columnar`.
+
+    Maps message names to `{field name: one value per message}` columns. Message types are
+    written in key order and `null` leaves a field unset for that message.
+    """
@@ -0,0 +1,729 @@
+"""Project raw `decoder` output onto FIT profile messages as API records.
+
+For every distinct definition layout a `_MessagePlan` is compiled once from the fit_tool
+profile: message name, field names, units, scale/offset and component expansions. Data
+messages are then turned into plain `DataRecordDict`s straight from the unpacked value tuples,
+which responses encode without building a Pydantic model per record or field.
+Layouts the plan cannot represent faithfully (developer fields, field descriptions,
+profile/wire type mismatches, duplicated field ids) are projected through fit_tool's own
+message classes instead and yielded as fit_tool `Record`s for the caller to serialize.
+
+Accumulated components and developer field descriptions carry state from one data message to
+the next. `ProjectionState` holds it, so a decode that starts mid-file (a record index window)
+can pick up where a full pass would be, and `track_state` keeps it current across messages
+that are decoded but not projected.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import struct
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, cast
+
+from fit_tool.base_type import BaseType
+from fit_tool.components import expand_message_components
+from fit_tool.data_message import DataMessage
+from fit_tool.definition_message import DefinitionMessage
+from fit_tool.developer_field import DeveloperField
+from fit_tool.developer_field_definition import DeveloperFieldDefinition
+from fit_tool.endian import Endian
+from fit_tool.field_component import FieldComponent
+from fit_tool.field_definition import FieldDefinition
+from fit_tool.profile.component_registry import PROFILE_COMPONENTS
+from fit_tool.profile.messages.field_description_message import FieldDescriptionMessage
+from fit_tool.profile.messages.message_factory import MessageFactory
+from fit_tool.record import Record, RecordHeader
+
+from .decoder import (
+    BASE_TYPE_FORMATS,
+    TIMESTAMP_FIELD_ID,
+    FitDecodeError,
+    LocalDefinition,
+    RawData,
+    RecordDecoder,
+)
+from .models import (
+    DataFieldDict,
+    DataRecordDict,
+    DefinitionFieldDict,
+    DefinitionRecordDict,
+    JSONScalar,
+    JSONValue,
+)
+from .selection import Selection
+
+logger = logging.getLogger(__name__)
+
+_FLOAT_INVALID = {4: (struct.Struct("<I"), 0xFFFFFFFF), 8: (struct.Struct("<Q"), (1 << 64) - 1)}
+
+
+@dataclass(slots=True)
+class _FieldPlan:
+    """Profile metadata for one field of a message plan."""
+
+    field_id: int
+    name: str
+    units: str | None
+    base_type: BaseType
+    slot: int | None
+    size: int
+    scale: float | None
+    offset: float | None
+    scaled: bool
+    rounds: bool
+    is_float: bool
+    is_string: bool
+
+
+@dataclass(slots=True)
+class _MessagePlan:
+    """Everything needed to project data messages of one definition layout."""
+
+    name: str
+    definition_fields: list[DefinitionFieldDict]
+    wire_fields: tuple[_FieldPlan, ...]
+    dynamic_fields: tuple[_FieldPlan, ...]
+    component_sources: tuple[_FieldPlan, ...]
+    fields_by_id: dict[int, _FieldPlan]
+    components: dict[int, tuple[FieldComponent, ...]]
+    native: bool
+    # Whether a component expanded from the wire fields is accumulated.
+    accumulates: bool
+
+
+class ProjectionState:
+    """What `iter_records` carries from one data message to the next.
+
+    `accumulators` holds the running values of accumulated components by global message and
+    destination field id, and `developer_fields` the developer fields described so far by
+    developer data index and field number.
+    """
+
+    __slots__ = ("accumulators", "developer_fields")
+
+    def __init__(self) -> None:
+        self.accumulators: dict[tuple[int, int], int] = {}
+        self.developer_fields: dict[int, dict[int, DeveloperField]] = {}
+
+    def token(self) -> str:
+        """Encode the state as compact single-line JSON; empty when there is none."""
+        if not self.accumulators and not self.developer_fields:
+            return ""
+        accumulators = [
+            [global_id, field_id, value]
+            for (global_id, field_id), value in sorted(self.accumulators.items())
+        ]
+        developer_fields = [
+            [
+                item.developer_data_index,
+                item.field_id,
+                item.base_type.value,
+                item.name,
+                item.scale,
+                item.offset,
+                item.units,
+            ]
+            for fields in self.developer_fields.values()
+            for item in fields.values()
+        ]
+        return json.dumps([accumulators, developer_fields], separators=(",", ":"))
+
+    @classmethod
+    def from_token(cls, token: str) -> ProjectionState:
+        """Decode a `token()` string, raising `FitDecodeError` when it is not valid."""
+        state = cls()
+        if not token:
+            return state
+        try:
+            accumulators, developer_fields = json.loads(token)
+            for global_id, field_id, value in accumulators:
+                state.accumulators[(int(global_id), int(field_id))] = int(value)
+            for index, field_id, base_type, name, scale, offset, units in developer_fields:
+                developer_field = DeveloperField(
+                    developer_data_index=int(index),
+                    field_id=int(field_id),
+                    base_type=_base_type(int(base_type)),
+                    name=name,
+                    scale=scale,
+                    offset=offset,
+                    units=units,
+                )
+                state.developer_fields.setdefault(developer_field.developer_data_index, {})[
+                    developer_field.field_id
+                ] = developer_field
+        except (ValueError, TypeError) as exc:
+            raise FitDecodeError(f"Invalid projection state: {exc}") from exc
+        return state
+
+
+def iter_records(
+    decoder: RecordDecoder,
+    items: Iterable[LocalDefinition | RawData] | None = None,
+    precomputed: Callable[[RawData], list[DataFieldDict] | None] | None = None,
+    selection: Selection | None = None,
+    state: ProjectionState | None = None,
+) -> Iterator[DefinitionRecordDict | DataRecordDict | Record]:
+    """Yield API records for every message produced by `decoder`.
+
+    Data messages that need fit_tool's full projection are yielded as fit_tool `Record`s.
+    `items` replaces iterating `decoder` when its output was already collected, and
+    `precomputed` may supply the fields of natively projected data messages (returning
+    None falls back to projecting the message here). With a `selection`, definitions of
+    unselected messages are not yielded and native data messages only carry the selected
+    fields; fit_tool `Record`s are yielded unfiltered. Projection continues from `state`,
+    which is updated as messages are projected, instead of from an empty one.
+    """
+    view = decoder.view
+    plans: dict[int, _MessagePlan] = {}
+    definition_messages: dict[int, DefinitionMessage] = {}
+    if state is None:
+        state = ProjectionState()
+    developer_fields = state.developer_fields
+    accumulators = state.accumulators
+
+    for item in decoder if items is None else items:
+        if isinstance(item, LocalDefinition):
+            plan = _plan_for(item)
+            plans[item.local_id] = plan
+            if selection is not None and not selection.includes(item.global_id):
+                continue
+            yield {
+                "kind": "definition",
+                "local_id": item.local_id,
+                "global_id": item.global_id,
+                "message": plan.name,
+                "fields": plan.definition_fields,
+            }
+            continue
+
+        definition = item.definition
+        plan = plans[definition.local_id]
+        if plan.native:
+            if selection is not None and not selection.includes(definition.global_id):
+                continue
+            keep = selection.field_names(definition.global_id) if selection is not None else None
+            fields = precomputed(item) if precomputed is not None else None
+            if fields is None:
+                fields = _data_fields(plan, item, view, accumulators, keep)
+            yield {
+                "kind": "data",
+                "local_id": definition.local_id,
+                "global_id": definition.global_id,
+                "message": plan.name,
+                "fields": fields,
+            }
+            continue
+
+        definition_message = definition_messages.get(id(definition))
+        if definition_message is None:
+            definition_message = _definition_message(definition)
+            definition_messages[id(definition)] = definition_message
+        record = _project_with_fit_tool(
+            definition_message, item, view, developer_fields, accumulators
+        )
+        if isinstance(record.message, FieldDescriptionMessage):
+            _register_developer_field(record.message, developer_fields)
+        yield record
+
+
+def track_state(state: ProjectionState, item: RawData, view: memoryview) -> None:
+    """Update `state` for a data message of `view` that is decoded but not projected."""
+    definition = item.definition
+    if definition.global_id == FieldDescriptionMessage.ID:
+        record = _project_with_fit_tool(
+            _definition_message(definition),
+            item,
+            view,
+            state.developer_fields,
+            state.accumulators,
+        )
+        if isinstance(record.message, FieldDescriptionMessage):
+            _register_developer_field(record.message, state.developer_fields)
+        return
+    plan = _plan_for(definition)
+    if not plan.accumulates:
+        return
+    if plan.native:
+        _data_fields(plan, item, view, state.accumulators)
+    else:
+        _project_with_fit_tool(
+            _definition_message(definition),
+            item,
+            view,
+            state.developer_fields,
+            state.accumulators,
+        )
+
+
+def affects_state(definition: LocalDefinition) -> bool:
+    """Whether data messages of `definition` can change a `ProjectionState`."""
+    return definition.global_id == FieldDescriptionMessage.ID or _plan_for(definition).accumulates
+
+
+def json_value(values: Iterable[Any], name: str, field_id: int) -> JSONValue | None:
+    """Collapse decoded field values into the scalar/list shape of a data field `value`.
+
+    Invalid (None) entries are skipped, and non-finite floats are dropped with a warning
+    because they cannot be represented in JSON.
+    """
+    collected: list[JSONScalar] = []
+    dropped_non_finite = False
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, float) and not math.isfinite(value):
+            dropped_non_finite = True
+            continue
+        collected.append(cast(JSONScalar, value))
+
+    if dropped_non_finite:
+        logger.warning(
+            "Omitted non-finite value(s) from field '%s' (id=%s) while serializing FIT data.",
+            name,
+            field_id,
+        )
+
+    if not collected:
+        return None
+    if len(collected) == 1:
+        return collected[0]
+    return collected
+
+
+def _plan_for(definition: LocalDefinition) -> _MessagePlan:
+    key = (
+        definition.global_id,
+        definition.big_endian,
+        definition.fields,
+        definition.developer_fields,
+    )
+    return _compile_plan(key)
+
+
+@lru_cache(maxsize=1024)
+def _compile_plan(
+    key: tuple[int, bool, tuple[tuple[int, int, int], ...], tuple[tuple[int, int, int], ...]],
+) -> _MessagePlan:
+    """Resolve profile metadata for a definition layout (cached across requests)."""
+    global_id, big_endian, wire_fields, developer_wire_fields = key
+    definition_message = DefinitionMessage(
+        global_id=global_id,
+        endian=Endian.BIG if big_endian else Endian.LITTLE,
+        field_definitions=[
+            FieldDefinition(field_id, size, _base_type(base_type))
+            for field_id, size, base_type in wire_fields
+        ],
+    )
+    try:
+        message = MessageFactory.from_definition(definition_message, developer_fields=[])
+    except ValueError as exc:
+        raise FitDecodeError(
+            f"Unsupported definition for global message {global_id}: {exc}"
+        ) from exc
+
+    field_ids = [field_id for field_id, _, _ in wire_fields]
+    native = (
+        not developer_wire_fields
+        and global_id != FieldDescriptionMessage.ID
+        and len(set(field_ids)) == len(field_ids)
+        and all(size > 0 for _, size, _ in wire_fields)
+    )
+    slots = {field_id: index for index, field_id in enumerate(field_ids)}
+
+    fields: list[_FieldPlan] = []
+    components: dict[int, tuple[FieldComponent, ...]] = {}
+    for field in message.fields:
+        slot = slots.get(field.field_id) if field.size else None
+        if slot is not None:
+            wire_code = BASE_TYPE_FORMATS[wire_fields[slot][2]][0]
+            profile_code = field.base_type.struct_format or "s"
+            if wire_code != profile_code or field.size % field.base_type.size:
+                native = False
+        if field.components or any(sub_field.components for sub_field in field.sub_fields):
+            native = False
+        field_components = PROFILE_COMPONENTS.get((global_id, field.field_id))
+        if field_components:
+            components.setdefault(field.field_id, tuple(field_components))
+
+        scaled = not (
+            (field.scale is None or field.scale == 1.0)
+            and (field.offset is None or field.offset == 0.0)
+        )
+        fields.append(
+            _FieldPlan(
+                field_id=field.field_id,
+                name=field.name,
+                units=field.units or None,
+                base_type=field.base_type,
+                slot=slot,
+                size=field.size if slot is not None else 0,
+                scale=field.scale,
+                offset=field.offset,
+                scaled=scaled,
+                rounds=field.type_name == "date_time",
+                is_float=field.base_type.is_float(),
+                is_string=field.base_type.is_string(),
+            )
+        )
+
+    fields_by_id: dict[int, _FieldPlan] = {}
+    for field_plan in fields:
+        fields_by_id.setdefault(field_plan.field_id, field_plan)
+
+    # Components expanded from the wire fields, directly or through nested expansions.
+    expanded = [field_id for field_id in field_ids if field_id in components]
+    sources: set[int] = set()
+    while expanded:
+        field_id = expanded.pop()
+        if field_id not in sources:
+            sources.add(field_id)
+            expanded.extend(
+                component.field_id
+                for component in components[field_id]
+                if component.field_id in components
+            )
+    accumulates = any(
+        component.accumulate for field_id in sources for component in components[field_id]
+    )
+
+    # Fields that can carry a value on a given message: wire fields, the timestamp slot
+    # filled in by compressed headers, and every (nested) component destination.
+    reachable = {TIMESTAMP_FIELD_ID}
+    pending = [component.field_id for items in components.values() for component in items]
+    while pending:
+        field_id = pending.pop()
+        if field_id not in reachable:
+            reachable.add(field_id)
+            pending.extend(component.field_id for component in components.get(field_id, ()))
+
+    return _MessagePlan(
+        name=message.name,
+        definition_fields=[
+            {"field_id": field_id, "size": size, "base_type": _base_type(base_type).name}
+            for field_id, size, base_type in wire_fields
+        ],
+        wire_fields=tuple(field for field in fields if field.slot is not None),
+        dynamic_fields=tuple(
+            field for field in fields if field.slot is not None or field.field_id in reachable
+        ),
+        component_sources=tuple(field for field in fields if field.field_id in components),
+        fields_by_id=fields_by_id,
+        components=components,
+        native=native,
+        accumulates=accumulates,
+    )
+
+
+def _base_type(value: int) -> BaseType:
+    try:
+        return BaseType(value)
+    except ValueError as exc:
+        raise FitDecodeError(f"{value} is not a valid FIT base type.") from exc
+
+
+def _data_fields(
+    plan: _MessagePlan,
+    raw: RawData,
+    view: memoryview,
+    accumulators: dict[tuple[int, int], int],
+    keep: frozenset[str] | None = None,
+) -> list[DataFieldDict]:
+    """Build the data fields of one natively decoded data message.
+
+    `keep` limits the output to those field names; expansion still sees every field.
+    """
+    if not plan.components and raw.timestamp is None:
+        return [
+            _data_field(field, _wire_values(field, raw, view))
+            for field in plan.wire_fields
+            if keep is None or field.name in keep
+        ]
+
+    state = _ExpansionState(plan, raw, view)
+    if raw.timestamp is not None:
+        state.set_timestamp(raw.timestamp)
+    if plan.components:
+        state.expand_all(accumulators)
+
+    data_fields: list[DataFieldDict] = []
+    for field in plan.dynamic_fields:
+        if keep is not None and field.name not in keep:
+            continue
+        encoded = state.encoded.get(field.field_id)
+        if field.field_id in state.sizes:
+            if state.sizes[field.field_id] == 0 or encoded is None:
+                continue
+            data_fields.append(_data_field(field, encoded))
+        elif field.slot is not None:
+            data_fields.append(_data_field(field, _wire_values(field, raw, view)))
+    return data_fields
+
+
+def _wire_values(field: _FieldPlan, raw: RawData, view: memoryview) -> list[Any]:
+    """Return the encoded values of a wire-backed field (strings split, float NaNs checked)."""
+    start, stop = raw.definition.slices[cast(int, field.slot)]
+    values = list(raw.values[start:stop])
+    if field.is_string:
+        container = cast(bytes, values[0]).decode("utf-8")
+        return [item for item in container.split("\u0000")[:-1] if item]
+    if field.is_float:
+        for index, value in enumerate(values):
+            if value != value:
+                values[index] = _float_or_invalid(field, raw, view, index)
+    return values
+
+
+def _float_or_invalid(field: _FieldPlan, raw: RawData, view: memoryview, index: int) -> Any:
+    """Distinguish FIT's all-ones invalid float pattern (None) from an ordinary NaN."""
+    element_size = field.base_type.size
+    layout, invalid = _FLOAT_INVALID[element_size]
+    position = raw.offset + raw.definition.byte_offsets[cast(int, field.slot)]
+    (bits,) = layout.unpack_from(view, position + index * element_size)
+    return None if bits == invalid else math.nan
+
+
+def _decode(field: _FieldPlan, encoded: list[Any]) -> list[Any]:
+    """Apply profile scale/offset to encoded values, mirroring fit_tool's `decode_value`."""
+    if not field.scaled:
+        return encoded
+    scale = field.scale if field.scale is not None else 1.0
+    offset = field.offset if field.offset is not None else 0.0
+    decoded: list[Any] = []
+    for value in encoded:
+        if value is None or isinstance(value, str):
+            decoded.append(value)
+            continue
+        scaled = value / scale - offset
+        decoded.append(round(scaled) if field.rounds else scaled)
+    return decoded
+
+
+def _data_field(field: _FieldPlan, encoded: list[Any]) -> DataFieldDict:
+    return {
+        "field_id": field.field_id,
+        "name": field.name,
+        "units": field.units,
+        "value": json_value(_decode(field, encoded), field.name, field.field_id),
+    }
+
+
+class _ExpansionState:
+    """Per-message encoded values for fields touched by timestamps or component expansion.
+
+    This mirrors `fit_tool.components.expand_message_components` on plain lists so the
+    natively decoded output matches fit_tool's projection value for value.
+    """
+
+    def __init__(self, plan: _MessagePlan, raw: RawData, view: memoryview) -> None:
+        self.plan = plan
+        self.raw = raw
+        self.view = view
+        self.encoded: dict[int, list[Any]] = {}
+        self.sizes: dict[int, int] = {}
+        self.expanded: set[int] = set()
+
+    def load(self, field: _FieldPlan) -> list[Any]:
+        encoded = self.encoded.get(field.field_id)
+        if encoded is None:
+            if field.slot is not None:
+                encoded = _wire_values(field, self.raw, self.view)
+            else:
+                encoded = []
+            self.encoded[field.field_id] = encoded
+            self.sizes[field.field_id] = field.size
+        return encoded
+
+    def set_timestamp(self, timestamp: int) -> None:
+        field = self.plan.fields_by_id.get(TIMESTAMP_FIELD_ID)
+        if field is None:
+            return
+        encoded = self.load(field)
+        if self.sizes[field.field_id] == 0:
+            self.sizes[field.field_id] = field.base_type.size
+            encoded[:] = [None]
+        encoded[0] = timestamp
+
+    def expand_all(self, accumulators: dict[tuple[int, int], int]) -> None:
+        expanded_sources: set[int] = set()
+        write_index: dict[int, int] = {}
+        for field in self.plan.component_sources:
+            self._expand(field, accumulators, expanded_sources, write_index)
+
+    def _expand(
+        self,
+        source: _FieldPlan,
+        accumulators: dict[tuple[int, int], int],
+        expanded_sources: set[int],
+        write_index: dict[int, int],
+    ) -> None:
+        if source.field_id in expanded_sources:
+            return
+        components = self.plan.components.get(source.field_id)
+        if not components:
+            return
+        raw_value = self._raw_as_int(source)
+        if raw_value is None:
+            return
+
+        expanded_sources.add(source.field_id)
+        global_id = self.raw.definition.global_id
+        bit_offset = 0
+        available_bits = self.sizes[source.field_id] * 8
+        for component in components:
+            bits = component.bits or 0
+            if bits <= 0:
+                continue
+            if bit_offset + bits > available_bits:
+                break
+            part = (raw_value >> bit_offset) & ((1 << bits) - 1)
+            bit_offset += bits
+
+            if component.accumulate:
+                key = (global_id, component.field_id)
+                previous = accumulators.get(key, 0)
+                max_value = 1 << bits
+                accumulated = previous + (part - (previous % max_value)) % max_value
+                accumulators[key] = accumulated
+                raw_part = accumulated
+            else:
+                raw_part = part
+
+            destination = self.plan.fields_by_id.get(component.field_id)
+            if destination is None or self._has_wire_value(destination):
+                continue
+
+            index = write_index.get(component.field_id, 0)
+            self._write_component(destination, index, raw_part, component)
+            write_index[component.field_id] = index + 1
+            self._expand(destination, accumulators, expanded_sources, write_index)
+
+    def _raw_as_int(self, field: _FieldPlan) -> int | None:
+        encoded = self.load(field)
+        if self.sizes[field.field_id] == 0 or not encoded:
+            return None
+        if field.is_string or field.is_float:
+            return None
+        width = field.base_type.size * 8
+        mask = (1 << width) - 1
+        value = 0
+        shift = 0
+        for item in encoded:
+            if item is None:
+                return None
+            value |= (int(item) & mask) << shift
+            shift += width
+        return value
+
+    def _has_wire_value(self, field: _FieldPlan) -> bool:
+        encoded = self.load(field)
+        if self.sizes[field.field_id] == 0 or field.field_id in self.expanded:
+            return False
+        return any(item is not None for item in encoded)
+
+    def _write_component(
+        self, field: _FieldPlan, index: int, raw_part: int, component: FieldComponent
+    ) -> None:
+        encoded = self.load(field)
+        element_size = max(field.base_type.size, 1)
+        while index >= len(encoded):
+            encoded.append(None)
+        self.sizes[field.field_id] = max(self.sizes[field.field_id], (index + 1) * element_size)
+
+        scale = component.scale if component.scale else 1.0
+        offset = component.offset if component.offset is not None else 0.0
+        encoded[index] = _encode_component(field, raw_part / scale - offset, raw_part)
+        self.expanded.add(field.field_id)
+
+
+def _encode_component(field: _FieldPlan, value: float, raw_part: int) -> int | float:
+    """Encode an expanded component value with the destination's scale/offset."""
+    scale = field.scale if field.scale is not None else 1.0
+    offset = field.offset if field.offset is not None else 0.0
+    if field.is_float:
+        return float(value) if not field.scaled else (float(value) + offset) * scale
+
+    encoded = int(value) if not field.scaled else round((value + offset) * scale)
+    minimum, maximum = field.base_type.min, field.base_type.max
+    if minimum is not None and maximum is not None and not minimum <= encoded <= maximum:
+        return int(raw_part)
+    return encoded
+
+
+def _definition_message(definition: LocalDefinition) -> DefinitionMessage:
+    return DefinitionMessage(
+        local_id=definition.local_id,
+        global_id=definition.global_id,
+        endian=Endian.BIG if definition.big_endian else Endian.LITTLE,
+        field_definitions=[
+            FieldDefinition(field_id, size, _base_type(base_type))
+            for field_id, size, base_type in definition.fields
+        ],
+        developer_field_definitions=[
+            DeveloperFieldDefinition(
+                field_id=field_id, size=size, developer_data_index=developer_data_index
+            )
+            for field_id, size, developer_data_index in definition.developer_fields
+        ],
+    )
+
+
+def _project_with_fit_tool(
+    definition_message: DefinitionMessage,
+    raw: RawData,
+    view: memoryview,
+    developer_fields: dict[int, dict[int, DeveloperField]],
+    accumulators: dict[tuple[int, int], int],
+) -> Record:
+    """Project one data message through fit_tool's profile message classes."""
+    definition = raw.definition
+    payload = bytes(view[raw.offset : raw.offset + definition.layout.size])
+    message_developer_fields = (
+        definition_message.get_developer_fields(developer_fields)
+        if definition.developer_fields
+        else []
+    )
+    message = DataMessage.from_bytes(definition_message, message_developer_fields, payload)
+    message.local_id = definition.local_id
+
+    if raw.timestamp is not None:
+        timestamp_field = message.get_field(TIMESTAMP_FIELD_ID)
+        if timestamp_field is not None:
+            if timestamp_field.size == 0:
+                timestamp_field.size = timestamp_field.base_type.size
+                timestamp_field.encoded_values = [None]
+            timestamp_field.set_encoded_value(0, raw.timestamp, check_validity=False)
+
+    expand_message_components(message, accumulators)
+    header = RecordHeader(is_definition=False, local_id=definition.local_id)
+    return Record(header, message)
+
+
+def _register_developer_field(
+    message: FieldDescriptionMessage,
+    developer_fields: dict[int, dict[int, DeveloperField]],
+) -> None:
+    """Remember a field description so later developer fields can be projected."""
+    if (
+        message.developer_data_index is None
+        or message.field_definition_number is None
+        or message.fit_base_type_id is None
+    ):
+        raise FitDecodeError("Field description is missing required developer-field metadata.")
+
+    developer_field = DeveloperField(
+        developer_data_index=message.developer_data_index,
+        field_id=message.field_definition_number,
+        base_type=_base_type(message.fit_base_type_id),
+        name=message.field_name,
+        scale=message.scale,
+        offset=message.offset,
+        units=message.units,
+    )
+    developer_fields.setdefault(developer_field.developer_data_index, {})[
+        developer_field.field_id
+    ] = developer_field
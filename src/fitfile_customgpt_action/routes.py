@@ -1,11 +1,182 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import replace
+from typing import Annotated, Any, Literal
 
-from .models import BuildFitRequest, ParseFitResponse
-from .services import build_fit_file, parse_fit_bytes
+from fastapi import APIRouter, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
+from . import metrics
+from .cache import ParseCache
+from .config import Settings
+from .decoder import FitDecodeError, Recovery, read_header, split_segments
+from .downsample import DownsampleMethod, Downsampling
+from .encoder import EncodedRecords, iter_fit_bytes
+from .executor import ExecutorSaturatedError, WorkExecutor
+from .index import INDEX_VERSION, RecordIndex, TimeWindow
+from .models import (
+    BatchErrorLine,
+    BuildFitColumnarRequest,
+    BuildFitRequest,
+    FitSummaryResponse,
+    ParseFitColumnarResponse,
+    ParseFitResponse,
+    ParseFitSegmentsResponse,
+)
+from .selection import Selection
+from .services import (
+    ZIP_MAGIC,
+    build_downsampling,
+    build_recovery,
+    build_selection,
+    build_summary_options,
+    build_window,
+    encode_fit_columns,
+    encode_fit_records,
+    index_fit_bytes,
+    parse_fit_ndjson,
+    render_parse_json,
+    render_summary_json,
+    unzip_fit_files,
+)
+from .uploads import STREAMED_BODY_MAX_BYTES, StreamedBody, UploadBuffer
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CACHE_STATUS_HEADER = "X-Cache"
+EMPTY_UPLOAD_DETAIL = "The provided FIT file is empty."
+RAW_MEDIA_TYPE = "application/octet-stream"
+# Longest pause between body chunks tolerated while a worker decodes an upload as it arrives.
+UPLOAD_STALL_SECONDS = 30.0
+
+OutputFormat = Annotated[
+    Literal["records", "columnar"],
+    Query(
+        alias="format",
+        description=(
+            "`records` returns one entry per definition/data record; `columnar` groups data "
+            "records by message type into one value array per field."
+        ),
+    ),
+]
+
+MessagesQuery = Annotated[
+    list[str],
+    Query(
+        description=(
+            "Only return these messages (comma-separated or repeated), e.g. `session,lap`. "
+            "Other messages are skipped while decoding."
+        ),
+    ),
+]
+FieldsQuery = Annotated[
+    list[str],
+    Query(
+        description=(
+            "Only return these `message.field` values (comma-separated or repeated), e.g. "
+            "`record.heart_rate,record.timestamp`. Named messages are included automatically."
+        ),
+    ),
+]
+
+NumbersQuery = Annotated[
+    list[str],
+    Query(
+        description=(
+            "Comma-separated or repeated numbers. `percentiles` defaults to `50,90`; zone "
+            "lists give each zone's lower bound and default to fractions of the file's "
+            "`zones_target` max heart rate / FTP."
+        ),
+    ),
+]
+
+DownsampleQuery = Annotated[
+    DownsampleMethod | None,
+    Query(
+        description=(
+            "Reduce `record` messages to about `points` rows: `decimate` keeps every n-th "
+            "record, `bucket` averages equal time buckets, `lttb` keeps the records that "
+            "preserve the shape of `downsample_field`. Other messages are returned unchanged."
+        ),
+    ),
+]
+PointsQuery = Annotated[
+    int, Query(ge=2, le=100_000, description="Target number of `record` rows when downsampling.")
+]
+DownsampleFieldQuery = Annotated[
+    str | None,
+    Query(
+        description=(
+            "`record` field LTTB follows, e.g. `heart_rate`; defaults to the first of power, "
+            "heart rate, speed and altitude present in the file."
+        ),
+    ),
+]
+
+TolerantQuery = Annotated[
+    bool,
+    Query(
+        description=(
+            "Return the records decoded before a truncation or corruption point instead of "
+            "failing, with `metadata.diagnostics` saying where and why decoding stopped."
+        ),
+    ),
+]
+ResumeQuery = Annotated[
+    str | None,
+    Query(
+        description=(
+            "`metadata.diagnostics.resume_token` of an earlier tolerant parse of a truncated "
+            "file. The body is then the rest of the file from `diagnostics.offset` on, and "
+            "decoding continues where it stopped. Implies `tolerant`."
+        ),
+    ),
+]
+
+SegmentsQuery = Annotated[
+    bool,
+    Query(
+        description=(
+            'Return one result per chained FIT file of the upload, `{"segments": [...]}`, '
+            "each shaped like the response for `format`. Segments are decoded in parallel and "
+            "the response is always a single JSON document."
+        ),
+    ),
+]
+
+StartQuery = Annotated[
+    float | None,
+    Query(
+        ge=0,
+        description=(
+            "Only return data messages timestamped this many seconds or more after the file's "
+            "earliest timestamp, e.g. `2400` for minute 40 on. Only the records in the window are "
+            "decoded; the response is always a single JSON document."
+        ),
+    ),
+]
+EndQuery = Annotated[
+    float | None,
+    Query(
+        ge=0,
+        description=(
+            "Only return data messages timestamped up to this many seconds after the file's "
+            "earliest timestamp."
+        ),
+    ),
+]
+
+# Documents the raw FIT body accepted next to the multipart `file` field.
+RAW_BODY_OPENAPI: dict[str, Any] = {
+    "requestBody": {"content": {RAW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}}}
+}
+
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
@@ -14,17 +185,358 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Request, stage, cache and executor metrics in the Prometheus text format.",
+)
+async def read_metrics(request: Request) -> Response:
+    settings: Settings = request.app.state.settings
+    if not settings.metrics:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    cache: ParseCache = request.app.state.parse_cache
+    executor: WorkExecutor = request.app.state.executor
+    stats = cache.stats()
+    gauges = [
+        ("fit_cache_entries", "Entries in the memory tier.", stats.entries),
+        ("fit_cache_size_bytes", "Bytes held by the memory tier.", stats.size_bytes),
+        ("fit_cache_max_bytes", "Memory tier budget in bytes.", stats.max_bytes),
+        ("fit_executor_pending", "Jobs running or waiting for a worker.", executor.pending),
+        ("fit_executor_workers", "Executor workers.", executor.workers),
+        ("fit_executor_queue_limit", "Jobs allowed to wait for a worker.", executor.max_queue),
+    ]
+    return Response(metrics.REGISTRY.render(gauges), media_type=metrics.CONTENT_TYPE)
+
+
 @router.post(
     "/parse",
-    response_model=ParseFitResponse,
+    response_model=ParseFitResponse | ParseFitColumnarResponse | ParseFitSegmentsResponse,
     summary="Parse a FIT file into a JSON-friendly structure.",
+    responses={
+        200: {
+            "content": {
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {
+                        "type": "string",
+                        "description": (
+                            "One JSON object per line: a `metadata` line followed by one "
+                            "line per definition/data record, and a final `diagnostics` "
+                            "line for tolerant parses."
+                        ),
+                    }
+                }
+            },
+            "description": "Parsed FIT file; streamed as NDJSON when requested via Accept.",
+        }
+    },
+    openapi_extra=RAW_BODY_OPENAPI,
+)
+async def parse_fit(
+    request: Request,
+    file: UploadFile | None = File(
+        default=None,
+        description=f"The FIT file; alternatively send it as the raw `{RAW_MEDIA_TYPE}` body.",
+    ),
+    accept: str | None = Header(default=None),
+    output_format: OutputFormat = "records",
+    messages: MessagesQuery = [],  # noqa: B006 - FastAPI copies query defaults per request
+    fields: FieldsQuery = [],  # noqa: B006
+    downsample: DownsampleQuery = None,
+    points: PointsQuery = 1000,
+    downsample_field: DownsampleFieldQuery = None,
+    tolerant: TolerantQuery = False,
+    resume: ResumeQuery = None,
+    segments: SegmentsQuery = False,
+    start: StartQuery = None,
+    end: EndQuery = None,
+) -> Response:
+    selection = build_selection(messages, fields)
+    downsampling = build_downsampling(downsample, points, downsample_field)
+    recovery = build_recovery(tolerant, resume)
+    window = build_window(start, end)
+    if segments and resume is not None:
+        raise HTTPException(status_code=400, detail="`segments` cannot be combined with `resume`.")
+    if window is not None and (recovery is not None or segments):
+        raise HTTPException(
+            status_code=400,
+            detail="`start`/`end` cannot be combined with `tolerant`, `resume` or `segments`.",
+        )
+    if file is None:
+        return await _parse_raw_body(
+            request, accept, output_format, selection, downsampling, recovery, segments, window
+        )
+
+    upload = UploadBuffer(file.file)
+    return await _parse_payload(
+        request,
+        upload.data,
+        accept,
+        output_format,
+        selection,
+        downsampling,
+        recovery,
+        segments,
+        window,
+        release=upload.release,
+    )
+
+
+async def _parse_raw_body(
+    request: Request,
+    accept: str | None,
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+    segments: bool,
+    window: TimeWindow | None,
+) -> Response:
+    """Parse a raw FIT request body, decoding it while it arrives when that pays off.
+
+    The body is received into a buffer of its `Content-Length` and its FIT header is checked
+    as soon as it is in (a resumed parse's body starts mid-file, without one). The response
+    only starts once the whole body has arrived, so NDJSON streams, per-segment results, time
+    windows and process pools take the complete body; otherwise a worker thread decodes the
+    records as they come in. Such a worker waits on the client, so at most `stream_slots` of
+    them run at once. The cache key is hashed as the bytes arrive; when the complete body turns
+    out to be cached, the stored response is sent and the worker's result dropped. An upload
+    that stalls for `UPLOAD_STALL_SECONDS`, before its first byte or later, is cut off with 408.
+    """
+    _require_raw_body(request)
+    declared = request.headers.get("content-length")
+    if declared is None or not declared.isdigit() or int(declared) > STREAMED_BODY_MAX_BYTES:
+        # Without a (plausible) length the buffer cannot be sized up front; take the body as a
+        # whole, growing it only as bytes actually arrive.
+        data = await request.body()
+        return await _parse_payload(
+            request,
+            data,
+            accept,
+            output_format,
+            selection,
+            downsampling,
+            recovery,
+            segments,
+            window,
+        )
+
+    body = StreamedBody(int(declared), UPLOAD_STALL_SECONDS)
+    chunks = aiter(request.stream())
+    await body.receive(chunks, until=1)
+    if body.received and (recovery is None or recovery.resume is None):
+        await body.receive(chunks, until=body.view[0])
+        try:
+            read_header(body.view[: body.received])
+        except FitDecodeError as exc:
+            raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {exc}") from exc
+
+    streaming = output_format == "records" and _accepts_ndjson(accept)
+    executor: WorkExecutor = request.app.state.executor
+    cache: ParseCache = request.app.state.parse_cache
+    slots: asyncio.Semaphore = request.app.state.stream_slots
+    complete = streaming or segments or window is not None
+    if complete or executor.kind != "thread" or not body.received or slots.locked():
+        await body.receive(chunks)
+        return await _parse_payload(
+            request,
+            body.view,
+            accept,
+            output_format,
+            selection,
+            downsampling,
+            recovery,
+            segments,
+            window,
+        )
+
+    digest = cache.hasher() if cache.enabled else None
+    if digest is not None:
+        digest.update(body.view[: body.received])
+        chunks = _hashed(chunks, digest)
+    async with slots:
+        job = asyncio.ensure_future(
+            _offload(
+                request, render_parse_json, body, output_format, selection, downsampling, recovery
+            )
+        )
+        try:
+            await body.receive(chunks)
+        except BaseException:
+            # `receive` closed the body, so the worker stops waiting and fails on its own.
+            await asyncio.gather(job, return_exceptions=True)
+            raise
+        if digest is None:
+            return Response(await job, media_type="application/json")
+
+        options = _parse_options(output_format, selection, downsampling, recovery)
+        key = cache.finish_key(digest, *options)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            job.add_done_callback(_discard)
+            status, content = "HIT", cached
+        else:
+            content = await job
+            await asyncio.to_thread(cache.put, key, content)
+            status = "MISS"
+    return Response(content, media_type="application/json", headers={CACHE_STATUS_HEADER: status})
+
+
+async def _hashed(chunks: AsyncIterator[bytes], digest: hashlib.blake2b) -> AsyncIterator[bytes]:
+    """Pass `chunks` through, feeding each one into `digest` on the way."""
+    async for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def _discard(job: asyncio.Future[Any]) -> None:
+    """Retrieve the outcome of a job whose result is no longer needed."""
+    if not job.cancelled():
+        job.exception()
+
+
+def _require_raw_body(request: Request) -> None:
+    """Reject requests that carry neither a multipart `file` field nor a raw FIT body."""
+    media_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type != RAW_MEDIA_TYPE:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Send the FIT file as a multipart `file` field or as a raw {RAW_MEDIA_TYPE} body."
+            ),
+        )
+
+
+async def _parse_payload(
+    request: Request,
+    data: bytes | memoryview,
+    accept: str | None,
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None = None,
+    segments: bool = False,
+    window: TimeWindow | None = None,
+    release: Callable[[], None] | None = None,
+) -> Response:
+    """Answer a parse request for a complete upload; `release` runs once `data` is unused."""
+    try:
+        if not data:
+            raise HTTPException(status_code=400, detail=EMPTY_UPLOAD_DETAIL)
+        ndjson = output_format == "records" and _accepts_ndjson(accept)
+        if ndjson and not segments and window is None:
+            lines = parse_fit_ndjson(data, selection, downsampling, recovery)
+            return StreamingResponse(
+                _offload_stream(request, lines),
+                media_type=NDJSON_MEDIA_TYPE,
+                background=BackgroundTask(release) if release is not None else None,
+            )
+    except BaseException:
+        if release is not None:
+            release()
+        raise
+
+    try:
+        if segments:
+            return await _segments_json(
+                request, data, output_format, selection, downsampling, recovery
+            )
+        if window is not None:
+            window = replace(window, index=await _record_index(request, data))
+        return await _cached_json(
+            request, data, output_format, selection, downsampling, recovery, window
+        )
+    finally:
+        if release is not None:
+            release()
+
+
+@router.post(
+    "/summary",
+    response_model=FitSummaryResponse,
+    summary="Summarize an activity per session and lap without returning its records.",
+    openapi_extra=RAW_BODY_OPENAPI,
 )
-async def parse_fit(file: UploadFile = File(...)) -> ParseFitResponse:
-    data = await file.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="The provided FIT file is empty.")
+async def summarize_activity(
+    request: Request,
+    file: UploadFile | None = File(
+        default=None,
+        description=f"The FIT file; alternatively send it as the raw `{RAW_MEDIA_TYPE}` body.",
+    ),
+    percentiles: NumbersQuery = [],  # noqa: B006
+    heart_rate_zones: NumbersQuery = [],  # noqa: B006
+    power_zones: NumbersQuery = [],  # noqa: B006
+) -> Response:
+    options = build_summary_options(percentiles, heart_rate_zones, power_zones)
+    release: Callable[[], None] | None = None
+    if file is None:
+        _require_raw_body(request)
+        data: bytes | memoryview = await request.body()
+    else:
+        upload = UploadBuffer(file.file)
+        data, release = upload.data, upload.release
+    try:
+        if not data:
+            raise HTTPException(status_code=400, detail=EMPTY_UPLOAD_DETAIL)
+        body, status = await _cached_body(
+            request, data, [options.cache_token()], render_summary_json, options
+        )
+    finally:
+        if release is not None:
+            release()
+    headers = {CACHE_STATUS_HEADER: status} if status else None
+    return Response(body, media_type="application/json", headers=headers)
 
-    return parse_fit_bytes(data)
+
+@router.post(
+    "/parse/batch",
+    response_class=StreamingResponse,
+    summary="Parse many FIT files (or zip archives of FIT files) in one request.",
+    responses={
+        200: {
+            "content": {
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {
+                        "type": "string",
+                        "description": (
+                            "One JSON object per file, in completion order: "
+                            '`{"kind": "result", "index", "filename", "result"}` or '
+                            '`{"kind": "error", "index", "filename", "status_code", "detail"}`.'
+                        ),
+                    }
+                }
+            },
+            "description": "Per-file parse results streamed as NDJSON.",
+        }
+    },
+)
+async def parse_fit_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    output_format: OutputFormat = "records",
+    messages: MessagesQuery = [],  # noqa: B006
+    fields: FieldsQuery = [],  # noqa: B006
+    downsample: DownsampleQuery = None,
+    points: PointsQuery = 1000,
+    downsample_field: DownsampleFieldQuery = None,
+    tolerant: TolerantQuery = False,
+) -> StreamingResponse:
+    selection = build_selection(messages, fields)
+    downsampling = build_downsampling(downsample, points, downsample_field)
+    recovery = build_recovery(tolerant, None)
+    uploads: list[tuple[str, bytes]] = []
+    for upload in files:
+        data = await upload.read()
+        if data.startswith(ZIP_MAGIC):
+            uploads.extend(await _offload(request, unzip_fit_files, data))
+        else:
+            uploads.append((upload.filename or f"file-{len(uploads)}", data))
+    if not uploads:
+        raise HTTPException(status_code=400, detail="The batch does not contain any files.")
+
+    return StreamingResponse(
+        _batch_lines(request, uploads, output_format, selection, downsampling, recovery),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
 
 
 @router.post(
@@ -32,13 +544,274 @@ async def parse_fit(file: UploadFile = File(...)) -> ParseFitResponse:
     summary="Build a FIT file from a list of FIT messages.",
 )
 async def produce_fit(
+    http_request: Request,
     request: BuildFitRequest,
     filename: str = "generated.fit",
-) -> StreamingResponse:
-    stream = build_fit_file(request)
-    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+) -> Response:
+    records = await _offload(http_request, encode_fit_records, request)
+    return _fit_download(records, filename)
+
+
+@router.post(
+    "/produce/columnar",
+    summary="Build a FIT file from per-message-type column arrays.",
+)
+async def produce_fit_columnar(
+    http_request: Request,
+    request: BuildFitColumnarRequest,
+    filename: str = "generated.fit",
+) -> Response:
+    records = await _offload(http_request, encode_fit_columns, request)
+    return _fit_download(records, filename)
+
+
+def _fit_download(records: EncodedRecords, filename: str) -> StreamingResponse:
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Content-Length": str(records.file_size),
+    }
     return StreamingResponse(
-        stream,
+        iter_fit_bytes(records),
         media_type="application/octet-stream",
         headers=headers,
+        # Removes the spill file even if the client disconnects before the body is sent.
+        background=BackgroundTask(records.discard),
+    )
+
+
+async def _cached_json(
+    request: Request,
+    data: bytes | memoryview,
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+    window: TimeWindow | None = None,
+) -> Response:
+    """Serve a parse response from the app's cache, parsing and storing it on a miss."""
+    body, status = await _render_cached(
+        request, data, output_format, selection, downsampling, recovery, window
+    )
+    headers = {CACHE_STATUS_HEADER: status} if status else None
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def _segments_json(
+    request: Request,
+    data: bytes | memoryview,
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+) -> Response:
+    """Parse each chained FIT file of `data` as its own job and list the results in order.
+
+    Segments are independent FIT files, so they are decoded concurrently, at most one job per
+    executor worker, and each one is cached on its own.
+    """
+    try:
+        segments = split_segments(data)
+    except FitDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {exc}") from exc
+    executor: WorkExecutor = request.app.state.executor
+    slots = asyncio.Semaphore(executor.workers)
+
+    async def parse_one(index: int, offset: int, segment: memoryview) -> bytes:
+        async with slots:
+            try:
+                body, _ = await _render_cached(
+                    request, segment, output_format, selection, downsampling, recovery
+                )
+            except HTTPException as exc:
+                raise HTTPException(
+                    status_code=exc.status_code,
+                    detail=f"Segment {index} at byte offset {offset}: {exc.detail}",
+                    headers=exc.headers,
+                ) from exc
+        return body
+
+    tasks = [
+        asyncio.ensure_future(parse_one(index, offset, segment))
+        for index, (offset, segment) in enumerate(segments)
+    ]
+    try:
+        bodies = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    # Splice the (possibly cached) segment bodies in without re-serializing them.
+    return Response(b'{"segments":[' + b",".join(bodies) + b"]}", media_type="application/json")
+
+
+async def _render_cached(
+    request: Request,
+    data: bytes | memoryview,
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+    window: TimeWindow | None = None,
+) -> tuple[bytes, str | None]:
+    """Return the JSON body for `data` and its cache status (None when caching is off)."""
+    return await _cached_body(
+        request,
+        data,
+        _parse_options(output_format, selection, downsampling, recovery, window),
+        render_parse_json,
+        output_format,
+        selection,
+        downsampling,
+        recovery,
+        window,
+    )
+
+
+def _parse_options(
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+    window: TimeWindow | None = None,
+) -> list[str]:
+    """The request options that shape a `/fit/parse` JSON body, for its cache key."""
+    options = [f"format={output_format}"]
+    if selection is not None:
+        options.append(selection.cache_token())
+    if downsampling is not None:
+        options.append(downsampling.cache_token())
+    if recovery is not None:
+        options.append(recovery.cache_token())
+    if window is not None:
+        options.append(window.cache_token())
+    return options
+
+
+async def _record_index(request: Request, data: bytes | memoryview) -> RecordIndex:
+    """The record offset index of `data`, built once and then kept in the app's cache.
+
+    Without a parse cache, indexes are kept in the app's own small index cache instead.
+    """
+    cache: ParseCache = request.app.state.parse_cache
+    if not cache.enabled:
+        cache = request.app.state.index_cache
+    blob, _ = await _cached_body(
+        request, data, [f"index=v{INDEX_VERSION}"], index_fit_bytes, cache=cache
     )
+    return RecordIndex.from_bytes(blob)
+
+
+async def _cached_body(
+    request: Request,
+    data: bytes | memoryview,
+    options: list[str],
+    render: Callable[..., bytes],
+    *args: Any,
+    cache: ParseCache | None = None,
+) -> tuple[bytes, str | None]:
+    """Return `render(data, *args)` through `cache` or the app's, keyed by `data` and `options`.
+
+    Hashing the upload and the disk tier's file IO run in a thread, off the event loop.
+    """
+    if cache is None:
+        cache = request.app.state.parse_cache
+    if not cache.enabled:
+        return await _offload(request, render, data, *args), None
+
+    def lookup() -> tuple[str, bytes | None]:
+        key = cache.key(data, *options)
+        return key, cache.get(key)
+
+    key, cached = await asyncio.to_thread(lookup)
+    if cached is not None:
+        return cached, "HIT"
+
+    body = await _offload(request, render, data, *args)
+    await asyncio.to_thread(cache.put, key, body)
+    return body, "MISS"
+
+
+async def _batch_lines(
+    request: Request,
+    uploads: list[tuple[str, bytes]],
+    output_format: str,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+) -> AsyncIterator[bytes]:
+    """Parse uploads concurrently and yield one NDJSON line per file as each one finishes.
+
+    At most one job per executor worker is in flight for a batch, so a large batch cannot
+    starve other requests or trip the executor's backpressure on its own.
+    """
+    executor: WorkExecutor = request.app.state.executor
+    slots = asyncio.Semaphore(executor.workers)
+
+    async def parse_one(index: int, filename: str, data: bytes) -> bytes:
+        if not data:
+            return _batch_error(index, filename, 400, EMPTY_UPLOAD_DETAIL)
+        async with slots:
+            try:
+                body, _ = await _render_cached(
+                    request, data, output_format, selection, downsampling, recovery
+                )
+            except HTTPException as exc:
+                return _batch_error(index, filename, exc.status_code, str(exc.detail))
+            except Exception as exc:
+                logger.exception("Unexpected failure while parsing batch file %r", filename)
+                return _batch_error(index, filename, 500, f"Failed to parse FIT file: {exc}")
+        header = json.dumps(
+            {"kind": "result", "index": index, "filename": filename}, separators=(",", ":")
+        )
+        # Splice the (possibly cached) response body in without re-serializing it.
+        return header[:-1].encode() + b',"result":' + body + b"}\n"
+
+    tasks = [
+        asyncio.ensure_future(parse_one(index, filename, data))
+        for index, (filename, data) in enumerate(uploads)
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _batch_error(index: int, filename: str, status_code: int, detail: str) -> bytes:
+    line = BatchErrorLine(index=index, filename=filename, status_code=status_code, detail=detail)
+    return line.model_dump_json().encode() + b"\n"
+
+
+async def _offload[T](request: Request, func: Callable[..., T], *args: Any) -> T:
+    """Run CPU-bound work on the app's executor, mapping saturation to 503 + Retry-After."""
+    executor: WorkExecutor = request.app.state.executor
+    try:
+        return await executor.run(func, *args)
+    except ExecutorSaturatedError as exc:
+        raise _unavailable(request, exc) from exc
+
+
+def _offload_stream[T](request: Request, iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Stream `iterator` through the app's executor, mapping saturation to 503 + Retry-After."""
+    executor: WorkExecutor = request.app.state.executor
+    try:
+        return executor.stream(iterator)
+    except ExecutorSaturatedError as exc:
+        raise _unavailable(request, exc) from exc
+
+
+def _unavailable(request: Request, exc: ExecutorSaturatedError) -> HTTPException:
+    settings: Settings = request.app.state.settings
+    return HTTPException(
+        status_code=503,
+        detail=str(exc),
+        headers={"Retry-After": str(settings.retry_after)},
+    )
+
+
+def _accepts_ndjson(accept: str | None) -> bool:
+    """Return True when the Accept header explicitly asks for an NDJSON stream."""
+    if not accept:
+        return False
+    media_types = (part.split(";", 1)[0].strip().lower() for part in accept.split(","))
+    return NDJSON_MEDIA_TYPE in media_types
@@ -0,0 +1,70 @@
+"""Message/field selections that let `/fit/parse` skip data the caller did not ask for."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+
+from fit_tool.profile.messages.developer_data_id_message import DeveloperDataIdMessage
+from fit_tool.profile.messages.field_description_message import FieldDescriptionMessage
+
+from .message_registry import field_index, resolve
+
+# Messages that must always be decoded because they describe developer fields of others.
+_DEVELOPER_METADATA_IDS = frozenset({DeveloperDataIdMessage.ID, FieldDescriptionMessage.ID})
+
+
+@dataclass(frozen=True, slots=True)
+class Selection:
+    """Global message ids to keep and, for some of them, the only field names to keep."""
+
+    messages: frozenset[int]
+    fields: Mapping[int, frozenset[str]]
+
+    @classmethod
+    def from_names(cls, messages: Iterable[str], fields: Iterable[str]) -> Selection:
+        """Build a selection from message names and `message.field` selectors.
+
+        A message named only through `fields` is kept with just those fields, and field
+        selectors also narrow a message listed in `messages`. Raises KeyError for unknown
+        messages and ValueError for malformed or unknown field selectors.
+        """
+        message_ids = {resolve(name).ID for name in messages}
+        field_names: dict[int, set[str]] = {}
+        for selector in fields:
+            message_name, _, field_name = selector.partition(".")
+            field_name = field_name.strip()
+            if not message_name.strip() or not field_name:
+                raise ValueError(f"Field selector '{selector}' must look like 'message.field'.")
+            message_cls = resolve(message_name)
+            if field_name not in field_index(message_cls):
+                raise ValueError(
+                    f"Field '{field_name}' is not valid for message '{message_cls.NAME}'."
+                )
+            field_names.setdefault(message_cls.ID, set()).add(field_name)
+
+        return cls(
+            messages=frozenset(message_ids | field_names.keys()),
+            fields={global_id: frozenset(names) for global_id, names in field_names.items()},
+        )
+
+    @property
+    def decode_ids(self) -> frozenset[int]:
+        """Global ids the decoder must still read, including developer field metadata."""
+        return self.messages | _DEVELOPER_METADATA_IDS
+
+    def includes(self, global_id: int) -> bool:
+        return global_id in self.messages
+
+    def field_names(self, global_id: int) -> frozenset[str] | None:
+        """Field names to keep for `global_id`, or None to keep every field."""
+        return self.fields.get(global_id)
+
+    def cache_token(self) -> str:
+        """Stable text form used to key cached responses."""
+        messages = ",".join(str(global_id) for global_id in sorted(self.messages))
+        fields = ";".join(
+            f"{global_id}:{','.join(sorted(names))}"
+            for global_id, names in sorted(self.fields.items())
+        )
+        return f"messages={messages}|fields={fields}"
@@ -2,6 +2,10 @@ from __future__ import annotations
 
 import logging
 import math
+import struct
+import zipfile
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 from io import BytesIO
 from typing import cast
 
@@ -9,65 +13,596 @@ from fastapi import HTTPException
 from fit_tool.data_message import DataMessage
 from fit_tool.definition_message import DefinitionMessage
 from fit_tool.field import Field
-from fit_tool.fit_file import FitFile
-from fit_tool.fit_file_builder import FitFileBuilder
 from fit_tool.profile.messages.message_factory import MessageFactory
 from fit_tool.record import Record
 
+from . import fastjson, metrics, vectorized
+from .decoder import (
+    DecoderState,
+    FitDecodeError,
+    FitHeader,
+    LocalDefinition,
+    RawData,
+    RecordDecoder,
+    Recovery,
+    read_header,
+    split_segments,
+)
+from .downsample import DownsampleMethod, Downsampling, downsample_records
+from .encoder import Columns, EncodedRecords, RecordWriter, iter_fit_bytes
+from .index import TimeWindow, WindowPass, build_index
+from .message_registry import FieldInfo, field_index
 from .message_registry import resolve as resolve_message
 from .models import (
+    BuildFitColumnarRequest,
     BuildFitRequest,
+    ColumnarField,
+    ColumnarMessage,
     DataField,
     DataRecord,
     DefinitionField,
     DefinitionRecord,
+    FitDiagnostics,
     FitMetadata,
-    JSONScalar,
+    FitSummaryResponse,
     JSONValue,
     MessageFieldPayload,
     MessagePayload,
+    ParseFitColumnarResponse,
     ParseFitResponse,
+    RecordDict,
+    StreamDiagnosticsLine,
+    StreamErrorLine,
+    StreamMetadataLine,
 )
+from .projection import ProjectionState, iter_records, json_value
+from .selection import Selection
+from .summary import DEFAULT_PERCENTILES, SummaryOptions, summarize, summary_selection
+from .uploads import StreamedBody
 
 logger = logging.getLogger(__name__)
 
+ZIP_MAGIC = b"PK\x03\x04"
+# A complete FIT file, or a raw request body that is still arriving.
+FitPayload = bytes | memoryview | StreamedBody
+
+
+def parse_fit_bytes(
+    payload: FitPayload,
+    selection: Selection | None = None,
+    downsampling: Downsampling | None = None,
+    recovery: Recovery | None = None,
+    window: TimeWindow | None = None,
+) -> ParseFitResponse:
+    """Decode FIT bytes into metadata + records suitable for API responses.
+
+    With a `selection`, unselected messages are skipped by the decoder and only the selected
+    fields of the remaining messages are serialized. With `downsampling`, the `record` stream
+    is reduced before the response is built. With `recovery`, a truncated or corrupted file
+    returns the records before the damage and `metadata.diagnostics` instead of failing.
+    With a `window`, only the data messages inside its time range are decoded.
+    `render_parse_json` encodes the same response without building the models.
+    """
+    metadata, records = _decode_records(
+        payload, selection, downsampling, recovery=recovery, window=window
+    )
+    return ParseFitResponse.model_validate({"metadata": metadata, "records": records})
+
+
+def parse_fit_columnar(
+    payload: FitPayload,
+    selection: Selection | None = None,
+    downsampling: Downsampling | None = None,
+    recovery: Recovery | None = None,
+    window: TimeWindow | None = None,
+) -> ParseFitColumnarResponse:
+    """Decode FIT bytes and group data records by message type into per-field columns."""
+    metadata, records = _decode_records(
+        payload, selection, downsampling, recovery=recovery, window=window
+    )
+    with metrics.stage("columnar"):
+        messages = _columnar_messages(records)
+    return ParseFitColumnarResponse.model_construct(metadata=metadata, messages=messages)
+
+
+def render_parse_json(
+    payload: FitPayload,
+    output_format: str = "records",
+    selection: Selection | None = None,
+    downsampling: Downsampling | None = None,
+    recovery: Recovery | None = None,
+    window: TimeWindow | None = None,
+) -> bytes:
+    """Parse FIT bytes and return the serialized JSON body for the requested format.
+
+    The records format is encoded straight from the decoded dicts; its JSON matches
+    `parse_fit_bytes(...).model_dump_json()`.
+    """
+    if output_format == "columnar":
+        response = parse_fit_columnar(payload, selection, downsampling, recovery, window)
+        with metrics.stage("encode_json"):
+            return response.model_dump_json().encode()
+    metadata, records = _decode_records(
+        payload, selection, downsampling, recovery=recovery, window=window
+    )
+    with metrics.stage("encode_json"):
+        return fastjson.dumps({"metadata": metadata.model_dump(), "records": records})
+
+
+def _decode_records(
+    payload: FitPayload,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    operation: str = "parse",
+    recovery: Recovery | None = None,
+    window: TimeWindow | None = None,
+) -> tuple[FitMetadata, list[RecordDict]]:
+    """Decode every selected record of a complete payload, then apply `downsampling`."""
+    passes: list[
+        tuple[RecordDecoder, Iterator[LocalDefinition | RawData] | None, ProjectionState | None]
+    ]
+    if window is not None:
+        passes = list(_open_window(payload, selection, window))
+    else:
+        passes = [(_open_decoder(payload, selection, recovery), None, None)]
+    try:
+        with metrics.stage("decode"):
+            records = [
+                record
+                for decoder, items, state in passes
+                for record in _iter_api_records(decoder, True, selection, items, state)
+            ]
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {exc}") from exc
+    metrics.count_records(
+        operation, (record["message"] for record in records if record["kind"] == "data")
+    )
+    if downsampling is not None:
+        with metrics.stage("downsample"):
+            records = downsample_records(records, downsampling)
+    first, last = passes[0][0], passes[-1][0]
+    if last.crcs:
+        crc: int | None = last.crcs[-1]
+    else:
+        # A window that stops before the end of the file did not reach its CRC.
+        crc = _stored_crc(payload) if window is not None else None
+    return _metadata(first.header, crc, _diagnostics(last)), records
+
+
+def summarize_fit(payload: FitPayload, options: SummaryOptions) -> FitSummaryResponse:
+    """Decode only the messages `summarize` needs and aggregate them per activity/session/lap."""
+    metadata, records = _decode_records(payload, summary_selection(), None, "summary")
+    with metrics.stage("summarize"):
+        return summarize(metadata, _columnar_messages(records), options)
 
-def parse_fit_bytes(payload: bytes) -> ParseFitResponse:
-    """Decode FIT bytes into metadata + records suitable for API responses."""
+
+def render_summary_json(payload: FitPayload, options: SummaryOptions) -> bytes:
+    """Summarize FIT bytes and return the serialized JSON body."""
+    response = summarize_fit(payload, options)
+    with metrics.stage("encode_json"):
+        return response.model_dump_json().encode()
+
+
+def build_selection(messages: Iterable[str], fields: Iterable[str]) -> Selection | None:
+    """Turn comma-separated `messages`/`fields` query values into a `Selection`.
+
+    Returns None when nothing was selected, meaning every message and field is kept.
+    """
+    message_names = [name for value in messages for name in value.split(",") if name.strip()]
+    field_names = [name for value in fields for name in value.split(",") if name.strip()]
+    if not message_names and not field_names:
+        return None
     try:
-        fit_file = FitFile.from_bytes(payload)
-    except Exception as exc:  # pragma: no cover - fast failure path
+        return Selection.from_names(message_names, field_names)
+    except (KeyError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc.args[0])) from exc
+
+
+def build_downsampling(
+    method: DownsampleMethod | None, points: int, field: str | None
+) -> Downsampling | None:
+    """Validate the `/fit/parse` downsampling query values; None when not requested."""
+    if field is not None:
+        if method != "lttb":
+            raise HTTPException(
+                status_code=400, detail="`downsample_field` requires `downsample=lttb`."
+            )
+        _field_info(resolve_message("record"), field)
+    if method is None:
+        return None
+    return Downsampling(method=method, points=points, field=field)
+
+
+def build_recovery(tolerant: bool, resume: str | None) -> Recovery | None:
+    """Validate the `/fit/parse` tolerant-decoding query values; None when not requested."""
+    if resume is not None:
+        try:
+            return Recovery(DecoderState.from_token(resume))
+        except FitDecodeError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return Recovery() if tolerant else None
+
+
+def build_window(start: float | None, end: float | None) -> TimeWindow | None:
+    """Validate the `/fit/parse` time-window query values; None when not requested."""
+    if start is None and end is None:
+        return None
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=400, detail="`end` must not be before `start`.")
+    return TimeWindow(start, end)
+
+
+def index_fit_bytes(payload: bytes | memoryview) -> bytes:
+    """Build the serialized `RecordIndex` of a complete FIT file."""
+    try:
+        with metrics.stage("index"):
+            return build_index(payload).to_bytes()
+    except FitDecodeError as exc:
         raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {exc}") from exc
 
-    metadata = FitMetadata(
-        protocol_version=str(fit_file.header.protocol_version),
-        profile_version=str(fit_file.header.profile_version),
-        records_size=fit_file.header.records_size,
-        crc=fit_file.crc,
+
+def build_summary_options(
+    percentiles: Iterable[str], heart_rate_zones: Iterable[str], power_zones: Iterable[str]
+) -> SummaryOptions:
+    """Turn comma-separated `/fit/summary` query values into `SummaryOptions`."""
+
+    def numbers(name: str, values: Iterable[str]) -> tuple[float, ...] | None:
+        items = [item.strip() for value in values for item in value.split(",") if item.strip()]
+        if not items:
+            return None
+        try:
+            parsed = tuple(float(item) for item in items)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=400, detail=f"`{name}` must be a list of numbers, got {items}."
+            ) from exc
+        if not all(math.isfinite(number) and number >= 0 for number in parsed):
+            raise HTTPException(status_code=400, detail=f"`{name}` must not be negative.")
+        return parsed
+
+    requested = numbers("percentiles", percentiles)
+    if requested is not None and max(requested) > 100:
+        raise HTTPException(status_code=400, detail="`percentiles` must be between 0 and 100.")
+    return SummaryOptions(
+        percentiles=requested if requested is not None else DEFAULT_PERCENTILES,
+        heart_rate_zones=numbers("heart_rate_zones", heart_rate_zones),
+        power_zones=numbers("power_zones", power_zones),
     )
 
-    records = [_serialize_record(record) for record in fit_file.records]
-    return ParseFitResponse(metadata=metadata, records=records)
+
+def unzip_fit_files(archive: bytes) -> list[tuple[str, bytes]]:
+    """Return `(name, bytes)` for every file member of a zip archive, in archive order."""
+    try:
+        with zipfile.ZipFile(BytesIO(archive)) as bundle:
+            return [
+                (member.filename, bundle.read(member))
+                for member in bundle.infolist()
+                if not member.is_dir() and not member.filename.startswith("__MACOSX/")
+            ]
+    except (zipfile.BadZipFile, zipfile.LargeZipFile) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid zip archive: {exc}") from exc
+
+
+def stream_fit_records(
+    payload: bytes | memoryview,
+    selection: Selection | None = None,
+    downsampling: Downsampling | None = None,
+) -> tuple[FitMetadata, Iterator[RecordDict]]:
+    """Read the FIT header eagerly and return a lazy iterator over decoded records.
+
+    Records are decoded one at a time as the iterator is consumed, so callers can forward
+    them to the client without holding the whole response in memory. Header
+    problems raise immediately; record-level failures surface while iterating. Downsampling
+    needs the whole `record` stream, so with `downsampling` the records are decoded on the
+    first `next()` and only their serialization stays lazy.
+    """
+    _, metadata, records = _stream_records(payload, selection, downsampling, None)
+    return metadata, records
+
+
+def _stream_records(
+    payload: bytes | memoryview,
+    selection: Selection | None,
+    downsampling: Downsampling | None,
+    recovery: Recovery | None,
+) -> tuple[RecordDecoder, FitMetadata, Iterator[RecordDict]]:
+    decoder = _open_decoder(payload, selection, recovery)
+    header = decoder.header
+    crc_offset = header.header_size + header.records_size
+    crc: int | None = None
+    if decoder.resume is None and len(payload) >= crc_offset + 2:
+        (crc,) = struct.unpack_from("<H", payload, crc_offset)
+    records = _iter_api_records(decoder, materialize=downsampling is not None, selection=selection)
+    if downsampling is not None:
+        records = _downsampled(records, downsampling)
+    return decoder, _metadata(header, crc=crc), records
+
+
+def _downsampled(records: Iterator[RecordDict], downsampling: Downsampling) -> Iterator[RecordDict]:
+    yield from downsample_records(list(records), downsampling)
+
+
+def parse_fit_ndjson(
+    payload: bytes | memoryview,
+    selection: Selection | None = None,
+    downsampling: Downsampling | None = None,
+    recovery: Recovery | None = None,
+) -> Iterator[bytes]:
+    """Decode FIT bytes into NDJSON lines: metadata first, then one line per record.
+
+    With `recovery`, a final `diagnostics` line reports how far decoding got.
+    """
+    if recovery is None:
+        metadata, records = stream_fit_records(payload, selection, downsampling)
+        return _ndjson_lines(metadata, records)
+    decoder, metadata, records = _stream_records(payload, selection, downsampling, recovery)
+    return _ndjson_lines(metadata, records, decoder)
+
+
+def _ndjson_lines(
+    metadata: FitMetadata,
+    records: Iterator[RecordDict],
+    tolerant_decoder: RecordDecoder | None = None,
+) -> Iterator[bytes]:
+    """Encode the metadata and record stream, ending with an error line on failure.
+
+    With a `tolerant_decoder`, its diagnostics follow the last record.
+    """
+    yield StreamMetadataLine(metadata=metadata).model_dump_json().encode() + b"\n"
+    messages: list[str] = []
+    try:
+        for record in records:
+            if record["kind"] == "data":
+                messages.append(record["message"])
+            yield fastjson.dumps(record) + b"\n"
+        diagnostics = _diagnostics(tolerant_decoder) if tolerant_decoder is not None else None
+        if diagnostics is not None:
+            yield StreamDiagnosticsLine(diagnostics=diagnostics).model_dump_json().encode() + b"\n"
+    except Exception as exc:
+        # The status line has already been sent, so report the failure in-band.
+        logger.warning("Aborted FIT stream after a decoding error: %s", exc)
+        error = StreamErrorLine(detail=f"Failed to parse FIT file: {exc}")
+        yield error.model_dump_json().encode() + b"\n"
+    finally:
+        metrics.count_records("parse", messages)
+
+
+def _open_decoder(
+    payload: FitPayload, selection: Selection | None = None, recovery: Recovery | None = None
+) -> RecordDecoder:
+    global_ids = selection.decode_ids if selection is not None else None
+    tolerant = recovery is not None
+    resume = recovery.resume if recovery is not None else None
+    try:
+        if isinstance(payload, StreamedBody):
+            return RecordDecoder(
+                payload.view, global_ids, payload.wait_for, tolerant=tolerant, resume=resume
+            )
+        return RecordDecoder(payload, global_ids, tolerant=tolerant, resume=resume)
+    except FitDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {exc}") from exc
 
 
-def build_fit_file(request: BuildFitRequest) -> BytesIO:
-    """Construct a FIT file from incoming request payloads."""
+def _stored_crc(payload: FitPayload) -> int | None:
+    """The file CRC stored at the end of the last segment of a complete payload."""
+    data = payload.view if isinstance(payload, StreamedBody) else payload
+    _, segment = split_segments(data)[-1]
+    header = read_header(segment)
+    crc_offset = header.header_size + header.records_size
+    if len(segment) < crc_offset + 2:
+        return None
+    (crc,) = struct.unpack_from("<H", segment, crc_offset)
+    return int(crc)
+
+
+def _open_window(
+    payload: FitPayload, selection: Selection | None, window: TimeWindow
+) -> list[WindowPass]:
+    """Decoders limited to the data messages inside `window`, and the messages to project."""
+    if isinstance(payload, StreamedBody):
+        payload.wait_for(len(payload.view))
+        payload = payload.view
+    global_ids = selection.decode_ids if selection is not None else None
+    try:
+        index = window.index
+        if index is None:
+            with metrics.stage("index"):
+                index = build_index(payload)
+        return index.open(payload, index.select(window.start, window.end), global_ids)
+    except FitDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {exc}") from exc
+
+
+def _metadata(
+    header: FitHeader, crc: int | None, diagnostics: FitDiagnostics | None = None
+) -> FitMetadata:
+    return FitMetadata(
+        protocol_version=header.protocol_version_str,
+        profile_version=header.profile_version_str,
+        records_size=header.records_size,
+        crc=crc,
+        diagnostics=diagnostics,
+    )
+
+
+def _diagnostics(decoder: RecordDecoder) -> FitDiagnostics | None:
+    """API form of a tolerant decoder's diagnostics; None for strict decoders."""
+    diagnostics = decoder.diagnostics
+    if diagnostics is None:
+        return None
+    if not diagnostics.complete:
+        logger.info("Tolerant FIT parse stopped early: %s", diagnostics.error)
+    return FitDiagnostics(
+        complete=diagnostics.complete,
+        offset=diagnostics.offset,
+        crc=diagnostics.crc,
+        error=diagnostics.error,
+        resume_token=diagnostics.resume.token() if diagnostics.resume is not None else None,
+    )
+
+
+def _iter_api_records(
+    decoder: RecordDecoder,
+    materialize: bool = False,
+    selection: Selection | None = None,
+    items: Iterator[LocalDefinition | RawData] | None = None,
+    state: ProjectionState | None = None,
+) -> Iterator[RecordDict]:
+    """Serialize the decoder output, including records projected through fit_tool.
+
+    With `materialize`, the caller keeps every record anyway, so the NumPy column decoder is
+    used when available; otherwise records are projected one by one as they are consumed.
+    `items` replaces iterating `decoder`, and is always projected one by one, continuing
+    from the projection `state`.
+    """
+    if items is None and materialize and vectorized.available():
+        records = vectorized.iter_records(decoder, selection)
+    else:
+        records = iter_records(decoder, items, selection=selection, state=state)
+    for record in records:
+        if not isinstance(record, Record):
+            yield record
+            continue
+        serialized = _serialize_record(record)
+        if selection is None:
+            yield _record_dict(serialized)
+        elif selection.includes(serialized.global_id):
+            yield _record_dict(_select_fields(serialized, selection))
+
+
+def _record_dict(record: DefinitionRecord | DataRecord) -> RecordDict:
+    return cast(RecordDict, record.model_dump())
+
+
+def _select_fields(
+    record: DefinitionRecord | DataRecord, selection: Selection
+) -> DefinitionRecord | DataRecord:
+    """Drop unselected fields from a data record serialized through fit_tool."""
+    keep = selection.field_names(record.global_id)
+    if keep is None or isinstance(record, DefinitionRecord):
+        return record
+    return record.model_copy(
+        update={"fields": [field for field in record.fields if field.name in keep]}
+    )
+
+
+def _columnar_messages(records: Iterable[RecordDict]) -> list[ColumnarMessage]:
+    """Pivot data records into one column per (field_id, name), padding gaps with None.
+
+    Messages and columns keep the order in which they first appear. Definition records are
+    dropped because every column already carries its field id, name and units.
+    """
+    groups: dict[int, ColumnarMessage] = {}
+    group_columns: dict[int, dict[tuple[int, str], ColumnarField]] = {}
+    for record in records:
+        if record["kind"] != "data":
+            continue
+
+        global_id = record["global_id"]
+        group = groups.get(global_id)
+        if group is None:
+            group = ColumnarMessage.model_construct(
+                global_id=global_id,
+                message=record["message"],
+                count=0,
+                columns=[],
+            )
+            groups[global_id] = group
+            group_columns[global_id] = {}
+        columns = group_columns[global_id]
+
+        row = group.count
+        for field in record["fields"]:
+            key = (field["field_id"], field["name"])
+            column = columns.get(key)
+            if column is None:
+                column = ColumnarField.model_construct(
+                    field_id=field["field_id"],
+                    name=field["name"],
+                    units=field["units"],
+                    values=[None] * row,
+                )
+                columns[key] = column
+                group.columns.append(column)
+            if len(column.values) == row:
+                column.values.append(field["value"])
+
+        group.count = row + 1
+        for column in group.columns:
+            if len(column.values) == row:
+                column.values.append(None)
+
+    return list(groups.values())
+
+
+def encode_fit_records(request: BuildFitRequest) -> EncodedRecords:
+    """Encode the records section of a FIT file for the incoming request payloads.
+
+    Stream the result with `iter_fit_bytes`, which also removes any spill file it used.
+    """
     if not request.messages:
         raise HTTPException(
             status_code=400,
             detail="At least one message is required to build a FIT file.",
         )
 
-    builder = FitFileBuilder()
-    for message_payload in request.messages:
-        message = _message_from_payload(message_payload)
-        try:
-            builder.add(message)
-        except Exception as exc:  # pragma: no cover - builder specific failure
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    names: list[str] = []
+    with metrics.stage("encode_fit"):
+        with _record_writer() as writer:
+            for message_payload in request.messages:
+                message = _message_from_payload(message_payload)
+                writer.add(message, local_id=message_payload.local_id)
+                names.append(message.name)
+        records = writer.finish()
+    metrics.count_records("produce", names)
+    return records
+
+
+def encode_fit_columns(request: BuildFitColumnarRequest) -> EncodedRecords:
+    """Encode the records section for a columnar request, one message per column row."""
+    groups = [_column_group(name, columns) for name, columns in request.root.items()]
+    if not any(rows for _, _, rows in groups):
+        raise HTTPException(
+            status_code=400,
+            detail="At least one message is required to build a FIT file.",
+        )
+
+    with metrics.stage("encode_fit"):
+        with _record_writer() as writer:
+            for message_cls, columns, rows in groups:
+                writer.add_columns(message_cls, columns, rows)
+        records = writer.finish()
+    if metrics.REGISTRY.enabled:
+        for message_cls, _, rows in groups:
+            metrics.RECORDS.inc(rows, "produce", message_cls.NAME)
+    return records
+
+
+@contextmanager
+def _record_writer() -> Iterator[RecordWriter]:
+    """Yield a RecordWriter, reporting encoding failures as 400 and dropping partial output."""
+    writer = RecordWriter()
+    try:
+        yield writer
+    except HTTPException:
+        writer.abort()
+        raise
+    except Exception as exc:
+        writer.abort()
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except BaseException:
+        writer.abort()
+        raise
 
-    fit_file = builder.build()
-    return BytesIO(fit_file.to_bytes())
+
+def build_fit_file(request: BuildFitRequest) -> BytesIO:
+    """Construct a FIT file from incoming request payloads, buffered in memory."""
+    return BytesIO(build_fit_bytes(request))
+
+
+def build_fit_bytes(request: BuildFitRequest) -> bytes:
+    """Construct a FIT file from request payloads and return its encoded bytes."""
+    return b"".join(iter_fit_bytes(encode_fit_records(request)))
 
 
 def _serialize_record(record: Record) -> DefinitionRecord | DataRecord:
@@ -110,37 +645,11 @@ def _serialize_record(record: Record) -> DefinitionRecord | DataRecord:
 
 def _serialize_data_field(field: Field) -> DataField:
     """Adapt a fit_tool Field into a JSON-friendly DataField."""
-    values: list[JSONScalar] = []
-    dropped_non_finite = False
-    for value in field.get_values():
-        if value is None:
-            continue
-        if isinstance(value, float) and not math.isfinite(value):
-            dropped_non_finite = True
-            continue
-        values.append(cast(JSONScalar, value))
-
-    if not values:
-        data_value: JSONValue | None = None
-    elif len(values) == 1:
-        data_value = values[0]
-    else:
-        data_value = values
-
-    units = field.units or None
-
-    if dropped_non_finite:
-        logger.warning(
-            "Omitted non-finite value(s) from field '%s' (id=%s) while serializing FIT data.",
-            field.name,
-            field.field_id,
-        )
-
     return DataField(
         field_id=field.field_id,
         name=field.name,
-        units=units,
-        value=data_value,
+        units=field.units or None,
+        value=json_value(field.get_values(), field.name, field.field_id),
     )
 
 
@@ -151,30 +660,61 @@ def _message_from_payload(payload: MessagePayload) -> DataMessage:
     except KeyError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
+    # Reject unknown fields before paying for a message instance.
+    positions = [
+        _field_info(message_cls, field_payload.name).position for field_payload in payload.fields
+    ]
+
     kwargs = {}
     if payload.local_id is not None:
         kwargs["local_id"] = payload.local_id
 
     message = message_cls(**kwargs)
 
-    for field in payload.fields:
-        _apply_field_payload(message, field)
+    for position, field_payload in zip(positions, payload.fields, strict=True):
+        _apply_field_payload(message.fields[position], field_payload)
 
     return message
 
 
-def _apply_field_payload(message: DataMessage, field_payload: MessageFieldPayload) -> None:
-    """Populate a DataMessage field with values defined in the payload."""
-    field = message.get_field_by_name(field_payload.name)
-    if field is None:
+def _field_info(message_cls: type[DataMessage], field_name: str) -> FieldInfo:
+    info = field_index(message_cls).get(field_name)
+    if info is None:
         raise HTTPException(
             status_code=400,
-            detail=f"Field '{field_payload.name}' is not valid for message '{message.name}'.",
+            detail=f"Field '{field_name}' is not valid for message '{message_cls.NAME}'.",
         )
+    return info
+
 
+def _apply_field_payload(field: Field, field_payload: MessageFieldPayload) -> None:
+    """Populate a DataMessage field with values defined in the payload."""
     values = field_payload.resolved_values()
     if not values:
         return
 
     for index, value in enumerate(values):
         field.set_value(index, value)
+
+
+def _column_group(
+    message_name: str, columns: dict[str, list[JSONValue | None]]
+) -> tuple[type[DataMessage], Columns, int]:
+    """Resolve a columnar message group to its class, field positions and row count."""
+    try:
+        message_cls = resolve_message(message_name)
+    except KeyError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Columns of message '{message_name}' must all have the same length.",
+        )
+
+    positions = [
+        (_field_info(message_cls, field_name).position, values)
+        for field_name, values in columns.items()
+    ]
+    return message_cls, positions, lengths.pop() if lengths else 0
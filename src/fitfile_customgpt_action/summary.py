@@ -0,0 +1,336 @@
+"""Activity analytics behind `/fit/summary`.
+
+`summarize` turns the columnar `record`, `lap`, `session` and `zones_target` messages of a
+decoded file into per-activity, per-session and per-lap aggregates: min/max/mean/percentiles
+of the common metrics, distance, elevation gain/loss and time in heart rate and power zones.
+Record columns are converted once into float arrays (invalid values become NaN) and every span
+is a slice of them, so each statistic is a single vectorized operation. NumPy is optional: the
+same aggregates are computed over plain lists when it is not installed.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from functools import cache
+from typing import Any
+
+from .message_registry import field_index, resolve
+from .models import (
+    ColumnarField,
+    ColumnarMessage,
+    FitMetadata,
+    FitSummaryResponse,
+    MetricSummary,
+    SpanSummary,
+    ZoneTime,
+)
+from .selection import Selection
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the installed extras
+    np = None  # type: ignore[assignment]
+
+# Summary metric -> record fields that carry it, preferred first.
+METRICS: dict[str, tuple[str, ...]] = {
+    "heart_rate": ("heart_rate",),
+    "power": ("power",),
+    "cadence": ("cadence",),
+    "speed": ("enhanced_speed", "speed"),
+    "altitude": ("enhanced_altitude", "altitude"),
+}
+DEFAULT_PERCENTILES = (50.0, 90.0)
+# A record counts for at most this long in time-in-zone totals, so pauses are not binned.
+MAX_SAMPLE_SECONDS = 30.0
+# Zone lower bounds used when a file's zones_target provides the reference value.
+HEART_RATE_ZONES_OF_MAX = (0.5, 0.6, 0.7, 0.8, 0.9)
+POWER_ZONES_OF_FTP = (0.55, 0.75, 0.9, 1.05, 1.2, 1.5)
+
+_SPAN_FIELDS = ("start_time", "total_elapsed_time", "timestamp")
+_ZONE_REFERENCES = ("max_heart_rate", "functional_threshold_power")
+
+
+@dataclass(frozen=True, slots=True)
+class SummaryOptions:
+    """Percentiles to report and explicit zone lower bounds (None: derive from the file)."""
+
+    percentiles: tuple[float, ...] = DEFAULT_PERCENTILES
+    heart_rate_zones: tuple[float, ...] | None = None
+    power_zones: tuple[float, ...] | None = None
+
+    def cache_token(self) -> str:
+        """Stable text form of the options, for response cache keys."""
+
+        def join(values: Iterable[float] | None) -> str:
+            return "auto" if values is None else ",".join(f"{value:g}" for value in values)
+
+        return (
+            f"summary:p={join(self.percentiles)};hr={join(self.heart_rate_zones)}"
+            f";power={join(self.power_zones)}"
+        )
+
+
+@cache
+def summary_selection() -> Selection:
+    """The messages and fields `summarize` reads; everything else is skipped while decoding."""
+    record_fields = [
+        "timestamp",
+        "distance",
+        *(name for names in METRICS.values() for name in names),
+    ]
+    return Selection.from_names(
+        [],
+        [f"record.{name}" for name in record_fields]
+        + [f"{message}.{name}" for message in ("lap", "session") for name in _SPAN_FIELDS]
+        + [f"zones_target.{name}" for name in _ZONE_REFERENCES],
+    )
+
+
+def summarize(
+    metadata: FitMetadata, messages: Iterable[ColumnarMessage], options: SummaryOptions
+) -> FitSummaryResponse:
+    """Aggregate the record stream over the whole activity and each session and lap."""
+    groups = {message.message: message for message in messages}
+    records = _Records(groups.get("record"))
+    zones = _zones(groups.get("zones_target"), options)
+
+    def spans(name: str) -> list[SpanSummary]:
+        message = groups.get(name)
+        if message is None:
+            return []
+        starts, elapsed, stamps = (_float_column(message, field) for field in _SPAN_FIELDS)
+        # Spans end `total_elapsed_time` after they start; some devices stamp them at the start.
+        ends = [
+            start + seconds * 1000 if not math.isnan(start + seconds) else stamp
+            for start, seconds, stamp in zip(starts, elapsed, stamps, strict=True)
+        ]
+        return [
+            records.span(index, _int_or_none(start), _int_or_none(end), zones, options)
+            for index, (start, end) in enumerate(zip(starts, ends, strict=True))
+        ]
+
+    return FitSummaryResponse.model_construct(
+        metadata=metadata,
+        activity=records.span(0, None, None, zones, options),
+        sessions=spans("session"),
+        laps=spans("lap"),
+    )
+
+
+class _Records:
+    """Time-ordered record columns: timestamps (ms), per-record dwell and metric series."""
+
+    def __init__(self, message: ColumnarMessage | None) -> None:
+        self.timestamps: list[int] = []
+        self.dwell: Any = _series([])
+        self.series: dict[str, tuple[str | None, Any]] = {}
+        if message is None:
+            return
+
+        stamps = _float_column(message, "timestamp")
+        keep = [index for index, stamp in enumerate(stamps) if not math.isnan(stamp)]
+        keep.sort(key=stamps.__getitem__)
+        self.timestamps = [int(stamps[index]) for index in keep]
+        gaps = [
+            min((later - earlier) / 1000, MAX_SAMPLE_SECONDS)
+            for earlier, later in zip(self.timestamps, self.timestamps[1:], strict=False)
+        ]
+        self.dwell = _series([*gaps, 0.0])
+
+        columns = {column.name: column for column in message.columns}
+        for metric, names in [*METRICS.items(), ("distance", ("distance",))]:
+            for name in (name for name in names if name in columns):
+                values = _float_column(message, name)
+                picked = _series([values[index] for index in keep])
+                if _any_valid(picked):
+                    self.series[metric] = (columns[name].units, picked)
+                    break
+
+    def span(
+        self,
+        index: int,
+        start: int | None,
+        end: int | None,
+        zones: dict[str, tuple[float, ...]],
+        options: SummaryOptions,
+    ) -> SpanSummary:
+        lo = 0 if start is None else bisect.bisect_left(self.timestamps, start)
+        hi = len(self.timestamps) if end is None else bisect.bisect_right(self.timestamps, end)
+        hi = max(lo, hi)
+        times = self.timestamps[lo:hi]
+        metrics: dict[str, MetricSummary] = {}
+        time_in_zone: dict[str, list[ZoneTime]] = {}
+        for metric, (units, values) in self.series.items():
+            if metric == "distance":
+                continue
+            described = _describe(values[lo:hi], times, options.percentiles, units)
+            if described is not None:
+                metrics[metric] = described
+            if metric in zones and described is not None:
+                seconds = _zone_seconds(values[lo:hi], self.dwell[lo:hi], zones[metric])
+                bounds = [None, *zones[metric], None]
+                time_in_zone[metric] = [
+                    ZoneTime.model_construct(low=low, high=high, seconds=round(total, 3))
+                    for low, high, total in zip(bounds[:-1], bounds[1:], seconds, strict=True)
+                ]
+
+        distance = self.series.get("distance")
+        altitude = self.series.get("altitude")
+        gain, loss = _climb(altitude[1][lo:hi]) if altitude is not None else (None, None)
+        return SpanSummary.model_construct(
+            index=index,
+            start_time=start if start is not None else (times[0] if times else None),
+            end_time=end if end is not None else (times[-1] if times else None),
+            records=len(times),
+            duration_s=(times[-1] - times[0]) / 1000 if times else None,
+            distance_m=_extent(distance[1][lo:hi]) if distance is not None else None,
+            elevation_gain_m=gain,
+            elevation_loss_m=loss,
+            metrics=metrics,
+            time_in_zone=time_in_zone,
+        )
+
+
+def _zones(
+    zones_target: ColumnarMessage | None, options: SummaryOptions
+) -> dict[str, tuple[float, ...]]:
+    """Zone lower bounds per metric: explicit options first, else from the file's targets."""
+    zones: dict[str, tuple[float, ...]] = {}
+    derived = {
+        "heart_rate": ("max_heart_rate", HEART_RATE_ZONES_OF_MAX, options.heart_rate_zones),
+        "power": ("functional_threshold_power", POWER_ZONES_OF_FTP, options.power_zones),
+    }
+    for metric, (reference_field, fractions, explicit) in derived.items():
+        if explicit is not None:
+            zones[metric] = tuple(sorted(explicit))
+            continue
+        if zones_target is None:
+            continue
+        references = [value for value in _float_column(zones_target, reference_field) if value > 0]
+        if references:
+            zones[metric] = tuple(round(references[-1] * fraction) for fraction in fractions)
+    return zones
+
+
+def _float_column(message: ColumnarMessage, name: str) -> list[float]:
+    """Values of field `name` as floats, with missing, invalid and non-numeric ones as NaN."""
+    column = next((column for column in message.columns if column.name == name), None)
+    if column is None:
+        return [math.nan] * message.count
+    invalid = _invalid_value(message.message, column)
+    return [
+        float(value)
+        if isinstance(value, int | float)
+        and not isinstance(value, bool)
+        and (invalid is None or not math.isclose(value, invalid))
+        else math.nan
+        for value in column.values
+    ]
+
+
+def _invalid_value(message_name: str, column: ColumnarField) -> float | None:
+    """The decoded form of the field's invalid raw value (e.g. 255 bpm), if it has one."""
+    try:
+        info = field_index(resolve(message_name)).get(column.name)
+    except KeyError:
+        return None
+    if info is None or info.base_type.is_float():
+        return None
+    raw = float(info.base_type.invalid_raw_value())
+    return raw / (info.scale or 1) - (info.offset or 0)
+
+
+def _int_or_none(value: float) -> int | None:
+    return None if math.isnan(value) else int(value)
+
+
+def _series(values: list[float]) -> Any:
+    return np.array(values, dtype=np.float64) if np is not None else values
+
+
+def _any_valid(values: Any) -> bool:
+    if np is not None:
+        return bool((~np.isnan(values)).any())
+    return any(not math.isnan(value) for value in values)
+
+
+def _describe(
+    values: Any, times: Sequence[int], percentiles: Sequence[float], units: str | None
+) -> MetricSummary | None:
+    if np is not None:
+        valid = np.flatnonzero(~np.isnan(values))
+        if not len(valid):
+            return None
+        picked = values[valid]
+        peak = int(valid[int(np.argmax(picked))])
+        minimum, maximum, mean = float(picked.min()), float(picked.max()), float(picked.mean())
+        quantiles = [float(q) for q in np.percentile(picked, percentiles)] if percentiles else []
+    else:
+        indexed = [(value, index) for index, value in enumerate(values) if not math.isnan(value)]
+        if not indexed:
+            return None
+        ordered = sorted(value for value, _ in indexed)
+        maximum, peak = max(indexed, key=lambda pair: pair[0])
+        minimum, mean = ordered[0], math.fsum(ordered) / len(ordered)
+        quantiles = [_percentile(ordered, q) for q in percentiles]
+    return MetricSummary.model_construct(
+        units=units,
+        min=round(minimum, 3),
+        max=round(maximum, 3),
+        mean=round(mean, 3),
+        percentiles={
+            f"p{q:g}": round(value, 3) for q, value in zip(percentiles, quantiles, strict=True)
+        },
+        max_time=times[peak],
+    )
+
+
+def _percentile(ordered: Sequence[float], q: float) -> float:
+    """Linear-interpolation percentile of sorted values, matching NumPy's default method."""
+    position = (len(ordered) - 1) * q / 100
+    below = math.floor(position)
+    above = min(below + 1, len(ordered) - 1)
+    return ordered[below] + (ordered[above] - ordered[below]) * (position - below)
+
+
+def _zone_seconds(values: Any, dwell: Any, bounds: tuple[float, ...]) -> list[float]:
+    """Seconds spent below the first bound, between consecutive bounds and above the last."""
+    if np is not None:
+        valid = ~np.isnan(values)
+        zones = np.digitize(values[valid], bounds)
+        totals = np.bincount(zones, weights=dwell[valid], minlength=len(bounds) + 1)
+        return [float(total) for total in totals]
+    totals = [0.0] * (len(bounds) + 1)
+    for value, seconds in zip(values, dwell, strict=True):
+        if not math.isnan(value):
+            totals[bisect.bisect_right(bounds, value)] += seconds
+    return totals
+
+
+def _climb(values: Any) -> tuple[float | None, float | None]:
+    """Total ascent and descent, in the units of `values`, skipping missing samples."""
+    if np is not None:
+        steps = np.diff(values[~np.isnan(values)])
+        if not len(steps):
+            return None, None
+        return round(float(steps[steps > 0].sum()), 3), round(float(-steps[steps < 0].sum()), 3)
+    picked = [value for value in values if not math.isnan(value)]
+    if len(picked) < 2:
+        return None, None
+    steps = [later - earlier for earlier, later in zip(picked, picked[1:], strict=False)]
+    return (
+        round(math.fsum(step for step in steps if step > 0), 3),
+        round(-math.fsum(step for step in steps if step < 0), 3),
+    )
+
+
+def _extent(values: Any) -> float | None:
+    """Distance covered by a cumulative series: its largest minus its smallest value."""
+    if np is not None:
+        picked = values[~np.isnan(values)]
+        return round(float(picked.max() - picked.min()), 3) if len(picked) else None
+    picked = [value for value in values if not math.isnan(value)]
+    return round(max(picked) - min(picked), 3) if picked else None
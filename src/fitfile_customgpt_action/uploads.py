@@ -0,0 +1,201 @@
+"""Zero-copy access to uploaded FIT files and a streaming request body size limit.
+
+python-multipart spools uploads larger than 1 MiB to an anonymous temporary file.
+`UploadBuffer` memory-maps such large uploads and hands the decoder a read-only `memoryview`,
+instead of copying them into one `bytes` object first; smaller uploads are read as usual. Raw
+`application/octet-stream` bodies skip multipart parsing altogether: `StreamedBody` receives
+them into a buffer of their declared size (up to `STREAMED_BODY_MAX_BYTES`) that a decoder
+thread can read while the rest is still arriving. The buffer is an anonymous memory map, whose
+pages the OS only backs with memory once bytes are written to them, so it grows with what
+the client actually sends. `BodySizeLimitMiddleware` counts request body
+bytes as they arrive and answers 413 as soon as the configured limit is crossed, before the rest
+of the body is spooled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import mmap
+import os
+import tempfile
+import threading
+from collections.abc import AsyncIterator
+from typing import IO
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .decoder import FitDecodeError
+
+PAYLOAD_TOO_LARGE = 413
+REQUEST_TIMEOUT = 408
+# Largest Content-Length mapped up front; longer bodies are read whole as their bytes arrive.
+STREAMED_BODY_MAX_BYTES = 256 * 1024 * 1024
+
+
+class UploadBuffer:
+    """Read-only contents of an uploaded file, memory-mapped when it was spooled to disk."""
+
+    def __init__(self, file: IO[bytes]) -> None:
+        self._mmap: mmap.mmap | None = None
+        self.data: bytes | memoryview
+        fileno = _spooled_fileno(file)
+        if fileno is None or os.fstat(fileno).st_size == 0:
+            file.seek(0)
+            self.data = file.read()
+            return
+        self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._mmap)
+
+    @property
+    def mapped(self) -> bool:
+        return self._mmap is not None
+
+    def release(self) -> None:
+        """Unmap the file; safe to call more than once.
+
+        Views still held elsewhere (e.g. by a traceback) keep the mapping alive until they are
+        collected, so a failed close is left to the garbage collector.
+        """
+        if self._mmap is None:
+            return
+        try:
+            if isinstance(self.data, memoryview):
+                self.data.release()
+            self._mmap.close()
+        except BufferError:
+            pass
+        self.data = b""
+        self._mmap = None
+
+
+def _spooled_fileno(file: IO[bytes]) -> int | None:
+    """Return the descriptor to map for `file`, or None when it is small enough to read."""
+    if isinstance(file, tempfile.SpooledTemporaryFile):
+        # Spools up to the multipart parser's threshold may still be in memory and are cheap
+        # to copy; larger ones are rolled over to disk (a no-op once they are) and mapped.
+        if file.seek(0, os.SEEK_END) <= MultiPartParser.spool_max_size:
+            return None
+        file.rollover()
+    try:
+        fileno = file.fileno()
+    except OSError:
+        return None
+    file.flush()  # map what was written, not what is still in the write buffer
+    return fileno
+
+
+class StreamedBody:
+    """A request body received into a buffer of its `Content-Length` while it is decoded.
+
+    The event loop `receive`s chunks into `view`; decoder threads pass `wait_for` to
+    `RecordDecoder` so they block until the bytes they read have arrived. With a `timeout`, an
+    upload that stalls for that many seconds, before its first chunk or between two, is
+    answered with 408.
+    """
+
+    def __init__(self, size: int, timeout: float | None = None) -> None:
+        self.size = size
+        self.timeout = timeout
+        # Untouched pages of an anonymous map cost no memory, unlike a zero-filled bytearray.
+        self.view = memoryview(mmap.mmap(-1, size) if size else bytearray())
+        self.received = 0
+        self._closed = False
+        self._arrived = threading.Condition()
+
+    async def receive(self, chunks: AsyncIterator[bytes], until: int | None = None) -> None:
+        """Copy chunks into the buffer until `until` bytes (default: all of them) arrived."""
+        target = self.size if until is None else min(until, self.size)
+        try:
+            while self.received < target:
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        chunk = await anext(chunks)
+                except TimeoutError:
+                    raise HTTPException(
+                        status_code=REQUEST_TIMEOUT,
+                        detail=f"The upload stalled after {self.received} of its "
+                        f"{self.size} declared bytes.",
+                    ) from None
+                except StopAsyncIteration:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"The request body ended after {self.received} of its "
+                        f"{self.size} declared bytes.",
+                    ) from None
+                end = self.received + len(chunk)
+                if end > self.size:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="The request body is longer than its Content-Length.",
+                    )
+                self.view[self.received : end] = chunk
+                with self._arrived:
+                    self.received = end
+                    self._arrived.notify_all()
+        except BaseException:
+            self.close()
+            raise
+        if self.received == self.size:
+            self.close()
+
+    def close(self) -> None:
+        """Stop waiting for more bytes; readers still missing some are failed."""
+        with self._arrived:
+            self._closed = True
+            self._arrived.notify_all()
+
+    def wait_for(self, end: int) -> None:
+        """Block until the first `end` bytes have arrived."""
+        with self._arrived:
+            while self.received < end:
+                if self._closed:
+                    raise FitDecodeError(
+                        f"The upload ended after {self.received} of {self.size} bytes."
+                    )
+                self._arrived.wait()
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies larger than `max_bytes` with 413 while they are received."""
+
+    def __init__(self, app: ASGIApp, max_bytes: int) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"The request body exceeds the {self.max_bytes} byte upload limit."
+        declared = _content_length(scope)
+        if declared is not None and declared > self.max_bytes:
+            response = JSONResponse({"detail": detail}, status_code=PAYLOAD_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=PAYLOAD_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _content_length(scope: Scope) -> int | None:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
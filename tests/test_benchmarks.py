@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from benchmarks import bench
+from fitfile_customgpt_action import services
+
+
+def test_synthetic_fit_tiles_builder_chunk(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(bench, "CHUNK_RECORDS", 10)
+
+    response = services.parse_fit_bytes(bench.synthetic_fit(25))
+
+    timestamps = [
+        field.value
+        for record in response.records
+        if record.kind == "data" and record.message == "record"
+        for field in record.fields
+        if field.name == "timestamp"
+    ]
+    assert timestamps == [bench.START_MS + index * 1000 for index in range(25)]
+
+
+def test_run_case_reports_latency_and_throughput() -> None:
+    result = bench.run_case("parse", 20, repeat=2)
+
+    assert (result.target, result.records, result.repeat) == ("parse", 20, 2)
+    assert result.payload_bytes > 0
+    assert result.records_per_second > 0
+    assert 0 < result.p50_ms <= result.p99_ms
+    assert result.peak_rss_mb > 0
+
+
+def test_run_case_measures_a_fit_file(tmp_path: Path) -> None:
+    fit_path = tmp_path / "bench.fit"
+    fit_path.write_bytes(bench.synthetic_fit(20))
+
+    result = bench.run_case("render", bench.count_records(fit_path.read_bytes()), 1, fit_path)
+
+    assert (result.records, result.payload_bytes) == (21, fit_path.stat().st_size)
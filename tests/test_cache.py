@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from fitfile_customgpt_action.cache import ParseCache
+from fitfile_customgpt_action.config import Settings
+
+
+def test_key_depends_on_payload_and_options() -> None:
+    key = ParseCache.key(b"fit", "format=records")
+    assert key == ParseCache.key(b"fit", "format=records")
+    assert key != ParseCache.key(b"fit", "format=columnar")
+    assert key != ParseCache.key(b"fit!", "format=records")
+    digest = ParseCache.hasher()
+    for piece in (b"f", b"it"):
+        digest.update(piece)
+    assert ParseCache.finish_key(digest, "format=records") == key
+    assert ParseCache.finish_key(digest, "format=records") == key
+
+
+def test_lru_eviction_respects_byte_bound() -> None:
+    cache = ParseCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"5678")
+    assert cache.get("a") == b"1234"  # "a" is now the most recently used entry
+
+    cache.put("c", b"90ab")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"90ab"
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (3, 1, 1)
+    assert (stats.entries, stats.size_bytes) == (2, 8)
+
+
+def test_oversized_entries_are_not_kept_in_memory() -> None:
+    cache = ParseCache(max_bytes=4)
+    cache.put("big", b"too large")
+    assert cache.get("big") is None
+    assert cache.stats().size_bytes == 0
+
+
+def test_disk_tier_survives_memory_loss(tmp_path: Path) -> None:
+    cache = ParseCache(max_bytes=1024, directory=tmp_path)
+    cache.put("abcd", b"body")
+    cache.clear()
+
+    assert cache.get("abcd") == b"body"
+    assert cache.stats().disk_hits == 1
+    assert ParseCache(max_bytes=0, directory=tmp_path).get("abcd") == b"body"
+
+
+def test_disk_tier_prunes_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = ParseCache(max_bytes=0, directory=tmp_path, disk_max_bytes=12)
+    for key, mtime in (("aa01", 1), ("bb02", 2), ("cc03", 3)):
+        cache.put(key, b"1234")
+        os.utime(tmp_path / key[:2] / f"{key}.json", (mtime, mtime))
+    # Reading an entry marks it as recently used.
+    assert cache.get("aa01") == b"1234"
+
+    cache.put("dd04", b"5678")
+
+    assert cache.get("bb02") is None
+    assert cache.get("cc03") is None
+    assert cache.get("aa01") == b"1234"
+    assert cache.get("dd04") == b"5678"
+    assert sum(path.stat().st_size for path in tmp_path.glob("*/*.json")) <= 12
+
+
+def test_disk_tier_counts_entries_written_by_other_workers(tmp_path: Path) -> None:
+    first = ParseCache(max_bytes=0, directory=tmp_path, disk_max_bytes=10)
+    second = ParseCache(max_bytes=0, directory=tmp_path, disk_max_bytes=10)
+    first.put("aa01", b"1234")
+    os.utime(tmp_path / "aa" / "aa01.json", (1, 1))
+    second.put("bb02", b"1234")
+    second.put("cc03", b"1234")
+
+    assert first.get("aa01") is None
+    assert ParseCache(max_bytes=0, directory=tmp_path, disk_max_bytes=0).directory is None
+
+
+def test_settings_from_env(tmp_path: Path) -> None:
+    settings = Settings.from_env(
+        {"FITFILE_CACHE_MAX_BYTES": "2048", "FITFILE_CACHE_DIR": str(tmp_path)}
+    )
+    assert settings == Settings(cache_max_bytes=2048, cache_dir=tmp_path)
+    assert Settings.from_env({}) == Settings()
+
+    with pytest.raises(ValueError, match="FITFILE_CACHE_MAX_BYTES"):
+        Settings.from_env({"FITFILE_CACHE_MAX_BYTES": "lots"})
+    assert Settings.from_env({"FITFILE_WARM_REGISTRY": "yes"}).warm_registry is True
+    assert Settings.from_env({"FITFILE_MAX_UPLOAD_BYTES": "0"}).max_upload_bytes == 0
+    assert Settings.from_env({"FITFILE_CACHE_DIR_MAX_BYTES": "99"}).cache_dir_max_bytes == 99
+    assert Settings.from_env({"FITFILE_METRICS": "off"}).metrics is False
+    with pytest.raises(ValueError, match="FITFILE_WARM_REGISTRY"):
+        Settings.from_env({"FITFILE_WARM_REGISTRY": "sometimes"})
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+import uvicorn
+from pytest import MonkeyPatch
+
+from fitfile_customgpt_action import cli, metrics
+from fitfile_customgpt_action.app import create_app
+from fitfile_customgpt_action.config import Settings
+
+from .pytest_types import fixture, parametrize
+
+
+def _fitfile_env() -> dict[str, str]:
+    return {name: value for name, value in os.environ.items() if name.startswith("FITFILE_")}
+
+
+@fixture
+def runs(monkeypatch: MonkeyPatch) -> list[dict[str, Any]]:
+    calls: list[dict[str, Any]] = []
+    real_run = uvicorn.run
+
+    @functools.wraps(real_run)
+    def run(app: str, **options: Any) -> None:
+        # Options the installed uvicorn does not take fail here as they would for real.
+        inspect.signature(real_run).bind(app, **options)
+        calls.append(options)
+
+    def process_cpu_count() -> int:
+        return 8
+
+    monkeypatch.setattr(uvicorn, "run", run)
+    monkeypatch.setattr(os, "process_cpu_count", process_cpu_count)
+    monkeypatch.setattr(os, "environ", {})
+    return calls
+
+
+def test_default_server_is_a_single_worker(runs: list[dict[str, Any]]) -> None:
+    cli.main(["--port", "9000"])
+
+    (options,) = runs
+    assert options["port"] == 9000
+    assert options["workers"] == 1
+    assert options["limit_max_requests"] is None
+    assert options["factory"] is True
+    assert _fitfile_env() == {}
+
+
+@parametrize("argv", [[], ["--production"], ["--workers", "2", "--limit-max-requests", "9"]])
+def test_server_options_bind_to_uvicorn_run(argv: list[str]) -> None:
+    options = cli.server_options(cli._parser().parse_args(argv))
+
+    inspect.signature(uvicorn.run).bind(cli.APP_FACTORY, factory=True, **options)
+
+
+def test_jitter_is_left_out_for_uvicorn_without_it(monkeypatch: MonkeyPatch) -> None:
+    signature = inspect.signature(uvicorn.run)
+    older = signature.replace(
+        parameters=[
+            parameter
+            for parameter in signature.parameters.values()
+            if parameter.name != "limit_max_requests_jitter"
+        ]
+    )
+
+    def run(app: str, **options: Any) -> None:
+        older.bind(app, **options)
+
+    monkeypatch.setattr(run, "__signature__", older, raising=False)
+    monkeypatch.setattr(uvicorn, "run", run)
+
+    options = cli.server_options(cli._parser().parse_args(["--production"]))
+
+    assert "limit_max_requests_jitter" not in options
+    older.bind(cli.APP_FACTORY, factory=True, **options)
+
+
+def test_production_uses_every_cpu_and_recycles_workers(runs: list[dict[str, Any]]) -> None:
+    cli.main(["--production"])
+
+    (options,) = runs
+    assert options["workers"] == 8
+    assert (options["loop"], options["http"]) == ("auto", "auto")
+    assert options["limit_concurrency"] == cli.PRODUCTION_LIMIT_CONCURRENCY
+    assert options["limit_max_requests"] == cli.PRODUCTION_MAX_REQUESTS
+    assert options["limit_max_requests_jitter"] == cli.PRODUCTION_MAX_REQUESTS // 10
+    env = _fitfile_env()
+    assert Path(env.pop("FITFILE_METRICS_DIR")).is_dir()
+    assert env == {
+        "FITFILE_WARM_REGISTRY": "true",
+        "FITFILE_EXECUTOR_WORKERS": "1",
+    }
+
+
+def test_explicit_options_override_production_defaults(runs: list[dict[str, Any]]) -> None:
+    os.environ["FITFILE_EXECUTOR_WORKERS"] = "3"
+
+    cli.main(["--production", "--workers", "2", "--limit-max-requests", "500", "--loop", "uvloop"])
+
+    (options,) = runs
+    assert (options["workers"], options["loop"]) == (2, "uvloop")
+    assert options["limit_max_requests"] == 500
+    assert os.environ["FITFILE_EXECUTOR_WORKERS"] == "3"
+
+
+def test_production_clears_an_explicit_metrics_dir(
+    runs: list[dict[str, Any]], tmp_path: Path
+) -> None:
+    stale = tmp_path / f"{metrics.SNAPSHOT_PREFIX}1.json"
+    stale.write_text("{}")
+    os.environ["FITFILE_METRICS_DIR"] = str(tmp_path)
+
+    cli.main(["--production"])
+
+    assert not stale.exists()
+    assert os.environ["FITFILE_METRICS_DIR"] == str(tmp_path)
+
+
+def test_production_workers_decode_raw_bodies_as_they_arrive(
+    runs: list[dict[str, Any]], tmp_path: Path
+) -> None:
+    os.environ["FITFILE_METRICS_DIR"] = str(tmp_path)
+    cli.main(["--production"])
+    (options,) = runs
+
+    settings = Settings.from_env({**os.environ, "FITFILE_METRICS_DIR": ""})
+    app = create_app(settings)
+
+    assert options["workers"] == 8 and settings.executor_workers == 1
+    assert not app.state.stream_slots.locked()
+
+
+def test_reload_rejects_several_workers(runs: list[dict[str, Any]]) -> None:
+    with pytest.raises(SystemExit):
+        cli.main(["--reload", "--workers", "2"])
+    assert runs == []
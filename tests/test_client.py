@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import io
 import json
+import shutil
 from pathlib import Path
 from typing import Any, BinaryIO
 from unittest.mock import MagicMock
 
+import httpx
 import pytest
 from pytest import MonkeyPatch
 
 from fitfile_customgpt_action import client
+from fitfile_customgpt_action.app import create_app
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
 
 
 def test_parse_fit_posts_file(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
@@ -22,17 +29,14 @@ def test_parse_fit_posts_file(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
 
     def fake_post(
         url: str,
-        files: dict[str, tuple[str, BinaryIO, str]],
+        content: BinaryIO,
+        headers: dict[str, str],
         timeout: float,
     ) -> MagicMock:
         assert url == "http://example.com/fit/parse"
         assert timeout == 30.0
-        assert "file" in files
-        filename, handle, mimetype = files["file"]
-        assert filename == fit_path.name
-        assert mimetype == "application/octet-stream"
-        assert handle.read() == b"payload"
-        handle.seek(0)
+        assert headers == {"Content-Type": "application/octet-stream", "Content-Length": "7"}
+        assert content.read() == b"payload"
         return mock_response
 
     monkeypatch.setattr("fitfile_customgpt_action.client.httpx.post", fake_post)
@@ -79,3 +83,106 @@ def test_produce_fit_posts_payload(tmp_path: Path, monkeypatch: MonkeyPatch) ->
 )
 def test_normalize_handles_duplicate_fit_segments(raw: str, expected: str) -> None:
     assert client._normalize(raw) == expected
+
+
+def test_parse_fit_batch_posts_all_files(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    paths = [tmp_path / "a.fit", tmp_path / "b.zip"]
+    for path in paths:
+        path.write_bytes(path.name.encode())
+
+    mock_response = MagicMock()
+    mock_response.raise_for_status.return_value = None
+    mock_response.text = (
+        '{"kind":"error","index":1,"filename":"b.fit","status_code":400,"detail":"bad"}\n'
+        '{"kind":"result","index":0,"filename":"a.fit","result":{}}\n'
+    )
+
+    def fake_post(
+        url: str,
+        files: list[tuple[str, tuple[str, BinaryIO, str]]],
+        timeout: float,
+    ) -> MagicMock:
+        assert url == "http://example.com/fit/parse/batch"
+        assert [(name, upload[0], upload[2]) for name, upload in files] == [
+            ("files", "a.fit", "application/octet-stream"),
+            ("files", "b.zip", "application/zip"),
+        ]
+        assert files[1][1][1].read() == b"b.zip"
+        return mock_response
+
+    monkeypatch.setattr("fitfile_customgpt_action.client.httpx.post", fake_post)
+
+    results = client.parse_fit_batch("http://example.com", paths)
+    assert [(result["kind"], result["index"]) for result in results] == [
+        ("result", 0),
+        ("error", 1),
+    ]
+
+
+def test_async_client_retries_unavailable_responses(tmp_path: Path) -> None:
+    fit_path = tmp_path / "a.fit"
+    fit_path.write_bytes(b"payload")
+    statuses = [503, 429, 200]
+    seen: list[bytes] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.content)
+        status = statuses[len(seen) - 1]
+        return httpx.Response(status, json={"status": status})
+
+    async def run() -> dict[str, Any]:
+        async with client.AsyncFitClient(
+            "http://example.com", backoff=0.0, transport=httpx.MockTransport(handler)
+        ) as fit_client:
+            return await fit_client.parse(fit_path)
+
+    assert asyncio.run(run()) == {"status": 200}
+    assert seen == [b"payload"] * 3
+
+
+def test_async_client_gives_up_after_retries(tmp_path: Path) -> None:
+    fit_path = tmp_path / "a.fit"
+    fit_path.write_bytes(b"payload")
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503, json={"detail": "busy"})
+
+    async def run() -> None:
+        async with client.AsyncFitClient(
+            "http://example.com", retries=2, backoff=0.0, transport=httpx.MockTransport(handler)
+        ) as fit_client:
+            await fit_client.parse(fit_path)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert calls == 3
+
+
+def test_parse_dir_writes_ndjson_per_file(tmp_path: Path) -> None:
+    rides = tmp_path / "rides"
+    (rides / "2024").mkdir(parents=True)
+    shutil.copy(SAMPLE_FIT, rides / "2024" / "morning.FIT")
+    (rides / "broken.fit").write_bytes(b"not a fit file")
+    (rides / "notes.txt").write_text("ignored")
+    output = io.StringIO()
+
+    parsed, failed = asyncio.run(
+        client.parse_dir(
+            "http://testserver",
+            rides,
+            output,
+            concurrency=2,
+            transport=httpx.ASGITransport(app=create_app()),
+        )
+    )
+
+    assert (parsed, failed) == (1, 1)
+    lines = {line["filename"]: line for line in map(json.loads, output.getvalue().splitlines())}
+    assert set(lines) == {"2024/morning.FIT", "broken.fit"}
+    assert lines["2024/morning.FIT"]["kind"] == "result"
+    assert lines["2024/morning.FIT"]["result"]["records"]
+    assert lines["broken.fit"]["kind"] == "error"
+    assert lines["broken.fit"]["status_code"] == 400
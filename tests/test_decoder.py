@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import struct
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fit_tool.fit_file import FitFile
+from fit_tool.fit_file_stream import iter_fit_stream
+
+from fitfile_customgpt_action import services
+from fitfile_customgpt_action.decoder import (
+    DecoderState,
+    FitDecodeError,
+    LocalDefinition,
+    RawData,
+    RecordDecoder,
+    crc16,
+    split_segments,
+)
+
+from .pytest_types import parametrize
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+
+
+def _fit_file(records: bytes) -> bytes:
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(records), b".FIT")
+    header += struct.pack("<H", crc16(header))
+    body = header + records
+    return body + struct.pack("<H", crc16(body))
+
+
+def _definition(
+    local_id: int,
+    global_id: int,
+    fields: list[tuple[int, int, int]],
+    *,
+    big_endian: bool = False,
+) -> bytes:
+    prefix = struct.pack(">BBHB" if big_endian else "<BBHB", 0, int(big_endian), global_id, 0)
+    prefix = prefix[:4] + bytes([len(fields)])
+    return bytes([0x40 | local_id]) + prefix + b"".join(bytes(field) for field in fields)
+
+
+def _activity_records() -> bytes:
+    return b"".join(
+        [
+            # record: timestamp, heart_rate, speed (expands into enhanced_speed)
+            _definition(0, 20, [(253, 4, 0x86), (3, 1, 0x02), (6, 2, 0x84)]),
+            bytes([0x00]) + struct.pack("<IBH", 1_000_000_000, 120, 5000),
+            # record without timestamp, used with compressed timestamp headers
+            _definition(1, 20, [(3, 1, 0x02), (0, 4, 0x85)]),
+            bytes([0x80 | (1 << 5) | 5]) + struct.pack("<Bi", 121, 0x7FFFFFFF),
+            bytes([0x80 | (1 << 5) | 2]) + struct.pack("<Bi", 122, 477_000_000),
+            # heart_rate declared as uint16 on the wire: projected through fit_tool
+            _definition(2, 20, [(253, 4, 0x86), (3, 2, 0x84)]),
+            bytes([0x02]) + struct.pack("<IH", 1_000_000_100, 130),
+            # big-endian event with a float-free payload and an unknown field
+            _definition(3, 21, [(253, 4, 0x86), (0, 1, 0x00), (200, 2, 0x84)], big_endian=True),
+            bytes([0x03]) + struct.pack(">IBH", 1_000_000_200, 0, 7),
+            # unknown global message
+            _definition(4, 0xFF00, [(1, 4, 0x88), (2, 8, 0x07)]),
+            bytes([0x04]) + struct.pack("<I8s", 0xFFFFFFFF, b"ab\x00cd\x00\x00\x00"),
+        ]
+    )
+
+
+def _reference(payload: bytes) -> list[dict[str, Any]]:
+    fit_file = FitFile.from_bytes(payload)
+    return [services._serialize_record(record).model_dump() for record in fit_file.records]
+
+
+def test_sample_header() -> None:
+    decoder = RecordDecoder(SAMPLE_FIT.read_bytes())
+    assert decoder.header.protocol_version_str == "1.0"
+    assert decoder.header.profile_version_str == "21.179"
+    assert decoder.header.records_size == 208628
+
+
+def test_sample_matches_fit_tool_projection() -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    expected = [
+        services._serialize_record(record).model_dump()
+        for record in islice(iter_fit_stream(SAMPLE_FIT.open("rb")), 800)
+    ]
+    actual = list(islice(services.stream_fit_records(payload)[1], 800))
+    assert actual == expected
+
+
+def test_crafted_file_matches_fit_tool_projection() -> None:
+    payload = _fit_file(_activity_records())
+    response = services.parse_fit_bytes(payload)
+
+    assert [record.model_dump() for record in response.records] == _reference(payload)
+    assert response.metadata.crc == FitFile.from_bytes(payload).crc
+
+
+def test_compressed_timestamps_are_reconstructed() -> None:
+    response = services.parse_fit_bytes(_fit_file(_activity_records()))
+    timestamps = [
+        field.value
+        for record in response.records
+        if record.kind == "data" and record.message == "record"
+        for field in record.fields
+        if field.name == "timestamp"
+    ]
+    # 1_000_000_000 has offset 0 in its low five bits; +5s, then a rollover at +2.
+    base_ms = (1_000_000_000 + 631_065_600) * 1000
+    assert timestamps[:3] == [base_ms, base_ms + 5000, base_ms + 34000]
+
+
+def test_chained_segments_are_decoded() -> None:
+    first = _fit_file(_activity_records())
+    second = _fit_file(
+        _definition(0, 0, [(0, 1, 0x00)]) + bytes([0x00, 4]),
+    )
+    decoder = RecordDecoder(first + second)
+    items = list(decoder)
+
+    assert len(decoder.crcs) == 2
+    assert isinstance(items[-2], LocalDefinition)
+    assert isinstance(items[-1], RawData)
+    assert items[-1].values == (4,)
+    assert [record.model_dump() for record in services.parse_fit_bytes(first + second).records] == (
+        _reference(first + second)
+    )
+
+
+def test_split_segments_walks_chained_headers() -> None:
+    first = _fit_file(_activity_records())
+    second = _fit_file(_definition(0, 0, [(0, 1, 0x00)]) + bytes([0x00, 4]))
+
+    segments = split_segments(first + second + b"junk")
+
+    assert [offset for offset, _ in segments] == [0, len(first)]
+    assert bytes(segments[0][1]) == first
+    # Trailing bytes stay with the last segment, whose decoder then reports them.
+    assert bytes(segments[1][1]) == second + b"junk"
+    assert split_segments(first[:-5])[0][1].nbytes == len(first) - 5
+
+
+def test_crc_mismatch_is_rejected() -> None:
+    payload = bytearray(_fit_file(_activity_records()))
+    payload[-1] ^= 0xFF
+    with pytest.raises(FitDecodeError, match="crc"):
+        list(RecordDecoder(payload))
+
+
+def test_truncated_file_is_rejected() -> None:
+    with pytest.raises(FitDecodeError, match="truncated"):
+        list(RecordDecoder(_fit_file(_activity_records())[:-10]))
+
+
+@parametrize("cut", [20, 1000, 104_322, -1, -3])
+def test_tolerant_decode_of_truncated_file_resumes_where_it_stopped(cut: int) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    expected = [_raw(item) for item in RecordDecoder(payload) if isinstance(item, RawData)]
+
+    first = RecordDecoder(payload[:cut], tolerant=True)
+    items = list(first)
+    assert first.diagnostics is not None and not first.diagnostics.complete
+    assert first.diagnostics.crc == "missing"
+    assert first.diagnostics.resume is not None
+    state = DecoderState.from_token(first.diagnostics.resume.token())
+    assert state.offset == first.diagnostics.offset <= len(payload[:cut])
+
+    rest = RecordDecoder(payload[state.offset :], tolerant=True, resume=state)
+    items += [item for item in rest if isinstance(item, RawData)]
+    assert rest.diagnostics is not None and rest.diagnostics.complete
+    assert rest.diagnostics.crc == "valid"
+    assert rest.crcs == list(_crcs(payload))
+    assert [_raw(item) for item in items if isinstance(item, RawData)] == expected
+
+
+def _raw(item: RawData) -> str:
+    # repr() so NaN float payloads compare equal.
+    return repr((item.definition.global_id, item.values, item.timestamp))
+
+
+def _crcs(payload: bytes) -> list[int]:
+    decoder = RecordDecoder(payload)
+    list(decoder)
+    return decoder.crcs
+
+
+def test_tolerant_decode_stops_at_corrupt_records() -> None:
+    records = _definition(0, 0, [(0, 1, 0x00)]) + b"\x00\x04" + bytes([0x05, 1, 2, 3])
+    decoder = RecordDecoder(_fit_file(records), tolerant=True)
+    items = list(decoder)
+
+    assert [type(item) for item in items] == [LocalDefinition, RawData]
+    diagnostics = decoder.diagnostics
+    assert diagnostics is not None
+    assert diagnostics.offset == 14 + len(records) - 4
+    assert diagnostics.error is not None and "undefined local message" in diagnostics.error
+    assert diagnostics.resume is None
+
+
+def test_tolerant_decode_reports_crc_mismatch() -> None:
+    payload = bytearray(_fit_file(_activity_records()))
+    payload[-1] ^= 0xFF
+    decoder = RecordDecoder(payload, tolerant=True)
+
+    assert len(list(decoder)) == len(list(RecordDecoder(_fit_file(_activity_records()))))
+    assert decoder.diagnostics is not None
+    assert (decoder.diagnostics.complete, decoder.diagnostics.crc) == (True, "invalid")
+
+
+@parametrize("token", ["", "not-a-token", DecoderState.__name__])
+def test_invalid_resume_tokens_are_rejected(token: str) -> None:
+    with pytest.raises(FitDecodeError, match="Invalid resume token"):
+        DecoderState.from_token(token)
+
+
+def test_undefined_local_message_is_rejected() -> None:
+    with pytest.raises(FitDecodeError, match="undefined local message"):
+        list(RecordDecoder(_fit_file(bytes([0x05, 1, 2, 3]))))
+
+
+def test_unselected_messages_are_skipped() -> None:
+    decoder = RecordDecoder(_fit_file(_activity_records()), global_ids={21})
+    items = list(decoder)
+    assert {item.definition.global_id for item in items if isinstance(item, RawData)} == {21}
+    assert [item.global_id for item in items if isinstance(item, LocalDefinition)] == [21]
+
+
+def test_wait_is_called_before_reading_unreceived_bytes() -> None:
+    payload = SAMPLE_FIT.read_bytes() + _fit_file(_definition(0, 0, [(0, 1, 0x00)]) + b"\x00\x04")
+    requested: list[int] = []
+    items = list(RecordDecoder(payload, wait=requested.append))
+
+    assert len(items) == len(list(RecordDecoder(payload)))
+    assert requested == sorted(requested)
+    assert requested[-1] == len(payload)
+    assert len(requested) > 3
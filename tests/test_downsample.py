@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from typing import cast
+
+import pytest
+from fastapi import HTTPException
+
+from fitfile_customgpt_action import services
+from fitfile_customgpt_action.downsample import Downsampling, downsample_records
+from fitfile_customgpt_action.encoder import iter_fit_bytes
+from fitfile_customgpt_action.models import (
+    BuildFitColumnarRequest,
+    DataRecord,
+    DataRecordDict,
+    DefinitionRecord,
+    RecordDict,
+)
+
+from .pytest_types import parametrize
+
+START_MS = 1_700_000_000_000
+
+
+def _row(second: int, **values: float) -> RecordDict:
+    stamp = START_MS + second * 1000
+    fields = [{"field_id": 253, "name": "timestamp", "units": "ms", "value": stamp}]
+    fields.extend(
+        {"field_id": index, "name": name, "units": None, "value": value}
+        for index, (name, value) in enumerate(values.items())
+    )
+    return cast(
+        RecordDict,
+        {"kind": "data", "local_id": 0, "global_id": 20, "message": "record", "fields": fields},
+    )
+
+
+def _event() -> RecordDict:
+    return {"kind": "data", "local_id": 1, "global_id": 21, "message": "event", "fields": []}
+
+
+def _value(record: RecordDict, name: str) -> object:
+    return next(
+        field["value"] for field in cast(DataRecordDict, record)["fields"] if field["name"] == name
+    )
+
+
+def test_decimate_keeps_every_nth_record_and_other_messages() -> None:
+    records = [_event(), *(_row(second, power=second) for second in range(10)), _event()]
+
+    result = downsample_records(records, Downsampling(method="decimate", points=4))
+
+    assert result[0]["message"] == result[-1]["message"] == "event"
+    powers = [_value(row, "power") for row in result[1:-1]]
+    assert powers == [0, 3, 6, 9]
+
+
+def test_bucket_averages_numeric_fields_per_time_bucket() -> None:
+    records = [_row(second, power=second * 10, heart_rate=100 + second) for second in range(8)]
+
+    result = downsample_records(records, Downsampling(method="bucket", points=2))
+
+    assert len(result) == 2
+    first, second = result
+    assert _value(first, "timestamp") == START_MS
+    assert (_value(first, "power"), _value(first, "heart_rate")) == (15.0, 101.5)
+    assert _value(second, "timestamp") == START_MS + 4000
+    assert _value(second, "power") == 55.0
+
+
+def test_lttb_keeps_endpoints_and_peaks() -> None:
+    powers = [100.0] * 50
+    powers[17] = 900.0
+    powers[44] = 5.0
+    records = [_row(second, power=power) for second, power in enumerate(powers)]
+
+    result = downsample_records(records, Downsampling(method="lttb", points=6, field="power"))
+
+    assert len(result) == 6
+    seconds = [(int(str(_value(row, "timestamp"))) - START_MS) // 1000 for row in result]
+    assert seconds[0] == 0 and seconds[-1] == 49
+    assert {17, 44} <= set(seconds)
+
+
+def test_short_streams_are_returned_unchanged() -> None:
+    records = [_row(second, power=second) for second in range(5)]
+    assert downsample_records(records, Downsampling(method="lttb", points=10)) == records
+
+
+def test_parse_fit_bytes_downsamples_records() -> None:
+    stamps = [START_MS + index * 1000 for index in range(100)]
+    request = BuildFitColumnarRequest.model_validate(
+        {
+            "record": {"timestamp": stamps, "heart_rate": [100 + i % 50 for i in range(100)]},
+            "session": {"timestamp": [stamps[-1]], "start_time": [stamps[0]]},
+        }
+    )
+    payload = b"".join(iter_fit_bytes(services.encode_fit_columns(request)))
+
+    full = services.parse_fit_bytes(payload)
+    reduced = services.parse_fit_bytes(payload, downsampling=Downsampling("decimate", 10))
+    columnar = services.parse_fit_columnar(payload, downsampling=Downsampling("bucket", 10))
+
+    def messages(records: list[DefinitionRecord | DataRecord]) -> list[str]:
+        return [record.message for record in records if record.kind == "data"]
+
+    assert messages(full.records).count("record") == 100
+    assert messages(reduced.records).count("record") == 10
+    assert messages(reduced.records).count("session") == 1
+    counts = {message.message: message.count for message in columnar.messages}
+    assert counts["record"] == 10
+
+
+@parametrize(
+    ("method", "field", "detail"),
+    [
+        ("lttb", "no_such_field", "not valid for message"),
+        ("bucket", "heart_rate", "requires `downsample=lttb`"),
+        (None, "heart_rate", "requires `downsample=lttb`"),
+    ],
+)
+def test_build_downsampling_rejects_bad_fields(method: str | None, field: str, detail: str) -> None:
+    with pytest.raises(HTTPException) as excinfo:
+        services.build_downsampling(method, 100, field)  # type: ignore[arg-type]
+    assert excinfo.value.status_code == 400
+    assert detail in str(excinfo.value.detail)
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from fit_tool.exceptions import FitEncodingError
+from fit_tool.fit_file_builder import FitFileBuilder
+
+from fitfile_customgpt_action import message_registry, services
+from fitfile_customgpt_action.encoder import RecordWriter, iter_fit_bytes
+from fitfile_customgpt_action.models import BuildFitColumnarRequest, BuildFitRequest, JSONValue
+
+from .pytest_types import parametrize
+
+
+def _request(records: int) -> BuildFitRequest:
+    messages: list[dict[str, object]] = [
+        {"name": "file_id", "fields": [{"name": "type", "value": 4}]},
+    ]
+    for index in range(records):
+        fields = [
+            {"name": "timestamp", "value": 1_700_000_000_000 + index * 1000},
+            {"name": "heart_rate", "value": 120 + index % 30},
+        ]
+        if index % 3 == 0:
+            # A wider layout on the same local type forces a new definition message.
+            fields.append({"name": "power", "value": 200 + index})
+        messages.append({"name": "record", "fields": fields})
+    return BuildFitRequest.model_validate({"messages": messages})
+
+
+def _reference(request: BuildFitRequest) -> bytes:
+    builder = FitFileBuilder()
+    for payload in request.messages:
+        builder.add(services._message_from_payload(payload))
+    return bytes(builder.build().to_bytes())
+
+
+def _data(payload: bytes) -> list[tuple[str, dict[str, object]]]:
+    return [
+        (record.message, {field.name: field.value for field in record.fields})
+        for record in services.parse_fit_bytes(payload).records
+        if record.kind == "data"
+    ]
+
+
+def _definitions(payload: bytes) -> list[tuple[int, str]]:
+    return [
+        (record.local_id, record.message)
+        for record in services.parse_fit_bytes(payload).records
+        if record.kind == "definition"
+    ]
+
+
+@parametrize("spill_threshold", [1024 * 1024, 64])
+def test_encoder_round_trips_builder_messages(spill_threshold: int) -> None:
+    request = _request(50)
+    writer = RecordWriter(spill_threshold=spill_threshold)
+    for payload in request.messages:
+        writer.add(services._message_from_payload(payload))
+    records = writer.finish()
+
+    assert (records.path is not None) == (spill_threshold == 64)
+    encoded = b"".join(iter_fit_bytes(records, chunk_size=100))
+    assert records.file_size == len(encoded)
+    assert records.path is None or not os.path.exists(records.path)
+    assert _data(encoded) == _data(_reference(request))
+    # file_id plus the two record layouts, each defined once on its own local type.
+    assert _definitions(encoded) == [(0, "file_id"), (1, "record"), (2, "record")]
+
+
+def test_interleaved_messages_reuse_pooled_definitions() -> None:
+    messages: list[dict[str, object]] = []
+    for index in range(20):
+        messages.append({"name": "record", "fields": [{"name": "heart_rate", "value": 120}]})
+        messages.append({"name": "event", "fields": [{"name": "event", "value": 0}]})
+        if index % 5 == 0:
+            messages.append({"name": "lap", "fields": [{"name": "total_cycles", "value": index}]})
+    request = BuildFitRequest.model_validate({"messages": messages})
+
+    encoded = services.build_fit_bytes(request)
+    reference = _reference(request)
+
+    assert _data(encoded) == _data(reference)
+    assert _definitions(encoded) == [(0, "record"), (1, "event"), (2, "lap")]
+    assert len(encoded) < len(reference)
+
+
+def test_least_recently_used_local_type_is_evicted() -> None:
+    names = [field.name for field in message_registry.resolve("record")().fields][1:18]
+    request = BuildFitRequest.model_validate(
+        {
+            "messages": [
+                {"name": "record", "fields": [{"name": names[index % 17], "value": 1}]}
+                for index in range(18)
+            ]
+        }
+    )
+
+    encoded = services.build_fit_bytes(request)
+
+    assert _data(encoded) == _data(_reference(request))
+    local_ids = [local_id for local_id, _ in _definitions(encoded)]
+    # The 17th layout takes slot 0; the first layout then needs a slot again and takes slot 1.
+    assert local_ids == [*range(16), 0, 1]
+
+
+def test_payload_local_id_pins_the_local_type() -> None:
+    request = BuildFitRequest.model_validate(
+        {
+            "messages": [
+                {"name": "record", "local_id": 5, "fields": [{"name": "cadence", "value": 1}]}
+            ]
+        }
+    )
+
+    records = services.parse_fit_bytes(services.build_fit_bytes(request)).records
+
+    assert [(record.kind, record.local_id) for record in records] == [
+        ("definition", 5),
+        ("data", 5),
+    ]
+
+
+def test_abort_removes_spill_file() -> None:
+    writer = RecordWriter(spill_threshold=16)
+    for payload in _request(5).messages:
+        writer.add(services._message_from_payload(payload))
+    spill = writer._file
+    assert spill is not None
+
+    writer.abort()
+
+    assert not os.path.exists(spill.name)
+
+
+def test_add_columns_matches_row_payloads() -> None:
+    heart_rate: list[JSONValue | None] = [120 + index for index in range(12)]
+    power: list[JSONValue | None] = [
+        None if index in (4, 5) else 200 + index for index in range(12)
+    ]
+    columns: dict[str, dict[str, list[JSONValue | None]]] = {
+        "file_id": {"type": [4], "product_name": ["bench"]},
+        "record": {
+            "timestamp": [1_700_000_000_000 + index * 1000 for index in range(12)],
+            "heart_rate": heart_rate,
+            "power": power,
+        },
+    }
+    request = BuildFitRequest.model_validate(
+        {
+            "messages": [
+                {
+                    "name": name,
+                    "fields": [
+                        {"name": field, "value": values[row]}
+                        for field, values in group.items()
+                        if values[row] is not None
+                    ],
+                }
+                for name, group in columns.items()
+                for row in range(len(next(iter(group.values()))))
+            ]
+        }
+    )
+
+    records = services.encode_fit_columns(BuildFitColumnarRequest.model_validate(columns))
+
+    assert b"".join(iter_fit_bytes(records)) == services.build_fit_bytes(request)
+
+
+@parametrize("rows", [1, 3])
+def test_add_columns_rejects_out_of_range_values(rows: int) -> None:
+    writer = RecordWriter()
+    message_cls = message_registry.resolve("record")
+    heart_rate_position = [field.name for field in message_cls().fields].index("heart_rate")
+    values: list[JSONValue | None] = [120 if row < rows - 1 else 1000 for row in range(rows)]
+
+    with pytest.raises(FitEncodingError, match="heart_rate"):
+        writer.add_columns(message_cls, [(heart_rate_position, values)], rows)
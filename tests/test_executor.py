@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from fitfile_customgpt_action.executor import ExecutorKind, ExecutorSaturatedError, WorkExecutor
+
+from .pytest_types import parametrize
+
+
+def _reject(detail: str) -> None:
+    raise HTTPException(status_code=400, detail=detail, headers={"X-Reason": detail})
+
+
+def test_saturated_executor_refuses_new_jobs() -> None:
+    executor = WorkExecutor("thread", workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario() -> None:
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert executor.pending == 2
+
+        with pytest.raises(ExecutorSaturatedError):
+            await executor.run(release.wait)
+
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert executor.pending == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+
+@parametrize("kind", ["thread", "process"])
+def test_http_errors_propagate_from_workers(kind: ExecutorKind) -> None:
+    executor = WorkExecutor(kind, workers=1, max_queue=0)
+
+    async def scenario() -> None:
+        with pytest.raises(HTTPException) as exc:
+            await executor.run(_reject, "bad upload")
+        assert (exc.value.status_code, exc.value.detail) == (400, "bad upload")
+        assert exc.value.headers == {"X-Reason": "bad upload"}
+        assert await executor.run(sum, [1, 2, 3]) == 6
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+
+@parametrize("kind", ["thread", "process"])
+def test_streams_count_as_one_job_until_exhausted(kind: ExecutorKind) -> None:
+    executor = WorkExecutor(kind, workers=1, max_queue=0)
+
+    async def scenario() -> None:
+        stream = executor.stream(iter(range(3)))
+        assert await anext(stream) == 0
+        assert executor.pending == 1
+        with pytest.raises(ExecutorSaturatedError):
+            executor.stream(iter(()))
+        assert [item async for item in stream] == [1, 2]
+        assert executor.pending == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import struct
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from fitfile_customgpt_action import services
+from fitfile_customgpt_action.decoder import RawData, RecordDecoder, crc16
+from fitfile_customgpt_action.index import (
+    CHECKPOINT_EVERY,
+    RecordIndex,
+    TimeWindow,
+    build_index,
+)
+
+from .pytest_types import parametrize
+from .test_decoder import _definition, _fit_file
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+# Seconds between the FIT epoch (1989-12-31) and the Unix epoch.
+FIT_EPOCH_OFFSET = 631_065_600
+
+
+def _data(body: bytes) -> list[dict[str, Any]]:
+    return [record for record in json.loads(body)["records"] if record["kind"] == "data"]
+
+
+def _raw(item: RawData) -> str:
+    return repr((item.definition.global_id, item.values, item.timestamp))
+
+
+def _stateful_fit(count: int) -> bytes:
+    """Records whose projection depends on earlier messages.
+
+    `cycles` accumulates into `total_cycles` across its 8-bit rollovers, and every other record
+    carries a developer field described by a `field_description` at the start of the file.
+    """
+    records = [
+        # field_description: developer_data_index, field_definition_number, fit_base_type_id,
+        # field_name, units
+        b"\x40\x00\x00\xce\x00\x05\x00\x01\x02\x01\x01\x02\x02\x01\x02\x03\x08\x07\x08\x04\x07",
+        b"\x00" + struct.pack("<BBB8s4s", 0, 7, 0x02, b"grip", b"kg"),
+        # record: timestamp, cycles
+        b"\x41\x00\x00\x14\x00\x02\xfd\x04\x86\x12\x01\x02",
+        # record: timestamp, cycles and developer field 7
+        b"\x62\x00\x00\x14\x00\x02\xfd\x04\x86\x12\x01\x02\x01\x07\x01\x00",
+    ]
+    for position in range(count):
+        values = struct.pack("<IB", 1_000_000_000 + position, position * 97 % 256)
+        if position % 2:
+            records.append(b"\x02" + values + bytes([position % 100]))
+        else:
+            records.append(b"\x01" + values)
+    body = b"".join(records)
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(body), b".FIT")
+    header += struct.pack("<H", crc16(header))
+    return header + body + struct.pack("<H", crc16(header + body))
+
+
+@parametrize(("start", "end"), [(600.0, 900.0), (None, 60.0), (5000.0, None), (0.0, 0.5)])
+def test_window_returns_the_data_messages_timestamped_inside_it(
+    start: float | None, end: float | None
+) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    index = build_index(payload)
+    assert index.earliest_timestamp is not None
+    full = _data(services.render_parse_json(payload))
+    low = index.earliest_timestamp + (start or 0)
+    high = index.earliest_timestamp + end if end is not None else float("inf")
+
+    window = _data(services.render_parse_json(payload, window=TimeWindow(start, end, index)))
+
+    expected = [
+        record for record, stamp in zip(full, index.timestamps, strict=True) if low <= stamp <= high
+    ]
+    assert window and window == expected
+
+
+@parametrize(("start", "end"), [(300.0, 400.0), (600.0, 700.0), (None, 10.0)])
+def test_window_carries_accumulators_and_developer_fields(
+    start: float | None, end: float | None
+) -> None:
+    payload = _stateful_fit(3 * CHECKPOINT_EVERY)
+    full = _data(services.render_parse_json(payload))
+    index = build_index(payload)
+    assert index.earliest_timestamp is not None
+    low = index.earliest_timestamp + (start or 0)
+    high = index.earliest_timestamp + end if end is not None else float("inf")
+
+    body = json.loads(services.render_parse_json(payload, window=TimeWindow(start, end, index)))
+
+    expected = [
+        record for record, stamp in zip(full, index.timestamps, strict=True) if low <= stamp <= high
+    ]
+    assert body["records"] and _data(json.dumps(body).encode()) == expected
+    names = {field["name"] for record in expected for field in record["fields"]}
+    assert {"total_cycles", "grip"} <= names
+    assert body["metadata"]["crc"] == struct.unpack("<H", payload[-2:])[0]
+
+
+def test_window_counts_from_the_earliest_timestamp() -> None:
+    # A session summary stamped with the end of the activity is written before its records.
+    records = [
+        _definition(0, 18, [(253, 4, 0x86), (7, 4, 0x86)]),
+        b"\x00" + struct.pack("<II", 1_000_003_600, 3_600_000),
+        _definition(1, 20, [(253, 4, 0x86), (3, 1, 0x02)]),
+    ]
+    records += [
+        b"\x01" + struct.pack("<IB", 1_000_000_000 + second, 120) for second in range(0, 3601, 60)
+    ]
+    payload = _fit_file(b"".join(records))
+    index = build_index(payload)
+    assert index.earliest_timestamp == 1_000_000_000
+
+    def stamps(start: float, end: float) -> list[int]:
+        body = services.render_parse_json(payload, window=TimeWindow(start, end, index))
+        return [
+            next(f["value"] for f in record["fields"] if f["name"] == "timestamp") // 1000
+            - FIT_EPOCH_OFFSET
+            for record in _data(body)
+        ]
+
+    assert stamps(2400, 3000) == list(range(1_000_002_400, 1_000_003_001, 60))
+    assert stamps(0, 60) == [1_000_000_000, 1_000_000_060]
+
+
+def test_open_and_zero_start_select_the_same_messages() -> None:
+    index = build_index(SAMPLE_FIT.read_bytes())
+    assert index.timestamps[0] == 0
+    assert index.select(None, 10) == index.select(0, 10)
+    assert index.select(None, 10)[0].start > 0
+
+
+def test_index_notes_every_data_message_timestamp() -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    index = build_index(payload)
+    full = _data(services.render_parse_json(payload))
+
+    assert len(index) == len(full)
+    for record, stamp in zip(full, index.timestamps, strict=True):
+        if record["message"] == "record":
+            (value,) = (f["value"] for f in record["fields"] if f["name"] == "timestamp")
+            assert stamp == value // 1000 - FIT_EPOCH_OFFSET
+
+
+def test_window_outside_the_file_is_empty() -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    body = json.loads(services.render_parse_json(payload, window=TimeWindow(100_000.0, None)))
+    assert body["records"] == []
+    assert body["metadata"]["records_size"] > 0
+
+
+def test_index_resumes_across_chained_segments() -> None:
+    sample = SAMPLE_FIT.read_bytes()
+    index = build_index(sample + sample)
+    count = len(index) // 2
+    span = range(count - 10, count + 10)
+
+    [(decoder, items, _)] = index.open(sample + sample, [span])
+    raw = [_raw(item) for item in items if isinstance(item, RawData)]
+
+    expected = [item for item in RecordDecoder(sample + sample) if isinstance(item, RawData)]
+    assert raw == [_raw(item) for item in expected[span.start : span.stop]]
+    # The span ends in the second segment, so the first one's CRC was checked on the way.
+    reference = RecordDecoder(sample)
+    list(reference)
+    assert decoder.crcs == reference.crcs
+    assert len(index.checkpoints) == -(-len(index) // CHECKPOINT_EVERY)
+
+
+def test_index_round_trips_through_bytes() -> None:
+    index = build_index(SAMPLE_FIT.read_bytes())
+    loaded = RecordIndex.from_bytes(index.to_bytes())
+    assert loaded == index
+    with pytest.raises(ValueError, match="Invalid record index"):
+        RecordIndex.from_bytes(index.to_bytes()[:-1])
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import json
+import tomllib
 import types
 from collections.abc import Iterator
+from pathlib import Path
 from typing import Any, cast
 
 import pytest
@@ -47,3 +50,74 @@ def test_build_registry_without_messages(monkeypatch: pytest.MonkeyPatch) -> Non
 
     with pytest.raises(RuntimeError, match="No FIT message definitions"):
         message_registry._build_registry()
+
+
+def test_shipped_index_matches_scan() -> None:
+    assert message_registry._load_index(message_registry.INDEX_PATH) == (
+        message_registry._build_registry()
+    )
+
+
+def test_shipped_index_matches_locked_fit_tool() -> None:
+    # `uv sync --frozen` installs the locked fit-tool; a mismatched index would be ignored.
+    lock_path = Path(__file__).resolve().parent.parent / "uv.lock"
+    lock = tomllib.loads(lock_path.read_text(encoding="utf-8"))
+    (locked,) = (entry["version"] for entry in lock["package"] if entry["name"] == "fit-tool")
+    shipped = json.loads(message_registry.INDEX_PATH.read_text(encoding="utf-8"))
+    assert shipped["fit_tool"] == locked
+
+
+def test_stale_index_falls_back_to_scan(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    index_path = tmp_path / "message_index.json"
+    index_path.write_text(json.dumps({"fit_tool": "0.0.0", "messages": {}}))
+    monkeypatch.setattr(message_registry, "INDEX_PATH", index_path)
+
+    assert message_registry._load_index(index_path) is None
+    assert message_registry.resolve("record").NAME == "record"
+
+
+@parametrize(
+    "document",
+    [
+        [],
+        "messages",
+        {"messages": {}},
+        {"fit_tool": None},
+        {"fit_tool": None, "messages": []},
+        {"fit_tool": None, "messages": {"record": "record"}},
+    ],
+)
+def test_malformed_index_falls_back_to_scan(
+    document: object, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    if isinstance(document, dict) and "fit_tool" in document:
+        document["fit_tool"] = message_registry._fit_tool_version()
+    index_path = tmp_path / "message_index.json"
+    index_path.write_text(json.dumps(document))
+    monkeypatch.setattr(message_registry, "INDEX_PATH", index_path)
+
+    assert message_registry._load_index(index_path) is None
+    assert message_registry.resolve("record").NAME == "record"
+
+
+def test_write_index_round_trips(tmp_path: Path) -> None:
+    index_path = tmp_path / "message_index.json"
+    written = message_registry.write_index(index_path)
+    assert message_registry._load_index(index_path) == written
+
+
+def test_warm_up_loads_every_message() -> None:
+    assert message_registry.warm_up() == len(message_registry._registry())
+
+
+def test_field_index_matches_message_fields() -> None:
+    record_cls = message_registry.resolve("record")
+    index = message_registry.field_index(record_cls)
+    fields = record_cls().fields
+
+    heart_rate = index["heart_rate"]
+    assert fields[heart_rate.position].name == "heart_rate"
+    assert heart_rate.field_id == fields[heart_rate.position].field_id
+    assert heart_rate.units == "bpm"
+    assert len(index) == len({field.name for field in fields})
+    assert message_registry.field_index(record_cls) is index
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fitfile_customgpt_action import metrics
+from fitfile_customgpt_action.app import create_app
+from fitfile_customgpt_action.config import Settings
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+
+
+def _sample(text: str, name: str) -> float:
+    match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.MULTILINE)
+    assert match is not None, f"{name} missing from metrics"
+    return float(match.group(1))
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = metrics.Registry()
+    histogram = registry.histogram("job_seconds", "Job time.", ("stage",), buckets=(0.1, 1.0))
+    counter = registry.counter("jobs_total", "Jobs.", ("stage",))
+    histogram.observe(0.05, "decode")
+    histogram.observe(0.5, "decode")
+    histogram.observe(2.0, "decode")
+    counter.inc(3, 'say "hi"')
+
+    text = registry.render([("queue_depth", "Queued jobs.", 4)])
+
+    assert 'job_seconds_bucket{stage="decode",le="0.1"} 1' in text
+    assert 'job_seconds_bucket{stage="decode",le="1"} 2' in text
+    assert 'job_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 'job_seconds_count{stage="decode"} 3' in text
+    assert 'job_seconds_sum{stage="decode"} 2.55' in text
+    assert 'jobs_total{stage="say \\"hi\\""} 3' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 4" in text
+
+
+def test_registry_sums_the_snapshots_of_every_worker(tmp_path: Path) -> None:
+    def registry() -> tuple[metrics.Registry, metrics.Counter, metrics.Histogram]:
+        registry = metrics.Registry()
+        registry.directory = tmp_path
+        counter = registry.counter("jobs_total", "Jobs.", ("stage",))
+        histogram = registry.histogram("job_seconds", "Job time.", buckets=(1.0,))
+        return registry, counter, histogram
+
+    other, other_jobs, other_seconds = registry()
+    other_jobs.inc(2, "decode")
+    other_seconds.observe(0.5)
+    other_jobs.inc(5, "encode")
+    # Another worker's snapshot, as its own `flush` would have written it.
+    snapshot = {"jobs_total": other_jobs.state(), "job_seconds": other_seconds.state()}
+    (tmp_path / f"{metrics.SNAPSHOT_PREFIX}1.json").write_text(json.dumps(snapshot))
+    local, jobs, seconds = registry()
+    jobs.inc(1, "decode")
+    seconds.observe(2.0)
+
+    text = local.render()
+
+    assert 'jobs_total{stage="decode"} 3' in text
+    assert 'jobs_total{stage="encode"} 5' in text
+    assert 'job_seconds_bucket{le="1"} 1' in text
+    assert "job_seconds_count 2" in text
+    assert jobs.value("decode") == 1
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+        f"{metrics.SNAPSHOT_PREFIX}1.json",
+        f"{metrics.SNAPSHOT_PREFIX}{os.getpid()}.json",
+    ]
+
+
+def test_registry_folds_the_snapshots_of_exited_workers(tmp_path: Path) -> None:
+    registry = metrics.Registry()
+    registry.directory = tmp_path
+    jobs = registry.counter("jobs_total", "Jobs.")
+    exited = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"], check=True, capture_output=True
+    )
+    snapshots = {
+        metrics.RETIRED_SNAPSHOT: 1,
+        f"{metrics.SNAPSHOT_PREFIX}{int(exited.stdout)}.json": 2,
+        f"{metrics.SNAPSHOT_PREFIX}{os.getppid()}.json": 4,
+    }
+    for name, value in snapshots.items():
+        (tmp_path / name).write_text(json.dumps({"jobs_total": [[[], value]]}))
+    jobs.inc(8)
+
+    first, second = registry.render(), registry.render()
+
+    assert "jobs_total 15" in first
+    assert "jobs_total 15" in second
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == sorted(
+        [
+            f"{metrics.SNAPSHOT_PREFIX}{os.getppid()}.json",
+            f"{metrics.SNAPSHOT_PREFIX}{os.getpid()}.json",
+            metrics.RETIRED_SNAPSHOT,
+        ]
+    )
+    retired = json.loads((tmp_path / metrics.RETIRED_SNAPSHOT).read_text())
+    assert retired["jobs_total"] == [[[], 3]]
+
+
+def test_app_shares_metrics_through_its_directory(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(metrics.REGISTRY, "enabled", True)
+    monkeypatch.setattr(metrics.REGISTRY, "directory", None)
+
+    with TestClient(create_app(Settings(metrics_dir=tmp_path))) as client:
+        client.get("/fit/healthz")
+        response = client.get("/fit/metrics")
+
+    assert response.status_code == 200
+    snapshot = json.loads((tmp_path / f"{metrics.SNAPSHOT_PREFIX}{os.getpid()}.json").read_text())
+    assert snapshot["fit_request_seconds"]
+
+
+def test_cache_and_executor_totals_add_up_across_workers(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(metrics.REGISTRY, "enabled", True)
+    monkeypatch.setattr(metrics.REGISTRY, "directory", None)
+    # Another worker's snapshot, so the totals must not depend on which worker is scraped.
+    snapshot = {"fit_cache_misses_total": [[[], 2]], "fit_executor_rejected_total": [[[], 3]]}
+    (tmp_path / f"{metrics.SNAPSHOT_PREFIX}1.json").write_text(json.dumps(snapshot))
+
+    with TestClient(create_app(Settings(metrics_dir=tmp_path))) as client:
+        client.post(
+            "/fit/parse",
+            files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+        )
+        text = client.get("/fit/metrics").text
+
+    assert "# TYPE fit_cache_misses_total counter" in text
+    assert _sample(text, "fit_cache_misses_total") == 3
+    assert _sample(text, "fit_executor_rejected_total") == 3
+    own = json.loads((tmp_path / f"{metrics.SNAPSHOT_PREFIX}{os.getpid()}.json").read_text())
+    assert own["fit_cache_misses_total"] == [[[], 1]]
+
+
+def test_metrics_cover_stages_records_bytes_and_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metrics.REGISTRY, "enabled", True)
+    payload = SAMPLE_FIT.read_bytes()
+    decodes = metrics.STAGE_SECONDS.count("decode")
+    records = metrics.RECORDS.value("parse", "record")
+    received = metrics.RECEIVED_BYTES.value("/fit/parse")
+
+    with TestClient(create_app()) as client:
+        upload = {"file": ("sample.FIT", payload, "application/octet-stream")}
+        parsed = client.post("/fit/parse", files=upload)
+        client.post("/fit/parse", files=upload)
+        response = client.get("/fit/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    text = response.text
+    assert metrics.STAGE_SECONDS.count("decode") == decodes + 1
+    assert metrics.STAGE_SECONDS.count("encode_json") >= 1
+    assert metrics.RECORDS.value("parse", "record") == records + 4596
+    assert metrics.RECEIVED_BYTES.value("/fit/parse") >= received + 2 * len(payload)
+    assert _sample(text, 'fit_response_bytes_total{route="/fit/parse"}') >= len(parsed.content)
+    assert _sample(text, 'fit_request_seconds_count{route="/fit/parse",status="200"}') >= 2
+    assert (_sample(text, "fit_cache_hits_total"), _sample(text, "fit_cache_misses_total")) == (
+        1,
+        1,
+    )
+    assert _sample(text, "fit_executor_pending") == 0
+    assert _sample(text, "fit_executor_rejected_total") == 0
+
+
+def test_metrics_can_be_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metrics.REGISTRY, "enabled", True)
+    decodes = metrics.STAGE_SECONDS.count("decode")
+
+    with TestClient(create_app(Settings(metrics=False))) as client:
+        client.post(
+            "/fit/parse",
+            files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+        )
+        response = client.get("/fit/metrics")
+
+    assert response.status_code == 404
+    assert metrics.STAGE_SECONDS.count("decode") == decodes
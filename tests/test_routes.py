@@ -0,0 +1,728 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import struct
+import threading
+import zipfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+from fastapi.testclient import TestClient
+from pytest import MonkeyPatch
+from starlette.formparsers import MultiPartParser
+from starlette.types import Message, Scope
+
+from fitfile_customgpt_action import message_registry, routes, services
+from fitfile_customgpt_action.app import create_app
+from fitfile_customgpt_action.cache import ParseCache
+from fitfile_customgpt_action.config import Settings
+from fitfile_customgpt_action.decoder import crc16
+from fitfile_customgpt_action.executor import ExecutorSaturatedError
+from fitfile_customgpt_action.index import TimeWindow
+from fitfile_customgpt_action.models import BatchResultLine, ParseFitColumnarResponse
+from fitfile_customgpt_action.services import parse_fit_bytes, render_parse_json
+from fitfile_customgpt_action.uploads import StreamedBody, UploadBuffer
+
+from .pytest_types import parametrize
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+
+
+def test_health(client: TestClient) -> None:
+    response = client.get("/fit/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_parse_streams_ndjson_when_requested(client: TestClient) -> None:
+    with SAMPLE_FIT.open("rb") as handle:
+        response = client.post(
+            "/fit/parse",
+            files={"file": ("sample.FIT", handle, "application/octet-stream")},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["kind"] == "metadata"
+    assert lines[0]["metadata"]["records_size"] > 0
+    assert lines[1]["kind"] == "definition"
+    assert {line["kind"] for line in lines[1:]} == {"definition", "data"}
+
+
+def test_parse_rejects_empty_upload(client: TestClient) -> None:
+    response = client.post(
+        "/fit/parse",
+        files={"file": ("empty.fit", b"", "application/octet-stream")},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 400
+
+
+def test_parse_returns_columnar_groups(client: TestClient) -> None:
+    with SAMPLE_FIT.open("rb") as handle:
+        response = client.post(
+            "/fit/parse",
+            params={"format": "columnar"},
+            files={"file": ("sample.FIT", handle, "application/octet-stream")},
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["metadata"]["records_size"] > 0
+    records = next(group for group in body["messages"] if group["message"] == "record")
+    columns = {column["name"]: column for column in records["columns"]}
+    assert columns["heart_rate"]["units"] == "bpm"
+    assert all(len(column["values"]) == records["count"] for column in records["columns"])
+
+
+def test_parse_rejects_unknown_format(client: TestClient) -> None:
+    response = client.post(
+        "/fit/parse",
+        params={"format": "rows"},
+        files={"file": ("sample.FIT", b"data", "application/octet-stream")},
+    )
+    assert response.status_code == 422
+
+
+def test_parse_serves_repeat_uploads_from_cache(client: TestClient) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    responses = [
+        client.post(
+            "/fit/parse",
+            files={"file": ("sample.FIT", payload, "application/octet-stream")},
+        )
+        for _ in range(2)
+    ]
+
+    assert [response.headers["x-cache"] for response in responses] == ["MISS", "HIT"]
+    assert responses[0].content == responses[1].content
+    assert responses[1].json()["metadata"]["crc"] == 26413
+
+    columnar = client.post(
+        "/fit/parse",
+        params={"format": "columnar"},
+        files={"file": ("sample.FIT", payload, "application/octet-stream")},
+    )
+    assert columnar.headers["x-cache"] == "MISS"
+
+
+def test_parse_cache_work_runs_off_the_event_loop(
+    client: TestClient, monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    cache = ParseCache(1024 * 1024, tmp_path)
+    client.app.state.parse_cache = cache  # type: ignore[attr-defined]
+    on_loop: list[bool] = []
+
+    def recording(name: str) -> Callable[..., Any]:
+        method = getattr(cache, name)
+
+        def record(*args: Any) -> Any:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                on_loop.append(False)
+            else:
+                on_loop.append(True)
+            return method(*args)
+
+        return record
+
+    for name in ("key", "get", "put"):
+        monkeypatch.setattr(cache, name, recording(name))
+    upload = {"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")}
+
+    responses = [client.post("/fit/parse", files=upload) for _ in range(2)]
+
+    assert [response.headers["x-cache"] for response in responses] == ["MISS", "HIT"]
+    assert on_loop == [False] * 5
+
+
+@parametrize("accept", ["application/json", "application/x-ndjson"])
+def test_parse_memory_maps_spooled_uploads(
+    client: TestClient, monkeypatch: MonkeyPatch, accept: str
+) -> None:
+    mapped: list[bool] = []
+    released: list[bool] = []
+
+    class RecordingBuffer(UploadBuffer):
+        def __init__(self, *args: Any) -> None:
+            super().__init__(*args)
+            mapped.append(self.mapped)
+
+        def release(self) -> None:
+            super().release()
+            released.append(True)
+
+    # Spool every upload to disk so the route maps it instead of reading it into memory.
+    monkeypatch.setattr(MultiPartParser, "spool_max_size", 1)
+    monkeypatch.setattr(routes, "UploadBuffer", RecordingBuffer)
+    response = client.post(
+        "/fit/parse",
+        files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+        headers={"Accept": accept},
+    )
+
+    assert response.status_code == 200
+    if accept == "application/json":
+        expected = parse_fit_bytes(SAMPLE_FIT.read_bytes()).model_dump(mode="json")
+        assert response.json() == expected
+    else:
+        assert response.text.splitlines()[0].startswith('{"kind":"metadata"')
+    assert mapped == [True]
+    assert released == [True]
+
+
+@parametrize(("cache_max_bytes", "workers"), [(0, 1), (0, 2), (1024 * 1024, 2)])
+def test_parse_accepts_raw_octet_stream_bodies(cache_max_bytes: int, workers: int) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+
+    def chunks() -> Iterator[bytes]:
+        for start in range(0, len(payload), 8192):
+            yield payload[start : start + 8192]
+
+    expected = parse_fit_bytes(payload).model_dump(mode="json")
+    headers = {"Content-Type": "application/octet-stream"}
+    settings = Settings(cache_max_bytes=cache_max_bytes, executor_workers=workers)
+    with TestClient(create_app(settings)) as raw_client:
+        sized = raw_client.post("/fit/parse", content=payload, headers=headers)
+        # Generator bodies are sent chunked, without a Content-Length.
+        chunked = raw_client.post("/fit/parse", content=chunks(), headers=headers)
+        streamed = raw_client.post(
+            "/fit/parse", content=payload, headers={**headers, "Accept": "application/x-ndjson"}
+        )
+
+    assert sized.status_code == 200
+    assert sized.json() == expected
+    assert chunked.json() == expected
+    assert streamed.text.splitlines()[0].startswith('{"kind":"metadata"')
+
+
+def test_parse_decodes_raw_bodies_while_they_arrive_with_default_settings(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    app = create_app(Settings())
+    assert app.state.parse_cache.enabled
+    # Set once a worker has decoded everything sent so far and waits for more.
+    waiting = threading.Event()
+    wait_for = StreamedBody.wait_for
+
+    def recording_wait_for(self: StreamedBody, end: int) -> None:
+        if end > self.received:
+            waiting.set()
+        wait_for(self, end)
+
+    monkeypatch.setattr(StreamedBody, "wait_for", recording_wait_for)
+    half = len(payload) // 2
+    parts = [payload[:half], payload[half:]]
+    overlapped: list[bool] = []
+
+    async def receive() -> Message:
+        if not parts:
+            await asyncio.Event().wait()
+        if len(parts) == 1:
+            # Hold the rest of the upload back until the worker has caught up with it.
+            overlapped.append(await asyncio.to_thread(waiting.wait, 10))
+        chunk = parts.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(parts)}
+
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    scope: Scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/fit/parse",
+        "raw_path": b"/fit/parse",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/octet-stream"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), 30))
+
+    assert overlapped == [True]
+    start, *bodies = sent
+    assert start["status"] == 200
+    assert (b"x-cache", b"MISS") in start["headers"]
+    content = b"".join(message.get("body", b"") for message in bodies)
+    assert json.loads(content) == json.loads(render_parse_json(payload))
+    with TestClient(app) as raw_client:
+        repeat = raw_client.post(
+            "/fit/parse", content=payload, headers={"Content-Type": "application/octet-stream"}
+        )
+    assert repeat.headers["x-cache"] == "HIT"
+    assert repeat.content == content
+
+
+@parametrize(
+    ("content", "headers", "detail"),
+    [
+        (b"", {"Content-Type": "application/octet-stream"}, "empty"),
+        (b"\x0cthis is no FIT", {"Content-Type": "application/octet-stream"}, "not in header"),
+        (
+            SAMPLE_FIT.read_bytes()[:1000],
+            {"Content-Type": "application/octet-stream", "Content-Length": "2000"},
+            "ended after 1000 of its 2000 declared bytes",
+        ),
+        (SAMPLE_FIT.read_bytes(), {"Content-Type": "text/plain"}, "multipart `file` field"),
+    ],
+)
+def test_parse_rejects_bad_raw_bodies(
+    client: TestClient, content: bytes, headers: dict[str, str], detail: str
+) -> None:
+    response = client.post("/fit/parse", content=content, headers=headers)
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+
+def test_parse_does_not_allocate_an_implausible_content_length() -> None:
+    headers = {"Content-Type": "application/octet-stream", "Content-Length": str(1 << 50)}
+    with TestClient(create_app(Settings(max_upload_bytes=0))) as raw_client:
+        response = raw_client.post(
+            "/fit/parse", content=SAMPLE_FIT.read_bytes()[:1000], headers=headers
+        )
+
+    assert response.status_code == 400
+    assert "Failed to parse FIT file" in response.json()["detail"]
+
+
+def test_parse_downsamples_record_stream(client: TestClient) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    params = {"downsample": "lttb", "points": "200", "downsample_field": "power"}
+    upload = {"file": ("sample.FIT", payload, "application/octet-stream")}
+    response = client.post("/fit/parse", files=upload, params=params)
+    streamed = client.post(
+        "/fit/parse",
+        files=upload,
+        params=params,
+        headers={"Accept": "application/x-ndjson"},
+    )
+    undecimated = client.post("/fit/parse", files=upload)
+
+    assert response.status_code == 200
+    records = response.json()["records"]
+    data = [record for record in records if record["kind"] == "data"]
+    assert sum(record["message"] == "record" for record in data) == 200
+    assert any(record.get("message") == "session" for record in records)
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert lines[1:] == records
+    assert len(undecimated.content) > 5 * len(response.content)
+
+
+def test_parse_rejects_bad_downsampling(client: TestClient) -> None:
+    upload = {"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")}
+    bad_points = client.post(
+        "/fit/parse", files=upload, params={"downsample": "bucket", "points": 1}
+    )
+    bad_field = client.post(
+        "/fit/parse", files=upload, params={"downsample": "lttb", "downsample_field": "nope"}
+    )
+    assert (bad_points.status_code, bad_field.status_code) == (422, 400)
+
+
+def test_parse_tolerates_and_resumes_truncated_uploads(client: TestClient) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    headers = {"Content-Type": "application/octet-stream"}
+    complete = parse_fit_bytes(payload).model_dump(mode="json")["records"]
+
+    strict = client.post("/fit/parse", content=payload[:100_000], headers=headers)
+    partial = client.post(
+        "/fit/parse", content=payload[:100_000], headers=headers, params={"tolerant": "true"}
+    )
+    assert strict.status_code == 400
+    assert partial.status_code == 200
+    diagnostics = partial.json()["metadata"]["diagnostics"]
+    assert diagnostics["complete"] is False and diagnostics["crc"] == "missing"
+    assert "truncated" in diagnostics["error"]
+
+    rest = client.post(
+        "/fit/parse",
+        content=payload[diagnostics["offset"] :],
+        headers=headers,
+        params={"resume": diagnostics["resume_token"]},
+    )
+    assert rest.status_code == 200
+    resumed = rest.json()
+    assert resumed["metadata"]["diagnostics"] == {
+        "complete": True,
+        "offset": len(payload),
+        "crc": "valid",
+        "error": None,
+        "resume_token": None,
+    }
+    # The resumed response repeats the definitions in effect before its first record.
+    data = [
+        record
+        for record in partial.json()["records"] + resumed["records"]
+        if record["kind"] == "data"
+    ]
+    assert data == [record for record in complete if record["kind"] == "data"]
+
+
+def test_parse_streams_tolerant_diagnostics_last(client: TestClient) -> None:
+    response = client.post(
+        "/fit/parse",
+        files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes()[:5000], "application/octet-stream")},
+        params={"tolerant": "true"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["kind"] == "metadata"
+    assert lines[-1]["kind"] == "diagnostics"
+    assert lines[-1]["diagnostics"]["offset"] < 5000
+    assert {line["kind"] for line in lines[1:-1]} == {"definition", "data"}
+
+
+def test_parse_rejects_bad_resume_tokens(client: TestClient) -> None:
+    response = client.post(
+        "/fit/parse",
+        content=b"\x00" * 16,
+        headers={"Content-Type": "application/octet-stream"},
+        params={"resume": "garbage"},
+    )
+    assert response.status_code == 400
+    assert "Invalid resume token" in response.json()["detail"]
+
+
+@parametrize("output_format", ["records", "columnar"])
+def test_parse_returns_chained_segments_separately(client: TestClient, output_format: str) -> None:
+    first = SAMPLE_FIT.read_bytes()
+    second = _fit_file_with_one_record()
+    payload = first + second + first
+
+    response = client.post(
+        "/fit/parse",
+        content=payload,
+        headers={"Content-Type": "application/octet-stream"},
+        params={"segments": "true", "format": output_format},
+    )
+
+    assert response.status_code == 200
+    segments = response.json()["segments"]
+    expected = [
+        json.loads(render_parse_json(part, output_format)) for part in (first, second, first)
+    ]
+    assert segments == expected
+
+
+def test_parse_segments_report_the_failing_segment(client: TestClient) -> None:
+    second = bytearray(_fit_file_with_one_record())
+    second[-1] ^= 0xFF
+    response = client.post(
+        "/fit/parse",
+        files={"file": ("chain.fit", SAMPLE_FIT.read_bytes() + second, "application/octet-stream")},
+        params={"segments": "true"},
+    )
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail.startswith(f"Segment 1 at byte offset {len(SAMPLE_FIT.read_bytes())}:")
+    assert "crc" in detail
+
+
+def test_parse_returns_time_windows_from_a_cached_index(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    built: list[int] = []
+    build = services.index_fit_bytes
+
+    def index_fit_bytes(data: bytes) -> bytes:
+        built.append(len(data))
+        return build(data)
+
+    monkeypatch.setattr(routes, "index_fit_bytes", index_fit_bytes)
+
+    def post(start: float, end: float) -> Any:
+        return client.post(
+            "/fit/parse",
+            content=payload,
+            headers={"Content-Type": "application/octet-stream"},
+            params={"start": start, "end": end},
+        )
+
+    responses = [post(600, 900), post(600, 900), post(0, 60)]
+
+    assert [response.headers["x-cache"] for response in responses] == ["MISS", "HIT", "MISS"]
+    assert built == [len(payload)]
+    assert responses[0].json() == json.loads(
+        render_parse_json(payload, window=TimeWindow(600, 900))
+    )
+    assert responses[0].content != responses[2].content
+
+
+def test_parse_keeps_time_window_indexes_without_a_parse_cache(monkeypatch: MonkeyPatch) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    built: list[int] = []
+    build = services.index_fit_bytes
+
+    def index_fit_bytes(data: bytes) -> bytes:
+        built.append(len(data))
+        return build(data)
+
+    monkeypatch.setattr(routes, "index_fit_bytes", index_fit_bytes)
+    with TestClient(create_app(Settings(cache_max_bytes=0))) as uncached:
+        responses = [
+            uncached.post(
+                "/fit/parse",
+                content=payload,
+                headers={"Content-Type": "application/octet-stream"},
+                params={"start": start, "end": 900},
+            )
+            for start in (0, 600)
+        ]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert "x-cache" not in responses[0].headers
+    assert built == [len(payload)]
+
+
+@parametrize(
+    ("params", "status_code"),
+    [
+        ({"start": "900", "end": "600"}, 400),
+        ({"start": "60", "segments": "true"}, 400),
+        ({"end": "60", "tolerant": "true"}, 400),
+        ({"start": "-1"}, 422),
+    ],
+)
+def test_parse_rejects_bad_time_windows(
+    client: TestClient, params: dict[str, str], status_code: int
+) -> None:
+    response = client.post(
+        "/fit/parse",
+        content=SAMPLE_FIT.read_bytes(),
+        headers={"Content-Type": "application/octet-stream"},
+        params=params,
+    )
+    assert response.status_code == status_code
+
+
+def _fit_file_with_one_record() -> bytes:
+    # file_id message (global 0) with a single enum field set to 4.
+    records = bytes([0x40, 0, 0, 0, 0, 1, 0, 1, 0x00, 0x00, 4])
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(records), b".FIT")
+    header += struct.pack("<H", crc16(header))
+    return header + records + struct.pack("<H", crc16(header + records))
+
+
+def test_summary_returns_aggregates_instead_of_records(client: TestClient) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    upload = {"file": ("sample.FIT", payload, "application/octet-stream")}
+    response = client.post("/fit/summary", files=upload, params={"percentiles": "50,95"})
+    repeat = client.post("/fit/summary", files=upload, params={"percentiles": "50,95"})
+    raw = client.post(
+        "/fit/summary",
+        content=payload,
+        params={"percentiles": "50,95"},
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+    assert response.status_code == 200
+    assert len(response.content) < 10_000
+    body = response.json()
+    assert body["activity"]["records"] == 4596
+    assert set(body["activity"]["metrics"]["power"]["percentiles"]) == {"p50", "p95"}
+    assert [lap["index"] for lap in body["laps"]] == [0]
+    assert (response.headers["x-cache"], repeat.headers["x-cache"]) == ("MISS", "HIT")
+    assert raw.json() == body
+
+
+def test_summary_rejects_bad_options(client: TestClient) -> None:
+    response = client.post(
+        "/fit/summary",
+        files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+        params={"heart_rate_zones": "low,high"},
+    )
+    assert response.status_code == 400
+
+
+def test_parse_rejects_oversized_uploads() -> None:
+    with TestClient(create_app(Settings(max_upload_bytes=1024))) as small_client:
+        response = small_client.post(
+            "/fit/parse",
+            files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+        )
+    assert response.status_code == 413
+
+
+def test_parse_returns_503_when_executor_is_saturated(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    async def saturated(*_args: object) -> object:
+        raise ExecutorSaturatedError("busy")
+
+    monkeypatch.setattr(client.app.state.executor, "run", saturated)  # type: ignore[attr-defined]
+    response = client.post(
+        "/fit/parse",
+        files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/fit/healthz").status_code == 200
+
+
+def test_parse_ndjson_streams_count_against_the_executor(client: TestClient) -> None:
+    executor = client.app.state.executor  # type: ignore[attr-defined]
+    upload = {"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")}
+    ndjson = {"Accept": "application/x-ndjson"}
+
+    executor._pending = executor.workers + executor.max_queue
+    saturated = client.post("/fit/parse", files=upload, headers=ndjson)
+    executor._pending = 0
+    streamed = client.post("/fit/parse", files=upload, headers=ndjson)
+
+    assert saturated.status_code == 503
+    assert saturated.headers["retry-after"] == "1"
+    assert streamed.status_code == 200
+    assert executor.pending == 0
+
+
+def test_parse_batch_streams_per_file_results(client: TestClient) -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as bundle:
+        bundle.writestr("nested/zipped.fit", payload)
+        bundle.writestr("__MACOSX/._zipped.fit", b"junk")
+
+    response = client.post(
+        "/fit/parse/batch",
+        params={"format": "columnar"},
+        files=[
+            ("files", ("first.fit", payload, "application/octet-stream")),
+            ("files", ("broken.fit", b"not a fit file", "application/octet-stream")),
+            ("files", ("bundle.zip", archive.getvalue(), "application/zip")),
+        ],
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted(
+        (json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"]
+    )
+    assert [(line["kind"], line["filename"]) for line in lines] == [
+        ("result", "first.fit"),
+        ("error", "broken.fit"),
+        ("result", "nested/zipped.fit"),
+    ]
+    assert lines[1]["status_code"] == 400
+    result = BatchResultLine.model_validate(lines[2])
+    assert result.result == ParseFitColumnarResponse.model_validate(lines[0]["result"])
+
+
+def test_parse_filters_messages_and_fields(client: TestClient) -> None:
+    response = client.post(
+        "/fit/parse",
+        params={"messages": "session", "fields": "record.heart_rate,record.timestamp"},
+        files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+    )
+
+    assert response.status_code == 200
+    records = response.json()["records"]
+    assert {record["message"] for record in records} == {"session", "record"}
+    assert {
+        field["name"]
+        for record in records
+        if record["kind"] == "data" and record["message"] == "record"
+        for field in record["fields"]
+    } == {"heart_rate", "timestamp"}
+
+
+def test_parse_rejects_unknown_selection(client: TestClient) -> None:
+    response = client.post(
+        "/fit/parse",
+        params={"fields": "record.not_a_field"},
+        files={"file": ("sample.FIT", SAMPLE_FIT.read_bytes(), "application/octet-stream")},
+    )
+
+    assert response.status_code == 400
+    assert "not_a_field" in response.json()["detail"]
+
+
+def test_startup_warms_message_registry(monkeypatch: MonkeyPatch) -> None:
+    calls: list[bool] = []
+
+    def warm_up() -> int:
+        calls.append(True)
+        return 0
+
+    monkeypatch.setattr(message_registry, "warm_up", warm_up)
+
+    with TestClient(create_app(Settings(warm_registry=True))):
+        assert calls == [True]
+    with TestClient(create_app(Settings())):
+        assert calls == [True]
+
+
+def test_produce_streams_fit_file(client: TestClient) -> None:
+    response = client.post(
+        "/fit/produce",
+        json={
+            "messages": [
+                {"name": "file_id", "fields": [{"name": "type", "value": 4}]},
+                {"name": "record", "fields": [{"name": "heart_rate", "value": 140}]},
+            ]
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(response.content))
+    assert 'filename="generated.fit"' in response.headers["content-disposition"]
+    records = parse_fit_bytes(response.content).records
+    assert [record.message for record in records if record.kind == "data"] == ["file_id", "record"]
+
+
+def test_produce_columnar_builds_one_message_per_row(client: TestClient) -> None:
+    response = client.post(
+        "/fit/produce/columnar",
+        json={
+            "file_id": {"type": [4]},
+            "record": {"heart_rate": [140, 141, None], "cadence": [80, 81, 82]},
+        },
+    )
+
+    assert response.status_code == 200
+    rows = [
+        {field.name: field.value for field in record.fields}
+        for record in parse_fit_bytes(response.content).records
+        if record.kind == "data" and record.message == "record"
+    ]
+    assert [(row.get("heart_rate"), row["cadence"]) for row in rows] == [
+        (140, 80),
+        (141, 81),
+        (None, 82),
+    ]
+
+
+@parametrize(
+    ("body", "detail"),
+    [
+        ({"record": {"heart_rate": [140], "cadence": [80, 81]}}, "same length"),
+        ({"record": {"heart_beat": [140]}}, "heart_beat"),
+        ({"nope": {"heart_rate": [140]}}, "nope"),
+        ({"record": {"heart_rate": []}}, "At least one message"),
+    ],
+)
+def test_produce_columnar_rejects_bad_columns(
+    client: TestClient, body: dict[str, object], detail: str
+) -> None:
+    response = client.post("/fit/produce/columnar", json=body)
+
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
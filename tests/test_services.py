@@ -1,15 +1,32 @@
 from __future__ import annotations
 
+import json
+from collections.abc import Iterator
+from pathlib import Path
 from types import SimpleNamespace
-from typing import Any
+from typing import Any, cast
 
 import pytest
-
-from fitfile_customgpt_action import services
-from fitfile_customgpt_action.models import BuildFitRequest, MessageFieldPayload, MessagePayload
+from fastapi import HTTPException
+
+from fitfile_customgpt_action import fastjson, message_registry, services
+from fitfile_customgpt_action.encoder import EncodedRecords
+from fitfile_customgpt_action.models import (
+    BuildFitRequest,
+    DataField,
+    DataRecord,
+    DefinitionRecord,
+    FitMetadata,
+    MessageFieldPayload,
+    MessagePayload,
+    ParseFitResponse,
+    RecordDict,
+)
 
 from .pytest_types import parametrize
 
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+
 
 class DummyField:
     def __init__(self, field_id: int, name: str, values: list[Any]) -> None:
@@ -17,6 +34,9 @@ class DummyField:
         self.name: str = name
         self._values = list(values)
         self.units: str = "units"
+        self.base_type: Any = None
+        self.scale: float | None = None
+        self.offset: float | None = None
         self.calls: list[tuple[int, Any]] = []
 
     def get_values(self) -> list[Any]:
@@ -30,6 +50,7 @@ class DummyField:
 
 
 class DummyMessage:
+    NAME = "dummy-message"
     name = "dummy-message"
 
     def __init__(self, local_id: int = 0) -> None:
@@ -45,17 +66,9 @@ class DummyMessage:
     ("field_values", "expected_value"),
     [([42], 42), ([1, 2], [1, 2])],
 )
-def test_parse_fit_bytes_success(
+def test_serialize_records(
     monkeypatch: pytest.MonkeyPatch, field_values: list[int], expected_value: int | list[int]
 ) -> None:
-    class DummyProtocol:
-        def __str__(self) -> str:
-            return "2.0"
-
-    class DummyProfile:
-        def __str__(self) -> str:
-            return "21.60"
-
     class DummyBaseType:
         def __init__(self, name: str) -> None:
             self.name: str = name
@@ -98,51 +111,140 @@ def test_parse_fit_bytes_success(
         message=DummyDataMessage(field_values),
     )
 
-    header = SimpleNamespace(
-        protocol_version=DummyProtocol(),
-        profile_version=DummyProfile(),
-        records_size=128,
-    )
-    fake_fit_file = SimpleNamespace(
-        header=header,
-        records=[definition_record, data_record],
-        crc=0xABCD,
-    )
-
-    class DummyFitFileAPI:
-        @staticmethod
-        def from_bytes(_payload: bytes) -> SimpleNamespace:
-            return fake_fit_file
-
-    monkeypatch.setattr(services, "FitFile", DummyFitFileAPI)
     monkeypatch.setattr(services, "DefinitionMessage", DummyDefinitionMessage)
     monkeypatch.setattr(services, "MessageFactory", DummyFactory)
 
-    response = services.parse_fit_bytes(b"payload")
-    assert response.metadata.protocol_version == "2.0"
-    assert response.metadata.profile_version == "21.60"
-    assert response.metadata.records_size == 128
-    assert response.metadata.crc == 0xABCD
-
-    definition = response.records[0]
+    definition = services._serialize_record(cast(Any, definition_record))
     assert definition.kind == "definition"
     assert definition.fields[0].base_type == "UINT32"
 
-    data = response.records[1]
+    data = services._serialize_record(cast(Any, data_record))
     assert data.kind == "data"
     assert data.fields[0].value == expected_value
     assert data.fields[0].units == "m/s"
     assert data.fields[1].value == 99
 
 
-def test_parse_fit_bytes_failure(monkeypatch: pytest.MonkeyPatch) -> None:
-    class DummyFitFileAPI:
-        @staticmethod
-        def from_bytes(_payload: bytes) -> SimpleNamespace:
-            raise ValueError("boom")
+def test_parse_fit_bytes_success() -> None:
+    response = services.parse_fit_bytes(SAMPLE_FIT.read_bytes())
+    assert response.metadata.protocol_version == "1.0"
+    assert response.metadata.profile_version == "21.179"
+    assert response.metadata.records_size == 208628
+    assert response.metadata.crc == 26413
+
+    definition = response.records[0]
+    assert definition.kind == "definition"
+    assert definition.message == "file_id"
+
+    data = response.records[1]
+    assert data.kind == "data"
+    assert {field.name: field.value for field in data.fields}["type"] == 4
+
+
+@parametrize("encoder", ["orjson", "json"])
+def test_render_parse_json_matches_response_models(
+    encoder: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    if encoder == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(fastjson, "orjson", None)
+    payload = SAMPLE_FIT.read_bytes()
+
+    body = services.render_parse_json(payload)
+
+    assert json.loads(body) == json.loads(services.parse_fit_bytes(payload).model_dump_json())
+    assert ParseFitResponse.model_validate_json(body).records[1].kind == "data"
+
+
+def test_columnar_messages_pad_missing_fields() -> None:
+    records: list[DefinitionRecord | DataRecord] = [
+        DefinitionRecord(local_id=0, global_id=20, message="record", fields=[]),
+        DataRecord(
+            local_id=0,
+            global_id=20,
+            message="record",
+            fields=[DataField(field_id=253, name="timestamp", units="ms", value=1)],
+        ),
+        DataRecord(
+            local_id=1,
+            global_id=20,
+            message="record",
+            fields=[
+                DataField(field_id=3, name="heart_rate", units="bpm", value=120),
+                DataField(field_id=253, name="timestamp", units="ms", value=2),
+            ],
+        ),
+        DataRecord(local_id=2, global_id=21, message="event", fields=[]),
+    ]
 
-    monkeypatch.setattr(services, "FitFile", DummyFitFileAPI)
+    record, event = services._columnar_messages(
+        [services._record_dict(record) for record in records]
+    )
+
+    assert record.count == 2
+    assert [(column.name, column.units, column.values) for column in record.columns] == [
+        ("timestamp", "ms", [1, 2]),
+        ("heart_rate", "bpm", [None, 120]),
+    ]
+    assert (event.message, event.count, event.columns) == ("event", 1, [])
+
+
+def test_parse_fit_columnar_matches_records() -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    records = services.parse_fit_bytes(payload).records
+    response = services.parse_fit_columnar(payload)
+
+    rows = [record for record in records if record.kind == "data" and record.global_id == 20]
+    group = next(message for message in response.messages if message.global_id == 20)
+    assert group.count == len(rows)
+    heart_rate = next(column for column in group.columns if column.name == "heart_rate")
+    assert heart_rate.values == [
+        next((field.value for field in row.fields if field.name == "heart_rate"), None)
+        for row in rows
+    ]
+
+
+def test_parse_fit_bytes_keeps_only_selected_messages_and_fields() -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    selection = services.build_selection(["session,lap"], ["record.heart_rate", "record.timestamp"])
+    response = services.parse_fit_bytes(payload, selection)
+
+    expected = []
+    for record in services.parse_fit_bytes(payload).records:
+        if record.message in ("session", "lap"):
+            expected.append(record)
+        elif record.message == "record" and record.kind == "data":
+            fields = [field for field in record.fields if field.name in ("heart_rate", "timestamp")]
+            expected.append(record.model_copy(update={"fields": fields}))
+        elif record.message == "record":
+            expected.append(record)
+    assert response.records == expected
+    assert {record.message for record in response.records} == {"session", "lap", "record"}
 
+
+@parametrize(
+    ("messages", "fields", "detail"),
+    [
+        (["session,nope"], [], "nope"),
+        ([], ["record"], "message.field"),
+        ([], ["record.nope"], "nope"),
+    ],
+)
+def test_build_selection_rejects_unknown_names(
+    messages: list[str], fields: list[str], detail: str
+) -> None:
+    with pytest.raises(HTTPException) as exc:
+        services.build_selection(messages, fields)
+    assert exc.value.status_code == 400
+    assert detail in str(exc.value.detail)
+
+
+def test_build_selection_without_names_keeps_everything() -> None:
+    assert services.build_selection([], [""]) is None
+
+
+def test_parse_fit_bytes_failure() -> None:
     with pytest.raises(Exception) as exc:
         services.parse_fit_bytes(b"payload")
     assert "Failed to parse FIT file" in str(exc.value)
@@ -175,29 +277,24 @@ def test_build_fit_file_success(
     field_payload_groups: list[list[dict[str, Any]]],
     expected_calls: list[dict[str, list[tuple[int, Any]]]],
 ) -> None:
-    created: dict[str, DummyBuilder] = {}
-
-    class DummyBuiltFitFile:
-        @staticmethod
-        def to_bytes() -> bytes:
-            return b"FIT"
+    created: dict[str, DummyWriter] = {}
 
-    class DummyBuilder:
+    class DummyWriter:
         def __init__(self) -> None:
             self.added: list[DummyMessage] = []
 
-        def add(self, message: DummyMessage) -> None:
+        def add(self, message: DummyMessage, local_id: int | None = None) -> None:
             self.added.append(message)
 
-        def build(self) -> DummyBuiltFitFile:
-            return DummyBuiltFitFile()
+        def finish(self) -> EncodedRecords:
+            return EncodedRecords(size=3, data=b"FIT")
 
-    def builder_factory() -> DummyBuilder:
-        builder = DummyBuilder()
-        created["instance"] = builder
-        return builder
+    def writer_factory() -> DummyWriter:
+        writer = DummyWriter()
+        created["instance"] = writer
+        return writer
 
-    monkeypatch.setattr(services, "FitFileBuilder", builder_factory)
+    monkeypatch.setattr(services, "RecordWriter", writer_factory)
     monkeypatch.setattr(services, "resolve_message", lambda _name: DummyMessage)
 
     request = BuildFitRequest(
@@ -210,13 +307,12 @@ def test_build_fit_file_success(
         ]
     )
 
-    result_stream = services.build_fit_file(request)
-    assert result_stream.read() == b"FIT"
+    assert services.encode_fit_records(request) == EncodedRecords(size=3, data=b"FIT")
 
-    builder = created["instance"]
-    assert len(builder.added) == len(field_payload_groups)
+    writer = created["instance"]
+    assert len(writer.added) == len(field_payload_groups)
 
-    for message, expected in zip(builder.added, expected_calls, strict=True):
+    for message, expected in zip(writer.added, expected_calls, strict=True):
         for field in message.fields:
             assert field.calls == expected.get(field.name, [])
 
@@ -228,17 +324,19 @@ def test_build_fit_file_without_messages() -> None:
 
 
 def test_build_fit_file_builder_failure(monkeypatch: pytest.MonkeyPatch) -> None:
-    class FailingBuilder:
-        def add(self, _message: DummyMessage) -> None:
+    aborted: list[bool] = []
+
+    class FailingWriter:
+        def add(self, _message: DummyMessage, local_id: int | None = None) -> None:
             raise ValueError("builder error")
 
-        def build(self) -> None:
-            raise AssertionError("should not build")
+        def finish(self) -> None:
+            raise AssertionError("should not finish")
 
-    def failing_builder_factory() -> FailingBuilder:
-        return FailingBuilder()
+        def abort(self) -> None:
+            aborted.append(True)
 
-    monkeypatch.setattr(services, "FitFileBuilder", failing_builder_factory)
+    monkeypatch.setattr(services, "RecordWriter", FailingWriter)
     monkeypatch.setattr(services, "resolve_message", lambda _name: DummyMessage)
 
     request = BuildFitRequest(
@@ -253,6 +351,7 @@ def test_build_fit_file_builder_failure(monkeypatch: pytest.MonkeyPatch) -> None
     with pytest.raises(Exception) as exc:
         services.build_fit_file(request)
     assert "builder error" in str(exc.value)
+    assert aborted == [True]
 
 
 def test_message_from_payload_unknown_message(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -267,17 +366,46 @@ def test_message_from_payload_unknown_message(monkeypatch: pytest.MonkeyPatch) -
     assert "unknown" in str(exc.value)
 
 
-def test_apply_field_payload_rejects_unknown_field() -> None:
-    class MessageWithoutFields:
-        name = "dummy-message"
+def test_message_from_payload_rejects_unknown_field(monkeypatch: pytest.MonkeyPatch) -> None:
+    class CountingMessage(DummyMessage):
+        NAME = "counting-message"
+        created = 0
 
-        @staticmethod
-        def get_field_by_name(_name: str) -> None:
-            return None
+        def __init__(self, local_id: int = 0) -> None:
+            super().__init__(local_id)
+            CountingMessage.created += 1
+
+    monkeypatch.setattr(services, "resolve_message", lambda _name: CountingMessage)
+    message_registry.field_index(CountingMessage)
+    CountingMessage.created = 0
 
+    payload = MessagePayload(name="counting", fields=[MessageFieldPayload(name="gamma", value=1)])
     with pytest.raises(Exception) as exc:
-        services._apply_field_payload(
-            MessageWithoutFields(),
-            MessageFieldPayload(name="alpha", value=1),
-        )
-    assert "Field 'alpha'" in str(exc.value)
+        services._message_from_payload(payload)
+    assert "Field 'gamma' is not valid for message 'counting-message'" in str(exc.value)
+    assert CountingMessage.created == 0
+
+
+def test_parse_fit_ndjson_reports_errors_in_band(monkeypatch: pytest.MonkeyPatch) -> None:
+    metadata = FitMetadata(protocol_version="2.0", profile_version="21.60", records_size=0)
+
+    def failing_records() -> Iterator[RecordDict]:
+        yield {"kind": "data", "local_id": 0, "global_id": 20, "message": "record", "fields": []}
+        raise ValueError("truncated")
+
+    monkeypatch.setattr(
+        services,
+        "stream_fit_records",
+        lambda _payload, _selection=None, _downsampling=None: (metadata, failing_records()),
+    )
+
+    lines = [json.loads(line) for line in services.parse_fit_ndjson(b"payload")]
+    assert [line["kind"] for line in lines] == ["metadata", "data", "error"]
+    assert lines[0]["metadata"]["profile_version"] == "21.60"
+    assert "truncated" in lines[2]["detail"]
+
+
+def test_stream_fit_records_rejects_bad_header() -> None:
+    with pytest.raises(HTTPException) as exc:
+        services.stream_fit_records(b"\x0e not a fit header")
+    assert exc.value.status_code == 400
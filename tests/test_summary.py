@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from fitfile_customgpt_action import services, summary
+from fitfile_customgpt_action.encoder import iter_fit_bytes
+from fitfile_customgpt_action.models import BuildFitColumnarRequest
+from fitfile_customgpt_action.summary import SummaryOptions
+
+from .pytest_types import fixture, parametrize
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+START_MS = 1_700_000_000_000
+
+
+def _activity() -> bytes:
+    stamps = [START_MS + index * 1000 for index in range(10)]
+    request = BuildFitColumnarRequest.model_validate(
+        {
+            "zones_target": {"max_heart_rate": [200]},
+            "record": {
+                "timestamp": stamps,
+                "heart_rate": [100, 110, 120, 130, 140, 150, 160, 170, 180, 190],
+                "power": [200, 200, 400, 200, None, 200, 200, 200, 200, 200],
+                "distance": [index * 10.0 for index in range(10)],
+                "altitude": [100.0, 101.0, 102.0, 101.0, 100.0, 100.0, 103.0, 103.0, 102.0, 104.0],
+            },
+            "lap": {
+                "timestamp": [stamps[4], stamps[9]],
+                "start_time": [stamps[0], stamps[5]],
+                "total_elapsed_time": [4.0, 4.0],
+            },
+            "session": {"timestamp": [stamps[9]], "start_time": [stamps[0]]},
+        }
+    )
+    return b"".join(iter_fit_bytes(services.encode_fit_columns(request)))
+
+
+@fixture(params=["numpy", "python"])
+def backend(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> str:
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(summary, "np", None)
+    return str(request.param)
+
+
+def test_summary_aggregates_activity_and_laps(backend: str) -> None:
+    result = services.summarize_fit(_activity(), SummaryOptions(percentiles=(50.0, 90.0)))
+
+    activity = result.activity
+    assert activity.records == 10
+    assert activity.duration_s == 9.0
+    assert activity.distance_m == 90.0
+    assert (activity.elevation_gain_m, activity.elevation_loss_m) == (7.0, 3.0)
+    heart_rate = activity.metrics["heart_rate"]
+    assert (heart_rate.min, heart_rate.max, heart_rate.mean) == (100.0, 190.0, 145.0)
+    assert heart_rate.percentiles == {"p50": 145.0, "p90": 181.0}
+    assert heart_rate.units == "bpm"
+    power = activity.metrics["power"]
+    assert (power.max, power.max_time) == (400.0, START_MS + 2000)
+    # Zones derived from zones_target.max_heart_rate = 200; the last record counts 0 s.
+    zones = activity.time_in_zone["heart_rate"]
+    assert [(zone.low, zone.high) for zone in zones][:2] == [(None, 100), (100, 120)]
+    assert [zone.seconds for zone in zones] == [0.0, 2.0, 2.0, 2.0, 2.0, 1.0]
+
+    assert [lap.records for lap in result.laps] == [5, 5]
+    assert [lap.metrics["heart_rate"].mean for lap in result.laps] == [120.0, 170.0]
+    assert result.laps[1].start_time == START_MS + 5000
+    assert result.laps[1].distance_m == 40.0
+    assert [session.records for session in result.sessions] == [10]
+
+
+def test_summary_skips_invalid_values_and_honours_zone_options(backend: str) -> None:
+    options = SummaryOptions(percentiles=(), power_zones=(300.0,))
+    result = services.summarize_fit(SAMPLE_FIT.read_bytes(), options)
+
+    # The sample has no heart rate sensor: every heart_rate is the invalid 255.
+    assert "heart_rate" not in result.activity.metrics
+    assert result.activity.metrics["power"].percentiles == {}
+    power_zones = result.activity.time_in_zone["power"]
+    assert [(zone.low, zone.high) for zone in power_zones] == [(None, 300.0), (300.0, None)]
+    assert len(result.model_dump_json()) < 10_000
+
+
+def test_numpy_and_python_backends_agree(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("numpy")
+    payload = SAMPLE_FIT.read_bytes()
+    options = SummaryOptions(percentiles=(5.0, 50.0, 99.0), heart_rate_zones=(100.0, 150.0))
+    vectorized = services.summarize_fit(payload, options).model_dump()
+    monkeypatch.setattr(summary, "np", None)
+    assert services.summarize_fit(payload, options).model_dump() == vectorized
+
+
+@parametrize(
+    ("percentiles", "zones", "detail"),
+    [
+        (["fifty"], [], "list of numbers"),
+        (["50,101"], [], "between 0 and 100"),
+        ([], ["-5"], "must not be negative"),
+    ],
+)
+def test_build_summary_options_rejects_bad_values(
+    percentiles: list[str], zones: list[str], detail: str
+) -> None:
+    with pytest.raises(HTTPException) as exc:
+        services.build_summary_options(percentiles, zones, [])
+    assert exc.value.status_code == 400
+    assert detail in str(exc.value.detail)
+
+
+def test_build_summary_options_defaults() -> None:
+    options = services.build_summary_options([], [], ["100, 200", "300"])
+    assert options == SummaryOptions(power_zones=(100.0, 200.0, 300.0))
+    assert options.cache_token() != SummaryOptions().cache_token()
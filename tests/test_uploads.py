@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import mmap
+import tempfile
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from starlette.formparsers import MultiPartParser
+
+from fitfile_customgpt_action import services
+from fitfile_customgpt_action.decoder import FitDecodeError
+from fitfile_customgpt_action.models import ParseFitResponse
+from fitfile_customgpt_action.uploads import (
+    STREAMED_BODY_MAX_BYTES,
+    BodySizeLimitMiddleware,
+    StreamedBody,
+    UploadBuffer,
+)
+
+from .pytest_types import parametrize
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+# Just over the size up to which the multipart parser keeps uploads in memory.
+LARGE_UPLOAD = MultiPartParser.spool_max_size + 1
+
+
+@parametrize("max_size", [4, LARGE_UPLOAD * 2])
+def test_upload_buffer_maps_large_spooled_files(max_size: int) -> None:
+    payload = b"FIT payload".ljust(LARGE_UPLOAD, b"\0")
+    with tempfile.SpooledTemporaryFile(max_size=max_size) as spooled:
+        spooled.write(payload)
+        upload = UploadBuffer(spooled)
+
+        assert upload.mapped
+        data = upload.data
+        assert isinstance(data, memoryview)
+        assert bytes(data) == payload
+
+        upload.release()
+        upload.release()
+        assert upload.data == b""
+
+
+def test_upload_buffer_reads_in_memory_spools() -> None:
+    with tempfile.SpooledTemporaryFile(max_size=1024) as spooled:
+        spooled.write(b"FIT payload")
+        upload = UploadBuffer(spooled)
+
+        assert not upload.mapped
+        assert upload.data == b"FIT payload"
+        assert not spooled._rolled  # type: ignore[attr-defined]
+
+
+def test_upload_buffer_release_tolerates_live_views() -> None:
+    with tempfile.TemporaryFile() as handle:
+        handle.write(b"FIT payload")
+        upload = UploadBuffer(handle)
+        assert isinstance(upload.data, memoryview)
+        view = upload.data[:3]
+
+        upload.release()
+        assert bytes(view) == b"FIT"
+
+
+def _echo_app(max_bytes: int) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request) -> dict[str, int]:
+        return {"size": len(await request.body())}
+
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=max_bytes)
+    return TestClient(app)
+
+
+@parametrize(("max_bytes", "status"), [(0, 200), (16, 200), (15, 413)])
+def test_body_limit_checks_content_length(max_bytes: int, status: int) -> None:
+    response = _echo_app(max_bytes).post("/echo", content=b"x" * 16)
+    assert response.status_code == status
+
+
+def test_body_limit_stops_chunked_bodies_while_streaming() -> None:
+    def chunks() -> Iterator[bytes]:
+        for _ in range(10):
+            yield b"x" * 8
+
+    # A generator body is sent without Content-Length, so only the running count can stop it.
+    response = _echo_app(20).post("/echo", content=chunks())
+
+    assert response.status_code == 413
+    assert "20 byte upload limit" in response.json()["detail"]
+
+
+def test_streamed_body_is_decoded_while_it_arrives() -> None:
+    payload = SAMPLE_FIT.read_bytes()
+    body = StreamedBody(len(payload))
+
+    async def chunks() -> AsyncIterator[bytes]:
+        for start in range(0, len(payload), 4096):
+            await asyncio.sleep(0)
+            yield payload[start : start + 4096]
+
+    async def receive_and_parse() -> ParseFitResponse:
+        stream = aiter(chunks())
+        await body.receive(stream, until=14)
+        job = asyncio.ensure_future(asyncio.to_thread(services.parse_fit_bytes, body))
+        await body.receive(stream)
+        return await job
+
+    parsed = asyncio.run(receive_and_parse())
+    assert parsed.model_dump() == services.parse_fit_bytes(payload).model_dump()
+
+
+def test_streamed_body_fails_waiting_readers_when_it_ends_early() -> None:
+    async def chunks() -> AsyncIterator[bytes]:
+        yield b"0123"
+
+    body = StreamedBody(8)
+    with pytest.raises(HTTPException, match="ended after 4 of its 8 declared bytes"):
+        asyncio.run(body.receive(aiter(chunks())))
+    with pytest.raises(FitDecodeError, match="ended after 4 of 8 bytes"):
+        body.wait_for(8)
+    body.wait_for(4)
+
+
+def test_streamed_body_rejects_extra_bytes() -> None:
+    async def chunks() -> AsyncIterator[bytes]:
+        yield b"0123456789"
+
+    with pytest.raises(HTTPException, match="longer than its Content-Length"):
+        asyncio.run(StreamedBody(8).receive(aiter(chunks())))
+
+
+@parametrize("sent", [0, 4])
+def test_streamed_body_times_out_stalled_uploads(sent: int) -> None:
+    async def chunks() -> AsyncIterator[bytes]:
+        if sent:
+            yield b"0123"
+        await asyncio.sleep(10)
+        yield b"4567"
+
+    body = StreamedBody(8, timeout=0.01)
+    match = f"stalled after {sent} of its 8 declared bytes"
+    with pytest.raises(HTTPException, match=match) as info:
+        asyncio.run(body.receive(aiter(chunks()), until=1 if not sent else None))
+    assert info.value.status_code == 408
+    with pytest.raises(FitDecodeError, match=f"ended after {sent} of 8 bytes"):
+        body.wait_for(8)
+
+
+def test_streamed_body_memory_grows_with_the_bytes_received() -> None:
+    statm = Path("/proc/self/statm")
+    if not statm.exists():
+        pytest.skip("needs /proc to read the resident set size")
+
+    def resident() -> int:
+        return int(statm.read_text().split()[1]) * mmap.PAGESIZE
+
+    before = resident()
+    body = StreamedBody(STREAMED_BODY_MAX_BYTES)
+    assert resident() - before < STREAMED_BODY_MAX_BYTES // 16
+
+    async def chunks() -> AsyncIterator[bytes]:
+        yield b"\1" * (1 << 20)
+
+    asyncio.run(body.receive(aiter(chunks()), until=1 << 20))
+    assert body.received == 1 << 20
+    assert resident() - before < STREAMED_BODY_MAX_BYTES // 16
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import math
+import struct
+import tracemalloc
+from collections.abc import Iterable
+from pathlib import Path
+from typing import cast
+
+import pytest
+from fit_tool.record import Record
+
+from fitfile_customgpt_action import fastjson, projection, services, vectorized
+from fitfile_customgpt_action.decoder import RawData, RecordDecoder
+from fitfile_customgpt_action.models import DataRecordDict, RecordDict
+from fitfile_customgpt_action.selection import Selection
+
+from .pytest_types import parametrize
+from .test_decoder import _activity_records, _definition, _fit_file
+
+pytest.importorskip("numpy")
+
+SAMPLE_FIT = Path(__file__).resolve().parent.parent / "sample_data" / "sample.FIT"
+
+
+def _session_records() -> bytes:
+    # session: timestamp, avg_speed/max_speed (expand into enhanced_*), enhanced_max_speed on
+    # the wire (wins over the expansion) and total_grit as float32.
+    definition = _definition(
+        0, 18, [(253, 4, 0x86), (14, 2, 0x84), (15, 2, 0x84), (125, 4, 0x86), (181, 4, 0x88)]
+    )
+    rows = [
+        struct.pack("<IHHIf", 1_000_000_000, 5123, 9000, 8000, 1.5),
+        struct.pack("<IHHIf", 1_000_000_001, 0xFFFF, 0, 0xFFFFFFFF, math.nan),
+        struct.pack("<IHHII", 1_000_000_002, 1, 2, 3, 0xFFFFFFFF),
+        struct.pack("<IHHIf", 1_000_000_003, 4, 5, 6, math.inf),
+    ]
+    return definition + b"".join(bytes([0x00]) + row for row in rows)
+
+
+def _dump(records: Iterable[RecordDict | Record]) -> list[bytes]:
+    return [
+        fastjson.dumps(
+            services._record_dict(services._serialize_record(record))
+            if isinstance(record, Record)
+            else record
+        )
+        for record in records
+    ]
+
+
+@parametrize(
+    "payload",
+    [
+        SAMPLE_FIT.read_bytes(),
+        _fit_file(_activity_records()),
+        _fit_file(_session_records()),
+    ],
+    ids=["sample", "activity", "session"],
+)
+def test_vectorized_matches_row_projection(payload: bytes) -> None:
+    expected = _dump(projection.iter_records(RecordDecoder(payload)))
+    actual = _dump(vectorized.iter_records(RecordDecoder(payload)))
+    assert actual == expected
+
+
+def test_vectorized_session_values() -> None:
+    records = list(vectorized.iter_records(RecordDecoder(_fit_file(_session_records()))))
+    values = [
+        {field["name"]: field["value"] for field in cast(DataRecordDict, record)["fields"]}
+        for record in records
+        if not isinstance(record, Record) and record["kind"] == "data"
+    ]
+
+    assert values[0]["enhanced_avg_speed"] == pytest.approx(5.123)
+    assert values[0]["enhanced_max_speed"] == pytest.approx(8.0)
+    assert values[0]["total_grit"] == 1.5
+    assert values[1]["total_grit"] is None
+    assert values[2]["total_grit"] is None
+    assert values[3]["total_grit"] is None
+
+
+def test_column_store_gathers_rows_without_a_per_byte_index() -> None:
+    # record: timestamp, heart_rate and two 250-byte arrays that stay row-wise.
+    definition = _definition(
+        0, 20, [(253, 4, 0x86), (3, 1, 0x02), (200, 250, 0x0D), (201, 250, 0x0D)]
+    )
+    rows = [struct.pack("<IB", 1_000_000_000 + index, 120) + bytes(500) for index in range(2000)]
+    decoder = RecordDecoder(_fit_file(definition + b"".join(b"\x00" + row for row in rows)))
+    items = list(decoder)
+    selection = Selection.from_names([], ["record.heart_rate"])
+
+    tracemalloc.start()
+    try:
+        columns = vectorized._ColumnStore(decoder.view, items, selection)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert columns.fields(cast(RawData, items[-1])) == [
+        {"field_id": 3, "name": "heart_rate", "units": "bpm", "value": 120}
+    ]
+    # One copy of the rows; indexing every byte would need eight times that.
+    assert peak < 2 * len(rows) * len(rows[0])